@@ -0,0 +1,189 @@
+"""
+Keyset pagination for admin changelists
+
+Django's changelist pages with OFFSET and counts every matching row, twice
+when show_full_result_count is on. On the large tables both grow with the
+table: page 500 reads the 49,900 rows before it, and every page runs a full
+COUNT(*). KeysetPaginationMixin swaps in:
+
+- KeysetChangeList, which pages with ?after= / ?before= cursors through
+  pagination.seek() whenever the changelist ordering is plain non-null
+  columns of the model (the default orderings always are). Sorting by a
+  related column or a list_editable changelist falls back to Django's pages.
+- EstimatedCountPaginator, whose count on an unfiltered table comes from
+  sqlite_stat1 (written by ANALYZE) or the primary key range, and on a
+  filtered one stops counting at COUNT_CAP. The changelist then shows
+  "about N" or "more than N" instead of an exact total.
+
+DependentRelatedFilter is a sidebar filter for large related tables: it
+lists, say, the subjects of the course picked in the course filter instead
+of every subject.
+"""
+from django.contrib.admin import RelatedFieldListFilter
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min
+from django.utils.functional import cached_property
+
+from .pagination import AFTER_VAR, BEFORE_VAR, InvalidCursor, position, seek
+
+# Tables smaller than this are counted exactly
+ESTIMATE_ABOVE = 10_000
+COUNT_CAP = 10_000
+
+
+def estimate_rows(queryset):
+    """Approximate row count of queryset's table, without scanning it"""
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [model._meta.db_table])
+                row = cursor.fetchone()
+        except DatabaseError:
+            # No ANALYZE has run yet, so there is no sqlite_stat1
+            row = None
+        if row:
+            return int(row[0].split()[0])
+    # Both ends of the primary key index; deleted rows make this an overestimate
+    bounds = model._default_manager.using(queryset.db).aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    return bounds['high'] - bounds['low'] + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count is estimated on large tables and capped on filtered ones"""
+
+    estimated = False
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            counted = queryset.order_by()[:COUNT_CAP + 1].count()
+            if counted > COUNT_CAP:
+                self.capped = True
+                return COUNT_CAP
+            return counted
+        estimate = estimate_rows(queryset)
+        if estimate > ESTIMATE_ABOVE:
+            self.estimated = True
+            return estimate
+        return super().count
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList paged by cursor when its ordering allows it"""
+
+    keyset = False
+    next_url = None
+    previous_url = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Sorting, filtering and searching start again from the first page
+        return super().get_query_string(new_params, [*(remove or []), AFTER_VAR, BEFORE_VAR])
+
+    def keyset_ordering(self, request):
+        """The changelist ordering if seek() can page it, else None"""
+        if self.list_editable:
+            return None
+        ordering = []
+        for field in self.get_ordering(request, self.queryset):
+            if not isinstance(field, str):
+                return None
+            name = field.lstrip('-')
+            if name == 'pk':
+                name = self.lookup_opts.pk.name
+            try:
+                model_field = self.lookup_opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            # A relation sorts by the related model's ordering, which seek() cannot compare
+            if not model_field.concrete or model_field.is_relation or model_field.null:
+                return None
+            ordering.append(f"-{name}" if field.startswith('-') else name)
+        return ordering
+
+    def get_results(self, request):
+        ordering = self.keyset_ordering(request)
+        if ordering is None:
+            return super().get_results(request)
+        before = request.GET.get(BEFORE_VAR)
+        after = None if before else request.GET.get(AFTER_VAR)
+        try:
+            rows, more = seek(self.queryset, ordering, before or after, self.list_per_page, backwards=bool(before))
+        except InvalidCursor:
+            raise IncorrectLookupParameters from None
+        has_next = bool(before) or more
+        has_previous = more if before else bool(after)
+        if rows and has_next:
+            self.next_url = self.get_query_string({AFTER_VAR: position(rows[-1], ordering)})
+        if rows and has_previous:
+            self.previous_url = self.get_query_string({BEFORE_VAR: position(rows[0], ordering)})
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.keyset = True
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = paginator
+
+
+class KeysetPaginationMixin:
+    """ModelAdmin mixin: cursor pages and estimated counts on the changelist"""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+class DependentRelatedFilter(RelatedFieldListFilter):
+    """
+    Related filter whose choices load only once the filter on parent_field
+    (a relation of the related model) is set, and then only its rows
+    """
+
+    parent_field = None
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        parent = field.related_model._meta.get_field(self.parent_field)
+        self.parent_title = parent.verbose_name
+        # The parent's own filter takes its parameter out of params, so read the request
+        self.parent_value = request.GET.get(f"{field_path}__{self.parent_field}__{parent.target_field.name}__exact")
+        super().__init__(field, request, params, model, model_admin, field_path)
+        if not self.parent_value and not self.lookup_val:
+            self.title = f"{self.title} (pick a {self.parent_title} first)"
+
+    def has_output(self):
+        return True
+
+    def field_choices(self, field, request, model_admin):
+        if self.parent_value:
+            limit = {self.parent_field: self.parent_value}
+        elif self.lookup_val:
+            limit = {'pk__in': self.lookup_val}
+        else:
+            return []
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        try:
+            return field.get_choices(include_blank=False, limit_choices_to=limit, ordering=ordering)
+        except (ValueError, ValidationError):
+            return []
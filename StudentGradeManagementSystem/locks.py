@@ -0,0 +1,42 @@
+"""
+Lock timeouts as 503 responses
+
+A write that waits longer than SQLite's busy timeout fails with
+OperationalError 'database is locked', which Django turns into a plain
+500. LockTimeoutMiddleware answers it with 503 Service Unavailable, a
+Retry-After and an X-Database-Locked header instead, so clients (the HTTP
+load test among them) can tell a lock timeout from any other server error
+without reading the error page, and with DEBUG off.
+"""
+import logging
+
+from django.db import OperationalError
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Database-Locked'
+RETRY_AFTER_SECONDS = 1
+
+
+def is_lock_timeout(exception):
+    return isinstance(exception, OperationalError) and 'database is locked' in str(exception)
+
+
+class LockTimeoutMiddleware:
+    """Answer SQLite lock timeouts with 503 and X-Database-Locked"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not is_lock_timeout(exception):
+            return None
+        logger.warning("Database lock timeout on %s %s", request.method, request.path)
+        response = HttpResponse('The database is busy, please try again.', status=503, content_type='text/plain')
+        response[HEADER] = '1'
+        response['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response
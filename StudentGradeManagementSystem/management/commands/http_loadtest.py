@@ -0,0 +1,116 @@
+import json
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.loadtest import ANNOUNCEMENT_TITLE, compare, load_users, parse_mix, run_load
+from courses.seeding import DEFAULT_PASSWORD
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(port, timeout=30):
+    """`manage.py runserver` in a child process, so the load generator does not share its GIL"""
+    server = subprocess.Popen(
+        [sys.executable, 'manage.py', 'runserver', '--noreload', f"127.0.0.1:{port}"],
+        cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise CommandError('The development server exited during startup')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise CommandError(f"The development server did not start within {timeout}s")
+
+
+class Command(BaseCommand):
+    help = 'Replay weighted dashboard, edit_grade and announcement traffic against a local server over HTTP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server; by default runserver is started on a free port')
+        parser.add_argument('--prefix', default='bench', help='Prefix of the seeded dataset to log in as')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--mix', default='dashboard=8,edit_grade=3,announcement=1',
+                            help='Scenario weights, e.g. dashboard=8,edit_grade=3,announcement=1')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to generate load for')
+        parser.add_argument('--mode', choices=['threads', 'asyncio'], default='threads')
+        parser.add_argument('--timeout', type=float, default=30, help='Client timeout per request in seconds')
+        parser.add_argument('--output', help='Write the full report, including histograms, to this JSON file')
+        parser.add_argument('--compare', help='Earlier JSON report to compare throughput and error rates against')
+        parser.add_argument('--keep-announcements', action='store_true',
+                            help='Do not delete the announcements created by the run')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        users = load_users(options['prefix'])
+        if not users['student'] and not users['instructor']:
+            raise CommandError('No seeded users found; run manage.py seed_benchmark first')
+
+        server = None
+        base_url = options['url']
+        if not base_url:
+            port = _free_port()
+            server = _start_server(port)
+            base_url = f"http://127.0.0.1:{port}"
+        self.stdout.write(f"Loading {base_url} with {options['concurrency']} workers ({options['mode']}) "
+                          f"for {options['duration']:g}s ({options['mix']})")
+        try:
+            report = run_load(
+                base_url, users, options['password'], mix=mix, concurrency=options['concurrency'],
+                duration=options['duration'], mode=options['mode'], timeout=options['timeout'],
+            )
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+            if not options['keep_announcements']:
+                from announcements.models import Announcement
+                Announcement.objects.filter(
+                    title__startswith=ANNOUNCEMENT_TITLE, created_by__username__startswith=f"{options['prefix']}-"
+                ).delete()
+
+        self.stdout.write(f"Logged in {report['logged_in']} sessions")
+        self.stdout.write(f"\n{'step':<28}{'reqs':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'locked':>8}")
+        for step, stats in report['steps'].items():
+            self.stdout.write(
+                f"{step:<28}{stats['requests']:>7}{stats['per_second']:>9.1f}{stats['p50_ms']:>9.1f}"
+                f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['error_rate']:>8.1%}{stats['lock_timeout_rate']:>8.1%}"
+            )
+        for kind in ('reads', 'writes'):
+            totals = report[kind]
+            self.stdout.write(f"{kind:<28}{totals['requests']:>7}{totals['per_second']:>9.1f}{'':>27}{totals['error_rate']:>8.1%}")
+        self.stdout.write(f"\nLatency histogram (ms)")
+        for step, stats in report['steps'].items():
+            buckets = '  '.join(f"{bound}:{n}" for bound, n in stats['histogram_ms'].items() if n)
+            self.stdout.write(f"  {step:<26}{buckets}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+            self.stdout.write(f"\n{'compared with ' + options['compare']:<28}{'req/s':>9}{'now':>9}{'change':>9}{'errors':>9}{'now':>9}")
+            for name, old, new, change, old_errors, new_errors in compare(previous, report):
+                self.stdout.write(f"{name:<28}{old:>9.1f}{new:>9.1f}{change:>+8.1f}%{old_errors:>9.1%}{new_errors:>9.1%}")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{report['requests']} requests in {report['duration_seconds']}s ({report['per_second']} req/s)"
+        ))
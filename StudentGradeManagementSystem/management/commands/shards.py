@@ -0,0 +1,102 @@
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.seeding import DEFAULT_PASSWORD, seed
+from StudentGradeManagementSystem.sharding import campus_databases, campus_report, fan_out, shards
+
+EXPORTED_APPS = ['courses', 'grades', 'announcements']
+
+
+def _manage(*args):
+    """Run a manage.py command in a child process, so shards migrate and export without sharing a GIL"""
+    result = subprocess.run(
+        [sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+    return result.returncode, (result.stdout + result.stderr).strip()
+
+
+class Command(BaseCommand):
+    help = 'Migrate, seed, export or report on every campus database in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['migrate', 'seed', 'export', 'report'])
+        parser.add_argument('--database', action='append', help='Limit to these aliases (repeatable)')
+        parser.add_argument('--output-dir', default='exports', help='Directory for `export` (one JSON file per database)')
+        parser.add_argument('--students', type=int, default=200, help='Students per campus for `seed`')
+        parser.add_argument('--subjects', type=int, default=10, help='Subjects per campus for `seed`')
+        parser.add_argument('--announcements', type=int, default=50, help='Announcements per campus for `seed`')
+        parser.add_argument('--prefix', default='bench', help='Prefix for `seed`; the campus code is appended')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+
+    def handle(self, *args, **options):
+        aliases = options['database'] or campus_databases()
+        unknown = set(aliases) - set(campus_databases())
+        if unknown:
+            raise CommandError(f"Not a campus database: {', '.join(sorted(unknown))}")
+
+        self.verbosity = options['verbosity']
+        started = time.perf_counter()
+        getattr(self, options['action'])(aliases, options)
+        self.stdout.write(self.style.SUCCESS(f"{options['action']} finished in {time.perf_counter() - started:.1f}s"))
+
+    def _report_processes(self, results):
+        failed = []
+        for alias, (code, output) in results.items():
+            self.stdout.write(f"[{alias}] {'ok' if code == 0 else f'exit {code}'}")
+            if output and (code or self.verbosity > 1):
+                self.stdout.write(output)
+            if code:
+                failed.append(alias)
+        if failed:
+            raise CommandError(f"Failed on {', '.join(failed)}")
+
+    def migrate(self, aliases, options):
+        self._report_processes(fan_out(lambda alias: _manage('migrate', '--noinput', '--database', alias), aliases))
+
+    def export(self, aliases, options):
+        os.makedirs(options['output_dir'], exist_ok=True)
+        self._report_processes(fan_out(lambda alias: _manage(
+            'dumpdata', *EXPORTED_APPS, '--database', alias, '--output', os.path.join(options['output_dir'], f"{alias}.json"),
+        ), aliases))
+
+    def seed(self, aliases, options):
+        """One campus per shard, each seeded in its own thread"""
+        from courses.models import Campus
+
+        targets = [alias for alias in aliases if alias in shards()]
+        if not targets:
+            raise CommandError('Seeding needs at least one shard; set SGMS_CAMPUS_SHARDS')
+        campuses = {}
+        for alias in targets:
+            code = alias.removeprefix('campus_').upper()
+            campuses[alias], _ = Campus.objects.get_or_create(
+                code=code, defaults={'name': f"{code.title()} Campus", 'database': alias},
+            )
+
+        def run(alias):
+            campus = campuses[alias]
+            return seed(
+                students=options['students'], subjects=options['subjects'], announcements=options['announcements'],
+                prefix=f"{options['prefix']}-{campus.code.lower()}", password=options['password'], campus=campus,
+            )
+
+        for alias, counts in fan_out(run, targets).items():
+            summary = ', '.join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+            self.stdout.write(f"[{alias}] {summary}")
+
+    def report(self, aliases, options):
+        report = campus_report(aliases)
+        header = f"{'campus':<12}{'database':<16}{'courses':>8}{'subjects':>9}{'students':>9}{'enrolled':>9}{'graded':>8}{'avg':>8}{'pass %':>8}"
+        self.stdout.write(header)
+        for row in report['rows'] + [dict(report['total'], campus='total', database='')]:
+            average = f"{row['average']:.2f}" if row['average'] is not None else '-'
+            pass_rate = f"{row['pass_rate']:.1f}" if row['pass_rate'] is not None else '-'
+            self.stdout.write(
+                f"{row['campus']:<12}{row['database']:<16}{row['courses']:>8}{row['subjects']:>9}{row['students']:>9}"
+                f"{row['enrollments']:>9}{row['graded']:>8}{average:>8}{pass_rate:>8}"
+            )
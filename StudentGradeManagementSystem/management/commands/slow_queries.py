@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from StudentGradeManagementSystem import slowqueries
+
+
+class Command(BaseCommand):
+    help = 'Print the slowest statements from the slow-query log, grouped by SQL fingerprint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--order', choices=['total', 'count', 'max', 'mean'], default='total')
+        parser.add_argument('--view', help='Only queries run by this URL name')
+        parser.add_argument('--log', help='Log file to read instead of settings.SLOW_QUERY_LOG')
+        parser.add_argument('--measure-overhead', action='store_true',
+                            help='Time the recorder on fast statements instead of reading the log')
+
+    def handle(self, *args, **options):
+        if options['measure_overhead']:
+            result = slowqueries.measure_overhead()
+            self.stdout.write(
+                f"{result['statements']} statements: {result['bare_us']} us bare, {result['wrapped_us']} us recorded, "
+                f"+{result['overhead_us']} us ({result['overhead_pct']}%) per statement"
+            )
+            return
+
+        entries = slowqueries.read_log(options['log'])
+        if options['view']:
+            entries = (entry for entry in entries if entry.get('view') == options['view'])
+        groups = slowqueries.aggregate(entries)
+        if not groups:
+            raise CommandError('No slow queries recorded')
+
+        key = {'total': 'total_ms', 'count': 'count', 'max': 'max_ms', 'mean': 'mean_ms'}[options['order']]
+        groups.sort(key=lambda group: group[key], reverse=True)
+        for rank, group in enumerate(groups[:options['top']], 1):
+            views = ', '.join(f"{view} ({n})" for view, n in sorted(group['views'].items(), key=lambda item: -item[1]))
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{rank}. {group['fingerprint']}  {group['count']}x  total {group['total_ms']:.1f} ms  "
+                f"mean {group['mean_ms']:.1f} ms  max {group['max_ms']:.1f} ms"
+            ))
+            self.stdout.write(f"   views: {views}")
+            self.stdout.write(f"   sql:   {group['sql'][:400]}")
+            self.stdout.write(f"   params: {group['params']}")
+            for step in group.get('plan') or []:
+                self.stdout.write(f"   plan:  {step}")
+            for frame in group.get('stack') or []:
+                self.stdout.write(f"   at:    {frame}")
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from StudentGradeManagementSystem.routers import replicas, sync_replicas
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary database over the read replicas with the SQLite backup API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', help='Replica alias to sync (repeatable); default all')
+        parser.add_argument('--interval', type=float, help='Keep syncing every N seconds')
+
+    def handle(self, *args, **options):
+        aliases = options['database'] or replicas()
+        unknown = set(aliases) - set(replicas())
+        if unknown:
+            raise CommandError(f"Not a replica: {', '.join(sorted(unknown))}")
+        if not aliases:
+            raise CommandError('No replicas configured; set SGMS_READ_REPLICAS')
+        while True:
+            started = time.perf_counter()
+            synced = sync_replicas(aliases)
+            self.stdout.write(f"Synced {', '.join(synced)} in {(time.perf_counter() - started) * 1000:.0f}ms")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
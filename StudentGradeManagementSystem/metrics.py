@@ -0,0 +1,394 @@
+"""
+Prometheus metrics
+
+An in-process registry of counters and histograms served in the
+Prometheus text format at /metrics:
+
+- http_requests_total and http_request_duration_seconds per URL name,
+  method and status (MetricsMiddleware)
+- db_queries_total and db_query_duration_seconds_total per URL name
+- cache_requests_total by hit/miss and the derived cache_hit_ratio
+  (LocMemCache below)
+- grades_saved_total, announcements_created_total, logins_total and
+  failed_logins_total from model and auth signals
+- jobs_processed_total and job_duration_seconds per task (jobs.worker)
+
+Updates never take a lock on the request path: every thread increments
+its own shard and a scrape sums the shards. A finished thread's shard is
+folded into one retired total, so short-lived threads do not pile up. With settings.METRICS_
+MULTIPROC_DIR set (or the PROMETHEUS_MULTIPROC_DIR environment variable),
+each worker process instead writes its values into its own mmap'd file in
+that directory and a scrape of any worker sums every file, so the numbers
+cover all gunicorn-style workers. Clear the directory when the server is
+restarted.
+"""
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache.backends import locmem
+from django.http import HttpResponse, HttpResponseForbidden
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class _Shard:
+    """One thread's values, held by its thread-local and so dropped when the thread ends"""
+
+    def __init__(self):
+        self.values = defaultdict(float)
+
+
+class _ThreadShards:
+    """Per-thread dicts of values; only the owning thread writes, so increments need no lock"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        try:
+            values = self._local.shard.values
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            values = shard.values
+            with self._lock:
+                self._shards[id(shard)] = values
+            weakref.finalize(shard, self._retire, id(shard))
+        values[key] += amount
+
+    def _retire(self, shard_id):
+        # The owning thread has ended, so nothing writes to these values any more
+        with self._lock:
+            for key, value in self._shards.pop(shard_id).items():
+                self._retired[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            totals = defaultdict(float, self._retired)
+            shards = list(self._shards.values())
+        for shard in shards:
+            for key, value in dict(shard).items():
+                totals[key] += value
+        return totals
+
+
+class _MmapFile:
+    """
+    One process's values as (key, double) records in a growing mmap'd file:
+    an 8 byte header holding the used length, then for each key a 4 byte
+    length, the UTF-8 key padded to 8 bytes and the 8 byte value.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(self.INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = struct.unpack_from('<i', self._map, 0)[0] or 8
+        for key, _, position in self.records(self._map, self._used):
+            self._positions[key] = position
+
+    @staticmethod
+    def records(buffer, used):
+        # Another process may be appending; stop at the end of what this mapping can see
+        used = min(used, len(buffer))
+        position = 8
+        while position + 4 <= used:
+            length = struct.unpack_from('<i', buffer, position)[0]
+            value_at = position + 4 + length + (8 - (4 + length) % 8) % 8
+            if value_at + 8 > used:
+                break
+            key = bytes(buffer[position + 4:position + 4 + length]).decode()
+            yield key, struct.unpack_from('<d', buffer, value_at)[0], value_at
+            position = value_at + 8
+
+    def _add(self, key):
+        encoded = key.encode()
+        padding = (8 - (4 + len(encoded)) % 8) % 8
+        record = struct.pack(f'<i{len(encoded) + padding}sd', len(encoded), encoded, 0.0)
+        while self._used + len(record) > len(self._map):
+            self._map.close()
+            self._file.truncate(os.fstat(self._file.fileno()).st_size * 2)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map[self._used:self._used + len(record)] = record
+        position = self._used + len(record) - 8
+        self._used += len(record)
+        struct.pack_into('<i', self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def inc(self, key, amount):
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._add(key)
+            value = struct.unpack_from('<d', self._map, position)[0]
+            struct.pack_into('<d', self._map, position, value + amount)
+
+
+class _MultiprocessStore:
+    """Values of every worker process sharing `directory`"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._file = _MmapFile(os.path.join(directory, f"metrics_{os.getpid()}.db"))
+
+    def inc(self, key, amount):
+        self._file.inc(key, amount)
+
+    def snapshot(self):
+        totals = defaultdict(float)
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith('metrics_') and filename.endswith('.db')):
+                continue
+            with open(os.path.join(self.directory, filename), 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    used = struct.unpack_from('<i', buffer, 0)[0]
+                    for key, value, _ in _MmapFile.records(buffer, used):
+                        totals[key] += value
+        return totals
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    """The store of this process, recreated after a fork so workers never share a file"""
+    global _store, _store_pid
+    if _store_pid != os.getpid():
+        with _store_lock:
+            if _store_pid != os.getpid():
+                directory = getattr(settings, 'METRICS_MULTIPROC_DIR', None) or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+                _store = _MultiprocessStore(str(directory)) if directory else _ThreadShards()
+                _store_pid = os.getpid()
+    return _store
+
+
+def reset():
+    """Drop every value of this process (tests)"""
+    global _store_pid
+    with _store_lock:
+        _store_pid = None
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        _get_store().inc(_key(self.name, labels), amount)
+
+    def samples(self, values):
+        series = values.get(self.name) or ({(): 0} if not self.labelnames else {})
+        for labels, value in sorted(series.items()):
+            yield self.name, dict(labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        # Only the bucket the value falls in is incremented; the exposition makes them cumulative
+        store = _get_store()
+        bound = next(b for b in self.buckets if value <= b)
+        store.inc(_key(f"{self.name}_bucket", dict(labels, le=bound)), 1)
+        store.inc(_key(f"{self.name}_sum", labels), value)
+
+    def samples(self, values):
+        series = defaultdict(dict)
+        for labels, value in values.get(f"{self.name}_bucket", {}).items():
+            labels = dict(labels)
+            bound = labels.pop('le')
+            series[tuple(sorted(labels.items()))][bound] = value
+        for labels, counts in sorted(series.items()):
+            running = 0
+            for bound in self.buckets:
+                running += counts.get(bound, 0)
+                yield f"{self.name}_bucket", dict(labels, le='+Inf' if bound == float('inf') else repr(bound)), running
+            yield f"{self.name}_sum", dict(labels), values.get(f"{self.name}_sum", {}).get(labels, 0)
+            yield f"{self.name}_count", dict(labels), running
+
+
+REGISTRY = []
+
+http_requests = Counter('http_requests_total', 'HTTP requests by URL name, method and status', ('view', 'method', 'status'))
+http_latency = Histogram('http_request_duration_seconds', 'Request latency by URL name and status', ('view', 'status'))
+db_queries = Counter('db_queries_total', 'Database queries run by requests, by URL name', ('view',))
+db_time = Counter('db_query_duration_seconds_total', 'Time requests spent in the database, by URL name', ('view',))
+cache_requests = Counter('cache_requests_total', 'Cache lookups by result', ('result',))
+grades_saved = Counter('grades_saved_total', 'Grade rows saved')
+announcements_created = Counter('announcements_created_total', 'Announcements created')
+logins = Counter('logins_total', 'Successful logins')
+failed_logins = Counter('failed_logins_total', 'Failed login attempts')
+jobs_processed = Counter('jobs_processed_total', 'Background jobs run, by task and outcome', ('task', 'outcome'))
+job_duration = Histogram('job_duration_seconds', 'Background job run time by task', ('task',))
+outbox_delivered = Counter('outbox_events_delivered_total', 'Outbox events delivered, by sink', ('sink',))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render():
+    """The whole registry in the Prometheus text exposition format"""
+    values = defaultdict(dict)
+    for key, value in _get_store().snapshot().items():
+        name, labels = json.loads(key)
+        values[name][tuple(map(tuple, labels))] = value
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples(values):
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {_format(value)}" if label_text else f"{name} {_format(value)}")
+
+    lookups = values.get(cache_requests.name, {})
+    hits = lookups.get((('result', 'hit'),), 0)
+    lines.append('# HELP cache_hit_ratio Share of cache lookups that were hits')
+    lines.append('# TYPE cache_hit_ratio gauge')
+    lines.append(f"cache_hit_ratio {_format(hits / sum(lookups.values()) if lookups else 0)}")
+    return '\n'.join(lines) + '\n'
+
+
+def _has_token(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    supplied = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())
+
+
+def metrics_view(request):
+    """
+    /metrics for scrapers sending METRICS_TOKEN as a bearer token or
+    connecting from METRICS_ALLOWED_IPS, and for staff users. Behind a reverse
+    proxy REMOTE_ADDR is the proxy's address, which would admit every client
+    it forwards: empty METRICS_ALLOWED_IPS there and use the token.
+    """
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    user = getattr(request, 'user', None)
+    if not (_has_token(request) or request.META.get('REMOTE_ADDR') in allowed or (user and user.is_staff)):
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+class LocMemCache(locmem.LocMemCache):
+    """Local-memory cache counting hits and misses (get_many goes through get)"""
+
+    _miss = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._miss, version)
+        if value is self._miss:
+            cache_requests.inc(result='miss')
+            return default
+        cache_requests.inc(result='hit')
+        return value
+
+
+def _grade_saved(sender, **kwargs):
+    grades_saved.inc()
+
+
+def _announcement_saved(sender, created, **kwargs):
+    if created:
+        announcements_created.inc()
+
+
+def _logged_in(sender, **kwargs):
+    logins.inc()
+
+
+def _login_failed(sender, **kwargs):
+    failed_logins.inc()
+
+
+def connect_signals():
+    from django.contrib.auth.signals import user_logged_in, user_login_failed
+    from django.db.models.signals import post_save
+
+    post_save.connect(_grade_saved, sender='grades.Grade', dispatch_uid='metrics_grade_saved')
+    post_save.connect(_announcement_saved, sender='announcements.Announcement', dispatch_uid='metrics_announcement_saved')
+    user_logged_in.connect(_logged_in, dispatch_uid='metrics_logged_in')
+    user_login_failed.connect(_login_failed, dispatch_uid='metrics_login_failed')
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Count requests, latency and database work per URL name"""
+
+    def __init__(self, get_response):
+        connect_signals()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from .querybudget import wrap_connections
+
+        started = time.perf_counter()
+        with wrap_connections(_QueryCounter()) as queries:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        # URL names rather than paths keep the number of series bounded
+        view = match.view_name if match else '<unresolved>'
+        status = str(response.status_code)
+        http_requests.inc(view=view, method=request.method, status=status)
+        http_latency.observe(elapsed, view=view, status=status)
+        db_queries.inc(queries.count, view=view)
+        db_time.inc(queries.seconds, view=view)
+        return response
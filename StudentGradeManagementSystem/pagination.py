@@ -0,0 +1,191 @@
+"""
+Keyset (seek) pagination
+
+A page starts after the last row of the previous one: the WHERE clause
+compares the ordering columns with that row's values instead of skipping
+OFFSET rows, so every page is one index range scan however deep it is, and
+rows inserted meanwhile do not shift later pages. The ordering must be
+unique (end it with the primary key) and its columns non-null.
+
+A cursor is the ordering values of the last row, as URL-safe base64 JSON.
+
+`seek()` also pages backwards (the reversed ordering, read from the
+cursor) and merges several querysets, each read with its own range scan.
+`paginate()` wraps it for HTML views: ?after= and ?before= cursors, and a
+KeysetPage with the links to the neighbouring pages.
+"""
+import base64
+import binascii
+import datetime
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from django.http import Http404
+
+PAGE_SIZE = 25
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced for this ordering"""
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder drops microseconds, which would skip rows that differ only in them
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    data = json.dumps(list(values), cls=_CursorEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Malformed cursor') from None
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor('Cursor does not match this ordering')
+    return values
+
+
+def row_value(row, field):
+    """Value of an ordering field on a .values() dict or a model instance (following __ lookups)"""
+    if isinstance(row, dict):
+        return row[field]
+    for name in field.split('__'):
+        row = getattr(row, name)
+    return row
+
+
+def after(ordering, values):
+    """Q for the rows after `values` in `ordering`: (a > x) OR (a = x AND b > y) OR ..."""
+    terms = []
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        equal = {ordering[i].lstrip('-'): values[i] for i in range(index)}
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        terms.append(Q(**equal, **{f"{name}__{lookup}": values[index]}))
+    if len(terms) == 1:
+        return terms[0]
+    # The redundant bound on the first column lets SQLite seek the index instead of filtering the OR
+    first = ordering[0].lstrip('-')
+    bound = Q(**{f"{first}__{'lte' if ordering[0].startswith('-') else 'gte'}": values[0]})
+    return bound & reduce(or_, terms)
+
+
+def position(row, ordering):
+    """Cursor pointing at row"""
+    return encode_cursor(row_value(row, field.lstrip('-')) for field in ordering)
+
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f"-{field}" for field in ordering]
+
+
+def _sort(rows, ordering):
+    # Stable sorts from the last key to the first allow mixed directions
+    for field in reversed(ordering):
+        name = field.lstrip('-')
+        rows.sort(key=lambda row: row_value(row, name), reverse=field.startswith('-'))
+
+
+def seek(sources, ordering, cursor=None, limit=50, backwards=False):
+    """
+    Up to `limit` rows after `cursor` (before it when backwards) from one
+    queryset or several merged, in `ordering`. Returns (rows, more), where
+    more tells whether rows lie beyond the page in the direction read.
+    """
+    ordering = list(ordering)
+    scan = reverse_ordering(ordering) if backwards else ordering
+    if isinstance(sources, QuerySet):
+        sources = [sources]
+    values = decode_cursor(cursor, ordering) if cursor else None
+    rows = []
+    for queryset in sources:
+        if values is not None:
+            try:
+                queryset = queryset.filter(after(scan, values))
+            except (ValidationError, ValueError, TypeError):
+                raise InvalidCursor('Cursor values do not fit this ordering') from None
+        rows.extend(queryset.order_by(*scan)[:limit + 1])
+    if len(sources) > 1:
+        _sort(rows, scan)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    return rows, more
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=50):
+    """
+    One page of queryset in `ordering` after `cursor`; returns (rows, next_cursor).
+    next_cursor is None on the last page.
+    """
+    rows, more = seek(queryset, ordering, cursor, limit)
+    return rows, position(rows[-1], ordering) if more else None
+
+
+class KeysetPage:
+    """A page of rows for a template, with the query strings of the pages next to it"""
+
+    def __init__(self, object_list, next_query=None, previous_query=None):
+        self.object_list = object_list
+        self.next_query = next_query
+        self.previous_query = previous_query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_query is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_query is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _query(request, var, cursor):
+    query = request.GET.copy()
+    query.pop(AFTER_VAR, None)
+    query.pop(BEFORE_VAR, None)
+    query[var] = cursor
+    return f"?{query.urlencode()}"
+
+
+def paginate(request, sources, ordering, per_page=PAGE_SIZE):
+    """The page of request's ?after= or ?before= cursor; Http404 for a cursor that does not fit"""
+    before = request.GET.get(BEFORE_VAR)
+    after_cursor = None if before else request.GET.get(AFTER_VAR)
+    try:
+        rows, more = seek(sources, ordering, before or after_cursor, per_page, backwards=bool(before))
+    except InvalidCursor:
+        raise Http404('Invalid page') from None
+    if not rows:
+        return KeysetPage(rows)
+    # Reading backwards, "more" means there are earlier pages; a later one is where we came from
+    has_next = bool(before) or more
+    has_previous = more if before else bool(after_cursor)
+    return KeysetPage(
+        rows,
+        _query(request, AFTER_VAR, position(rows[-1], ordering)) if has_next else None,
+        _query(request, BEFORE_VAR, position(rows[0], ordering)) if has_previous else None,
+    )
@@ -0,0 +1,252 @@
+"""
+On-demand request profiling
+
+ProfilingMiddleware profiles a request when it carries a signed, expiring
+token minted on the staff-only admin page (the `_profile` query parameter
+or the X-Profile header), so staff can profile a page as any user, and
+for a random 1 in settings.PROFILING_SAMPLE_RATE requests.
+
+A background thread samples the request thread's stack every
+PROFILING_SAMPLE_INTERVAL seconds to build collapsed stacks; cProfile
+only keeps caller -> callee edges, so full stacks cannot be rebuilt from
+it. In 'cprofile' mode the request also runs under cProfile and its .prof
+file (for pstats or snakeviz) is kept; 'sample' mode skips cProfile and
+its overhead.
+
+Each capture is stored in settings.PROFILING_DIR as <url name>-<timestamp>
+with a .json summary, a .folded collapsed-stack file (input for
+flamegraph.pl or speedscope) and, for cProfile, the .prof file. The
+admin page at /admin/profiles/ lists and downloads them.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+from django.utils import timezone
+
+TOKEN_PARAM = '_profile'
+MODE_PARAM = '_profile_mode'
+HEADER = 'X-Profile'
+SALT = 'StudentGradeManagementSystem.profiling'
+MODES = ('cprofile', 'sample')
+EXTENSIONS = ('.json', '.folded', '.prof')
+
+_STEM = re.compile(r'^[\w.-]+$')
+_UNSAFE = re.compile(r'[^\w.-]')
+
+# cProfile cannot run in two threads at once, so one request is profiled at a time
+_profile_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def profile_dir():
+    return str(_setting('PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def make_token():
+    """Signed token that enables profiling for PROFILING_TOKEN_MAX_AGE seconds"""
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def valid_token(token):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(token, max_age=_setting('PROFILING_TOKEN_MAX_AGE', 3600))
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ',')
+
+
+class SamplingProfiler:
+    """Record the stack of one thread every `interval` seconds from a background thread"""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.samples = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+
+    def disable(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def save_capture(name, summary, collapsed, profile=None):
+    """Write one capture to PROFILING_DIR and drop the oldest beyond PROFILING_KEEP"""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{_UNSAFE.sub('.', name)}-{timezone.now():%Y%m%dT%H%M%S%f}"
+    with open(os.path.join(directory, f"{stem}.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    with open(os.path.join(directory, f"{stem}.folded"), 'w') as f:
+        f.write(collapsed)
+    if profile is not None:
+        profile.dump_stats(os.path.join(directory, f"{stem}.prof"))
+
+    captures = list_captures()
+    for old in captures[_setting('PROFILING_KEEP', 200):]:
+        delete_capture(old['stem'])
+    return stem
+
+
+def list_captures():
+    """Summaries of the stored captures, newest first"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    captures = []
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        stem = filename[:-len('.json')]
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summary['stem'] = stem
+        summary['files'] = [ext for ext in EXTENSIONS if os.path.exists(os.path.join(directory, stem + ext))]
+        captures.append(summary)
+    captures.sort(key=lambda capture: capture.get('captured_at', ''), reverse=True)
+    return captures
+
+
+def delete_capture(stem):
+    for ext in EXTENSIONS:
+        try:
+            os.remove(os.path.join(profile_dir(), stem + ext))
+        except FileNotFoundError:
+            pass
+
+
+class ProfilingMiddleware:
+    """Profile requests carrying a signed staff token, or 1 in N sampled requests"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _requested_mode(self, request):
+        """The profiler to run, if any, and whether a staff token asked for it"""
+        # Tokens are only minted on the staff admin page, so any request carrying a valid one is trusted
+        token = request.GET.get(TOKEN_PARAM) or request.headers.get(HEADER)
+        if token and valid_token(token):
+            mode = request.GET.get(MODE_PARAM)
+            return (mode if mode in MODES else _setting('PROFILING_MODE', 'cprofile')), True
+        rate = _setting('PROFILING_SAMPLE_RATE', 0)
+        if rate and random.randrange(rate) == 0:
+            return _setting('PROFILING_MODE', 'cprofile'), False
+        return None, False
+
+    def __call__(self, request):
+        mode, requested = self._requested_mode(request)
+        if mode is None or not _profile_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            sampler = SamplingProfiler(_setting('PROFILING_SAMPLE_INTERVAL', 0.001))
+            profiler = cProfile.Profile() if mode == 'cprofile' else None
+            started = time.perf_counter()
+            sampler.enable()
+            if profiler:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+                sampler.disable()
+            elapsed = time.perf_counter() - started
+        finally:
+            _profile_lock.release()
+
+        match = getattr(request, 'resolver_match', None)
+        name = match.view_name if match else 'unresolved'
+        summary = {
+            'url_name': name,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'mode': mode,
+            'user': request.user.get_username() if request.user.is_authenticated else None,
+            'captured_at': timezone.now().isoformat(),
+            'samples': sum(sampler.samples.values()),
+        }
+        if profiler:
+            summary['calls'] = pstats.Stats(profiler).total_calls
+        stem = save_capture(name, summary, sampler.collapsed(), profiler)
+        # Sampled captures stay private to the admin page; only the staff member who asked is told the name
+        if requested:
+            response[HEADER] = stem
+        return response
+
+
+@staff_member_required
+def profile_list(request):
+    """Admin page listing the captured profiles"""
+    from django.contrib import admin
+
+    context = dict(
+        admin.site.each_context(request),
+        title='Request profiles',
+        captures=list_captures(),
+        token=make_token(),
+        token_param=TOKEN_PARAM,
+        mode_param=MODE_PARAM,
+        header=HEADER,
+        sample_rate=_setting('PROFILING_SAMPLE_RATE', 0),
+    )
+    return render(request, 'admin/profiles.html', context)
+
+
+@staff_member_required
+def profile_download(request, stem, ext):
+    """Download one file of a capture"""
+    if not _STEM.match(stem) or f".{ext}" not in EXTENSIONS:
+        raise Http404
+    path = os.path.join(profile_dir(), f"{stem}.{ext}")
+    if not os.path.exists(path):
+        raise Http404
+    content_type = 'application/json' if ext == 'json' else 'text/plain' if ext == 'folded' else 'application/octet-stream'
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"{stem}.{ext}", content_type=content_type)
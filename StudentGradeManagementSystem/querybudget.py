@@ -0,0 +1,174 @@
+"""
+Per-view query budget instrumentation
+
+QueryBudgetMiddleware (enabled with settings.QUERY_BUDGET_ENABLED) records
+every query a request runs, keyed by the resolved URL name: the number of
+queries, how many were exact repeats and the time spent in the database.
+Requests over budget are logged together with the template line or code
+location that issued the repeated queries, and the totals are exposed in
+the X-Query-Budget response header.
+
+QueryBudgetTestMixin lets each app's tests declare and enforce budgets.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Query-Budget'
+DEFAULT_MAX_QUERIES = 30
+DEFAULT_MAX_DUPLICATES = 2
+
+_DJANGO_DIR = os.path.dirname(sys.modules['django'].__file__)
+
+
+def _issuer():
+    """Template line or project code location that issued the current query"""
+    frame = sys._getframe(2)
+    code_location = None
+    while frame is not None:
+        # Template nodes render through render_annotated, which knows its origin and line
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin, token = getattr(node, 'origin', None), getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f"{origin.template_name}:{token.lineno}"
+        filename = frame.f_code.co_filename
+        if code_location is None and not filename.startswith(_DJANGO_DIR) and 'site-packages' not in filename \
+                and filename != __file__ and str(settings.BASE_DIR) in filename:
+            code_location = f"{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return code_location or 'unknown'
+
+
+@contextmanager
+def wrap_connections(wrapper):
+    """execute_wrapper(wrapper) on every database alias, so queries routed to replicas and shards count too"""
+    with ExitStack() as stack:
+        for alias_connection in connections.all():
+            stack.enter_context(alias_connection.execute_wrapper(wrapper))
+        yield wrapper
+
+
+class QueryRecorder:
+    """execute_wrapper recording SQL, parameters, duration and issuer"""
+
+    def __init__(self, locate=True):
+        self.locate = locate
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': params,
+                'seconds': time.perf_counter() - started,
+                'location': _issuer() if self.locate else None,
+            })
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def seconds(self):
+        return sum(query['seconds'] for query in self.queries)
+
+    def duplicates(self):
+        """{(sql, params): times run} for statements executed more than once with the same parameters"""
+        counts = Counter((query['sql'], repr(query['params'])) for query in self.queries)
+        return {key: n for key, n in counts.items() if n > 1}
+
+    @property
+    def duplicate_count(self):
+        return sum(n - 1 for n in self.duplicates().values())
+
+    def similar(self):
+        """{sql: [locations]} for statements run more than once with any parameters (likely N+1)"""
+        locations = defaultdict(list)
+        for query in self.queries:
+            locations[query['sql']].append(query['location'])
+        return {sql: where for sql, where in locations.items() if len(where) > 1}
+
+    def report(self):
+        """Human-readable summary of the repeated statements and where they came from"""
+        lines = []
+        for sql, where in sorted(self.similar().items(), key=lambda item: -len(item[1])):
+            lines.append(f"{len(where)}x {sql[:200]}")
+            for location, n in Counter(where).most_common(3):
+                lines.append(f"    {n}x from {location}")
+        return '\n'.join(lines)
+
+
+_totals = defaultdict(lambda: {'requests': 0, 'queries': 0, 'duplicates': 0, 'seconds': 0.0})
+_totals_lock = threading.Lock()
+
+
+def totals():
+    """Accumulated per URL name statistics for this process"""
+    with _totals_lock:
+        return {name: dict(stats) for name, stats in _totals.items()}
+
+
+def reset_totals():
+    with _totals_lock:
+        _totals.clear()
+
+
+class QueryBudgetMiddleware:
+    """Count queries, duplicates and DB time per resolved URL name"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.max_queries = getattr(settings, 'QUERY_BUDGET_MAX_QUERIES', DEFAULT_MAX_QUERIES)
+        self.max_duplicates = getattr(settings, 'QUERY_BUDGET_MAX_DUPLICATES', DEFAULT_MAX_DUPLICATES)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with wrap_connections(recorder):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        name = match.view_name if match else request.path
+        duplicates = recorder.duplicate_count
+        with _totals_lock:
+            stats = _totals[name]
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['duplicates'] += duplicates
+            stats['seconds'] += recorder.seconds
+
+        response[HEADER] = f"view={name}; queries={recorder.count}; duplicates={duplicates}; db_ms={recorder.seconds * 1000:.1f}"
+        if recorder.count > self.max_queries or duplicates > self.max_duplicates:
+            logger.warning(
+                "%s ran %d queries (%d duplicates, %.1f ms)\n%s",
+                name, recorder.count, duplicates, recorder.seconds * 1000, recorder.report()
+            )
+        return response
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin enforcing a maximum number of queries for a view"""
+
+    def assertQueryBudget(self, url, max_queries, data=None, method='get', max_duplicates=0):
+        recorder = QueryRecorder()
+        with wrap_connections(recorder):
+            response = getattr(self.client, method)(url, data or {})
+        message = f"{url} ran {recorder.count} queries ({recorder.duplicate_count} duplicates)\n{recorder.report()}"
+        self.assertLessEqual(recorder.count, max_queries, message)
+        self.assertLessEqual(recorder.duplicate_count, max_duplicates, message)
+        return response
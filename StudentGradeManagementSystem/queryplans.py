@@ -0,0 +1,67 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot view queries
+
+The tests capture every query a view runs and ask SQLite how it would
+execute each SELECT. A plan that reads a whole table or sorts through a
+temporary B-tree means an index is missing or a query stopped matching
+the index it was written for.
+"""
+import re
+
+from django.db import connection
+
+_TABLE_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def explain(sql, params=()):
+    """The detail column of EXPLAIN QUERY PLAN for one statement"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(sql, params=(), allow=()):
+    """
+    Plan steps that scan a whole table or build a temporary B-tree.
+    Steps containing any string in `allow` are accepted; scans of CTEs
+    and subquery results are not table scans and are always accepted.
+    """
+    tables = set(connection.introspection.table_names())
+    problems = []
+    for detail in explain(sql, params):
+        if any(allowed in detail for allowed in allow):
+            continue
+        scan = _TABLE_SCAN.match(detail)
+        if (scan and scan.group(1) in tables) or 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+def captured_plan_problems(captured_queries, allow=()):
+    """
+    (sql, problems) for every captured SELECT with a bad plan.
+    captured_queries is the list recorded by CaptureQueriesContext, whose
+    SQL already has its parameters interpolated.
+    """
+    bad = []
+    for query in captured_queries:
+        sql = query['sql']
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            continue
+        problems = plan_problems(sql, allow=allow)
+        if problems:
+            bad.append((sql, problems))
+    return bad
+
+
+class QueryPlanTestMixin:
+    """TestCase mixin asserting that every query a view runs is served by an index"""
+
+    def assertViewUsesIndexes(self, url, data=None, method='get', allow=()):
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method)(url, data or {})
+        bad = captured_plan_problems(captured.captured_queries, allow)
+        self.assertFalse(bad, '\n\n'.join(f"{', '.join(problems)}\n{sql}" for sql, problems in bad))
+        return response
@@ -0,0 +1,147 @@
+"""
+Primary/replica database routing
+
+PrimaryReplicaRouter sends reads to the aliases in settings.DATABASE_REPLICAS
+and every write to the primary ('default'). A request is pinned to the
+primary from its first write onwards, and ReplicaPinningMiddleware keeps the
+browser pinned for REPLICA_PIN_SECONDS afterwards with a cookie, so the page
+a POST redirects to reads what it just wrote (read-your-writes) while the
+replicas catch up.
+
+The replicas are local SQLite files refreshed from the primary through
+SQLite's online backup API (`sync_replicas()` or the sync_replicas command),
+a stand-in for real streaming replicas. Pick REPLICA_PIN_SECONDS longer than
+the sync interval.
+
+Code that must see the primary, such as a read-modify-write view or a
+management command checking what it just wrote, uses `primary()` as a
+context manager or the `use_primary` decorator.
+"""
+import contextvars
+import functools
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+
+# Session rows are read right after they are written, on every request; job and outbox rows by the workers and relays
+PRIMARY_ONLY_APPS = {'sessions', 'jobs', 'outbox'}
+
+
+class _RoutingState:
+    __slots__ = ('forced', 'pinned', 'wrote')
+
+    def __init__(self, forced=False, pinned=False):
+        self.forced = forced
+        self.pinned = pinned
+        self.wrote = False
+
+
+# A mutable holder, so writes inside sync_to_async threads still pin the request
+_state = contextvars.ContextVar('database_routing', default=None)
+
+
+def replicas():
+    # The test runner's TEST['MIRROR'] points a replica at the primary's database; that one is skipped
+    primary_name = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+    return [
+        alias for alias in getattr(settings, 'DATABASE_REPLICAS', ())
+        if connections[alias].settings_dict['NAME'] != primary_name
+    ]
+
+
+def pinned():
+    """Whether reads in the current context go to the primary"""
+    state = _state.get()
+    return state is not None and (state.forced or state.pinned)
+
+
+@contextmanager
+def primary():
+    """Send every read in the block to the primary"""
+    outer = _state.get()
+    state = _RoutingState(forced=True)
+    token = _state.set(state)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+        # Writes in the block still pin the surrounding request
+        if outer is not None and state.wrote:
+            outer.pinned = outer.wrote = True
+
+
+def use_primary(view_func):
+    """Decorator for views and helpers that must read from the primary"""
+    @functools.wraps(view_func)
+    def wrapper(*args, **kwargs):
+        with primary():
+            return view_func(*args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or pinned() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        # Reads inside a write transaction must see its uncommitted rows
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are full copies of the primary, schema included
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """Track writes per request and pin the browser to the primary after one"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10), httponly=True, samesite='Lax',
+            )
+        return response
+
+
+def sync_replicas(aliases=None):
+    """Copy the primary over each replica with the SQLite backup API"""
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    synced = []
+    for alias in aliases or replicas():
+        target = connections[alias]
+        target.ensure_connection()
+        source.connection.backup(target.connection)
+        synced.append(alias)
+    return synced
+
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,17 +40,29 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'accounts',
     'announcements',
+    'api',
     'courses',
     'grades',
+    'jobs',
+    'outbox',
+    # The project package owns the database infrastructure and its management commands
+    'StudentGradeManagementSystem',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'StudentGradeManagementSystem.metrics.MetricsMiddleware',
+    'StudentGradeManagementSystem.querybudget.QueryBudgetMiddleware',
+    'StudentGradeManagementSystem.slowqueries.SlowQueryMiddleware',
+    'StudentGradeManagementSystem.locks.LockTimeoutMiddleware',
+    'StudentGradeManagementSystem.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'StudentGradeManagementSystem.sharding.CampusMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'StudentGradeManagementSystem.profiling.ProfilingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -78,13 +91,66 @@ WSGI_APPLICATION = 'StudentGradeManagementSystem.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite is tuned for concurrent use on every new connection: WAL lets readers
+# run alongside the writer, IMMEDIATE transactions take the write lock up front
+# (a DEFERRED transaction that later upgrades fails at once with "database is
+# locked" instead of waiting) and `timeout` is the busy handler. Connections
+# are kept for CONN_MAX_AGE seconds instead of being reopened per request.
+# SGMS_DATABASE_PROFILE=baseline restores the SQLite defaults, for before and
+# after runs of `manage.py http_loadtest`.
+DATABASE_PROFILES = {
+    'production': {
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA temp_store=MEMORY'
+            ),
+        },
+    },
+    'baseline': {
+        'OPTIONS': {
+            # WAL is persistent in the database file, so it has to be switched back off
+            'init_command': 'PRAGMA journal_mode=DELETE',
+        },
+    },
+}
+DATABASE_PROFILE = os.environ.get('SGMS_DATABASE_PROFILE', 'production')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **DATABASE_PROFILES[DATABASE_PROFILE],
     }
 }
 
+# SGMS_READ_REPLICAS=N adds N read replicas: SQLite copies of the primary
+# refreshed by `manage.py sync_replicas`. Reads go to a replica unless the
+# request has written, or the browser wrote within REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = [f'replica{n}' for n in range(1, int(os.environ.get('SGMS_READ_REPLICAS', 0)) + 1)]
+for _alias in DATABASE_REPLICAS:
+    DATABASES[_alias] = dict(DATABASES['default'], NAME=BASE_DIR / f'db.{_alias}.sqlite3', TEST={'MIRROR': 'default'})
+REPLICA_PIN_SECONDS = 10
+
+# SGMS_CAMPUS_SHARDS=north,south adds one database per campus shard
+# (campus_north, ...). A Campus whose `database` names one of them keeps its
+# courses, grades and announcements there; users stay in 'default'.
+CAMPUS_DATABASES = [f'campus_{name.strip()}' for name in os.environ.get('SGMS_CAMPUS_SHARDS', '').split(',') if name.strip()]
+for _alias in CAMPUS_DATABASES:
+    DATABASES[_alias] = dict(DATABASES['default'], NAME=BASE_DIR / f'db.{_alias}.sqlite3')
+
+DATABASE_ROUTERS = [
+    'StudentGradeManagementSystem.sharding.CampusRouter',
+    'StudentGradeManagementSystem.routers.PrimaryReplicaRouter',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,6 +202,43 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Query budget instrumentation (X-Query-Budget header, warnings for offenders)
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_MAX_QUERIES = 30
+QUERY_BUDGET_MAX_DUPLICATES = 2
+
+# Slow-query log (see StudentGradeManagementSystem/slowqueries.py); None disables it
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG = BASE_DIR / 'logs' / 'slow_queries.log'
+SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Metrics served at /metrics (see StudentGradeManagementSystem/metrics.py)
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # staff users may always read them
+# Bearer token for scrapers; behind a reverse proxy every request comes from the
+# proxy's address, so empty METRICS_ALLOWED_IPS there and set this instead
+METRICS_TOKEN = os.environ.get('SGMS_METRICS_TOKEN')
+METRICS_MULTIPROC_DIR = None  # shared directory for multi-process servers such as gunicorn
+
+CACHES = {
+    'default': {
+        # Django's local-memory cache, counting hits and misses for the metrics
+        'BACKEND': 'StudentGradeManagementSystem.metrics.LocMemCache',
+    }
+}
+
+# Request profiling (see StudentGradeManagementSystem/profiling.py)
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MODE = 'cprofile'  # or 'sample'
+PROFILING_SAMPLE_RATE = 0  # profile 1 in N requests; 0 only profiles on a signed staff request
+PROFILING_SAMPLE_INTERVAL = 0.001  # seconds between stack samples in 'sample' mode
+PROFILING_TOKEN_MAX_AGE = 3600  # seconds a token from /admin/profiles/ stays valid
+PROFILING_KEEP = 200  # newest captures kept on disk
+
+# Live announcements (server-sent events, served through asgi.py)
+ANNOUNCEMENT_BROKER = 'announcements.pubsub.InProcessBroker'
+ANNOUNCEMENT_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+
 # Login/Logout URLs
 LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'accounts:dashboard'
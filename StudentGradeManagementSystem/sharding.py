@@ -0,0 +1,234 @@
+"""
+Campus sharding
+
+Each Campus keeps its programs, subjects, enrollments, grades,
+announcements and outbox events in its own database alias
+(Campus.database, one of settings.CAMPUS_DATABASES). Campuses without one
+live in 'default'.
+Users, sessions and the Campus directory always stay in 'default', where
+logins happen. CampusMiddleware then routes the rest of the request to the
+database of request.user.campus.
+
+Rows on a shard refer to users by id, and joins such as
+Enrollment.objects.select_related('student') run inside the shard. So a
+campus's users, their profiles and the campus rows themselves are copied
+to the shard whenever they are saved (courses/signals.py), and by
+`replicate()` after bulk inserts. Deleting a user from 'default' also
+deletes its copies, and everything that cascades from them, on every
+shard.
+
+Outside a request, `using_campus()` picks the database. `fan_out()` runs a
+function against every campus database in parallel threads. The
+cross-campus admin report at /admin/campus-report/ and the `shards`
+command (migrate, seed, export, report) are built on it.
+"""
+import contextvars
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.shortcuts import render
+
+SHARDED_APPS = {'courses', 'grades', 'announcements', 'outbox'}
+
+# Kept in 'default' and copied to the shards that reference them
+REFERENCE_MODELS = {'accounts.user', 'accounts.studentprofile', 'accounts.instructorprofile', 'courses.campus'}
+
+PASSING_AVERAGE = 75
+
+_current = contextvars.ContextVar('campus_database', default=None)
+_campus_aliases = {}
+
+
+def shards():
+    return list(getattr(settings, 'CAMPUS_DATABASES', ()))
+
+
+def campus_databases():
+    """'default' (campuses without a shard) followed by every shard"""
+    return [DEFAULT_DB_ALIAS, *shards()]
+
+
+def is_sharded(model):
+    """Whether a model (or an instance, possibly behind request.user's lazy proxy) lives on the campus databases"""
+    return model._meta.app_label in SHARDED_APPS and model._meta.label_lower not in REFERENCE_MODELS
+
+
+def current_database():
+    """Database the sharded models use in this context"""
+    return _current.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def using_campus(alias):
+    """Route the sharded models to the campus database `alias` in the block"""
+    token = _current.set(alias)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def campus_database(campus_id):
+    """Database alias of a campus, cached per process"""
+    if campus_id is None:
+        return DEFAULT_DB_ALIAS
+    if campus_id not in _campus_aliases:
+        from courses.models import Campus
+
+        database = Campus.objects.using(DEFAULT_DB_ALIAS).filter(pk=campus_id).values_list('database', flat=True).first()
+        _campus_aliases[campus_id] = database or DEFAULT_DB_ALIAS
+    return _campus_aliases[campus_id]
+
+
+def forget_campus(campus_id=None):
+    """Drop a campus's cached alias, or every cached alias without campus_id"""
+    if campus_id is None:
+        _campus_aliases.clear()
+    else:
+        _campus_aliases.pop(campus_id, None)
+
+
+class CampusRouter:
+    """Send the sharded apps to the campus database of the current context"""
+
+    def _database(self, model, **hints):
+        if not is_sharded(model):
+            return None
+        # Related lookups and saves stay on the shard the instance came from (not on a read replica)
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(instance) and instance._state.db in shards():
+            return instance._state.db
+        return _current.get()
+
+    db_for_read = _database
+    db_for_write = _database
+
+    def allow_relation(self, obj1, obj2, **hints):
+        sharded = is_sharded(obj1), is_sharded(obj2)
+        if all(sharded):
+            return obj1._state.db == obj2._state.db
+        # Users and campuses are copied to the shards that point at them
+        if any(sharded):
+            return True
+        return None
+
+
+class CampusMiddleware:
+    """Route the request to the campus database of the logged-in user"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        alias = None
+        if shards() and request.user.is_authenticated:
+            alias = campus_database(request.user.campus_id)
+        # Campuses kept in 'default' are left to the next router, which may read from a replica
+        token = _current.set(alias if alias != DEFAULT_DB_ALIAS else None)
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+
+
+def replicate(instances, alias):
+    """Insert or update copies of reference rows (users, profiles, campuses) on a shard"""
+    instances = list(instances)
+    if not instances or alias == DEFAULT_DB_ALIAS:
+        return
+    model = type(instances[0])
+    fields = model._meta.concrete_fields
+    copies = [model(**{field.attname: getattr(instance, field.attname) for field in fields}) for instance in instances]
+    model._base_manager.using(alias).bulk_create(
+        copies, batch_size=500, update_conflicts=True, unique_fields=[model._meta.pk.name],
+        update_fields=[field.name for field in fields if not field.primary_key],
+    )
+
+
+def purge(model, pk):
+    """Delete the copies of a reference row, and what cascades from them, on every shard"""
+    for alias in shards():
+        with using_campus(alias):
+            model._base_manager.using(alias).filter(pk=pk).delete()
+
+
+def fan_out(function, aliases=None, workers=None):
+    """Call function(alias) for each campus database in parallel threads; {alias: result}"""
+    aliases = list(aliases or campus_databases())
+    if len(aliases) == 1:
+        # One database needs no thread, and the caller's connections stay open
+        with using_campus(aliases[0]):
+            return {aliases[0]: function(aliases[0])}
+
+    def run(alias):
+        try:
+            with using_campus(alias):
+                return function(alias)
+        finally:
+            # Each worker thread opened its own connections
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=workers or len(aliases)) as pool:
+        return dict(zip(aliases, pool.map(run, aliases)))
+
+
+def _campus_totals(alias):
+    """Counts and grade statistics per campus id on one database"""
+    from django.db.models import Avg, Count, Q
+    from courses.models import Course, Enrollment, Subject
+    from grades.models import Grade
+
+    totals = defaultdict(dict)
+    for row in Course.objects.order_by().values('campus_id').annotate(n=Count('id')):
+        totals[row['campus_id']]['courses'] = row['n']
+    for row in Subject.objects.order_by().values('course__campus_id').annotate(n=Count('id')):
+        totals[row['course__campus_id']]['subjects'] = row['n']
+    for row in Enrollment.objects.order_by().values('subject__course__campus_id').annotate(
+        n=Count('id'), students=Count('student_id', distinct=True),
+    ):
+        totals[row['subject__course__campus_id']].update(enrollments=row['n'], students=row['students'])
+    for row in Grade.objects.filter(weighted_average__isnull=False).order_by().values(
+        'enrollment__subject__course__campus_id'
+    ).annotate(n=Count('id'), average=Avg('weighted_average'), passed=Count('id', filter=Q(weighted_average__gte=PASSING_AVERAGE))):
+        totals[row['enrollment__subject__course__campus_id']].update(
+            graded=row['n'], average=float(row['average']), passed=row['passed'],
+        )
+    return dict(totals)
+
+
+def campus_report(aliases=None):
+    """Scatter the per-campus totals query over the campus databases and gather one row per campus"""
+    from courses.models import Campus
+
+    campuses = {campus.id: campus for campus in Campus.objects.using(DEFAULT_DB_ALIAS).all()}
+    columns = ('courses', 'subjects', 'students', 'enrollments', 'graded', 'passed')
+    rows = []
+    for alias, totals in fan_out(_campus_totals, aliases).items():
+        for campus_id, values in totals.items():
+            campus = campuses.get(campus_id)
+            row = {'database': alias, 'campus': campus.code if campus else '(none)', 'name': campus.name if campus else ''}
+            row.update({column: values.get(column, 0) for column in columns})
+            row['average'] = round(values['average'], 2) if values.get('average') is not None else None
+            rows.append(row)
+    rows.sort(key=lambda row: (row['campus'], row['database']))
+
+    total = {column: sum(row[column] for row in rows) for column in columns}
+    graded = [row for row in rows if row['average'] is not None]
+    total['average'] = round(sum(row['average'] * row['graded'] for row in graded) / total['graded'], 2) if total['graded'] else None
+    for row in rows + [total]:
+        row['pass_rate'] = round(row['passed'] / row['graded'] * 100, 1) if row['graded'] else None
+    return {'rows': rows, 'total': total}
+
+
+@staff_member_required
+def campus_report_view(request):
+    """Admin page with enrollment and grade totals gathered from every campus database"""
+    from django.contrib import admin
+
+    context = dict(admin.site.each_context(request), title='Campus report', report=campus_report(), shards=shards())
+    return render(request, 'admin/campus_report.html', context)
+
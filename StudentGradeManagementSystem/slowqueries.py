@@ -0,0 +1,262 @@
+"""
+Slow-query log
+
+SlowQueryRecorder is a connection.execute_wrapper that times every
+statement. Statements at or over settings.SLOW_QUERY_THRESHOLD_MS are
+written as JSON lines to the rotating settings.SLOW_QUERY_LOG file with
+their parameters, the URL name of the request that ran them, the project
+code stack and SQLite's EXPLAIN QUERY PLAN. Anything faster only costs a
+perf_counter() pair and a comparison.
+
+SlowQueryMiddleware installs the recorder on every database connection
+(including ones opened later by other threads) and tags queries with the
+current view. Entries are grouped by a normalized SQL fingerprint, so the
+`slow_queries` command can rank the worst statements across many calls.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+DEFAULT_THRESHOLD_MS = 100
+MAX_PARAMS_LENGTH = 500
+STACK_DEPTH = 8
+
+_current_view = contextvars.ContextVar('slow_query_view', default=None)
+_explaining = threading.local()
+
+_DJANGO_DIR = os.path.dirname(sys.modules['django'].__file__)
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """SQL with literals replaced and IN lists collapsed, so repeats of one query compare equal"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def _stack():
+    """Innermost project code frames, formatted as path:line in function"""
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < STACK_DEPTH:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_DJANGO_DIR) and 'site-packages' not in filename \
+                and filename != __file__ and str(settings.BASE_DIR) in filename:
+            frames.append(f"{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return frames
+
+
+def _explain(db, sql, params):
+    if db.vendor != 'sqlite' or not sql.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE')):
+        return None
+    # The EXPLAIN goes through the execute wrappers too; don't record it
+    _explaining.active = True
+    try:
+        with db.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+    except Exception:
+        return None
+    finally:
+        _explaining.active = False
+
+
+_log_lock = threading.Lock()
+_logger = None
+
+
+def _get_logger():
+    """Module logger writing JSON lines to the rotating SLOW_QUERY_LOG file"""
+    global _logger
+    with _log_lock:
+        if _logger is None:
+            path = str(settings.SLOW_QUERY_LOG)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=getattr(settings, 'SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024),
+                backupCount=getattr(settings, 'SLOW_QUERY_LOG_BACKUPS', 5),
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            _logger = logging.getLogger(__name__)
+            _logger.addHandler(handler)
+            _logger.setLevel(logging.INFO)
+            _logger.propagate = False
+        return _logger
+
+
+def close_log():
+    """Close the log file; the next entry reopens SLOW_QUERY_LOG with the current settings"""
+    global _logger
+    with _log_lock:
+        if _logger is not None:
+            for handler in list(_logger.handlers):
+                _logger.removeHandler(handler)
+                handler.close()
+            _logger = None
+
+
+def write_entry(entry):
+    _get_logger().info(json.dumps(entry, default=str))
+
+
+class SlowQueryRecorder:
+    """connection.execute_wrapper passing statements over `threshold_ms` to `sink`"""
+
+    def __init__(self, threshold_ms=DEFAULT_THRESHOLD_MS, sink=write_entry):
+        self.threshold = threshold_ms / 1000
+        self.sink = sink
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold and not getattr(_explaining, 'active', False):
+                self.record(sql, params, many, context['connection'], elapsed)
+
+    def record(self, sql, params, many, db, elapsed):
+        self.sink({
+            'at': timezone.now().isoformat(),
+            'fingerprint': fingerprint(sql),
+            'ms': round(elapsed * 1000, 3),
+            'sql': sql,
+            'params': None if many else repr(params)[:MAX_PARAMS_LENGTH],
+            'many': many,
+            'alias': db.alias,
+            'view': _current_view.get(),
+            'stack': _stack(),
+            'plan': None if many else _explain(db, sql, params),
+        })
+
+
+def _threshold():
+    return getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+
+
+_installed = None
+
+
+def _attach(sender=None, connection=None, **kwargs):
+    # connection.execute_wrapper() blocks pop the last wrapper on exit, so this one goes first
+    if _installed is not None and _installed not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _installed)
+
+
+def install():
+    """Record slow queries on every current and future connection of this process"""
+    global _installed
+    if _installed is None:
+        _installed = SlowQueryRecorder(_threshold())
+        connection_created.connect(_attach, dispatch_uid='slow_query_recorder')
+    for db in connections.all(initialized_only=True):
+        _attach(connection=db)
+
+
+@contextmanager
+def recording(threshold_ms=0, sink=None):
+    """Collect the slow queries run on the default connection in a block"""
+    entries = []
+    with connection.execute_wrapper(SlowQueryRecorder(threshold_ms, sink or entries.append)):
+        yield entries
+
+
+class SlowQueryMiddleware:
+    """Install the recorder and tag recorded queries with the URL name of the request"""
+
+    def __init__(self, get_response):
+        if _threshold() is None:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_view.set(request.path)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _current_view.set(request.resolver_match.view_name)
+
+
+def read_log(path=None):
+    """Entries from the slow-query log and its rotated backups, oldest file first"""
+    path = str(path or settings.SLOW_QUERY_LOG)
+    backups = getattr(settings, 'SLOW_QUERY_LOG_BACKUPS', 5)
+    for candidate in [f"{path}.{n}" for n in range(backups, 0, -1)] + [path]:
+        if not os.path.exists(candidate):
+            continue
+        with open(candidate) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def aggregate(entries):
+    """Per fingerprint totals, slowest example and the views that ran it"""
+    groups = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': defaultdict(int)})
+    for entry in entries:
+        group = groups[entry['fingerprint']]
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['views'][entry.get('view') or '-'] += 1
+        if entry['ms'] >= group['max_ms']:
+            group.update(max_ms=entry['ms'], sql=entry['sql'], params=entry.get('params'),
+                         plan=entry.get('plan'), stack=entry.get('stack'), last_at=entry.get('at'))
+    for key, group in groups.items():
+        group['fingerprint'] = key
+        group['mean_ms'] = group['total_ms'] / group['count']
+        group['views'] = dict(group['views'])
+    return list(groups.values())
+
+
+def measure_overhead(statements=20000, sql='SELECT 1'):
+    """Microseconds per statement added by a recorder that records nothing"""
+    def run():
+        with connection.cursor() as cursor:
+            started = time.perf_counter()
+            for _ in range(statements):
+                cursor.execute(sql)
+            return time.perf_counter() - started
+
+    run()  # warm up the connection and statement cache
+    bare = min(run() for _ in range(3))
+    with connection.execute_wrapper(SlowQueryRecorder(threshold_ms=60_000, sink=lambda entry: None)):
+        wrapped = min(run() for _ in range(3))
+    return {
+        'statements': statements,
+        'bare_us': round(bare / statements * 1e6, 3),
+        'wrapped_us': round(wrapped / statements * 1e6, 3),
+        'overhead_us': round((wrapped - bare) / statements * 1e6, 3),
+        'overhead_pct': round((wrapped - bare) / bare * 100, 1),
+    }
@@ -0,0 +1,88 @@
+"""
+Test support
+
+Mixins that give a TransactionTestCase real extra databases: a replica
+for the primary/replica router (routers.py) and campus shards for the
+campus router (sharding.py). They are test-only and are never imported
+by the running site.
+"""
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+
+from .routers import sync_replicas
+from .sharding import forget_campus
+
+
+class ReplicaTestMixin:
+    """
+    Give a TransactionTestCase a real, separate replica: a temporary SQLite
+    file registered as the 'replica' alias and synced from the test database
+    at the end of setUp. TestCase would not work, since the backup cannot see
+    rows inside its open transaction.
+    """
+    replica_alias = 'replica'
+
+    @classmethod
+    def setUpClass(cls):
+        cls._replica_dir = tempfile.mkdtemp()
+        connections.settings[cls.replica_alias] = dict(
+            connections[DEFAULT_DB_ALIAS].settings_dict,
+            NAME=os.path.join(cls._replica_dir, 'replica.sqlite3'),
+            # Refreshed by sync_replicas(), so the test runner never flushes it
+            TEST={'MIRROR': DEFAULT_DB_ALIAS},
+        )
+        cls.databases = {*cls.databases, cls.replica_alias}
+        cls._replica_settings = override_settings(DATABASE_REPLICAS=[cls.replica_alias])
+        cls._replica_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._replica_settings.disable()
+        connections[cls.replica_alias].close()
+        del connections[cls.replica_alias]
+        del connections.settings[cls.replica_alias]
+        shutil.rmtree(cls._replica_dir, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        sync_replicas()
+
+
+class ShardTestMixin:
+    """
+    Give a TransactionTestCase two extra campus databases: temporary SQLite
+    files registered as `shard_aliases`, migrated once per class and listed
+    in settings.CAMPUS_DATABASES
+    """
+    shard_aliases = ('campus_a', 'campus_b')
+
+    @classmethod
+    def setUpClass(cls):
+        cls._shard_dir = tempfile.mkdtemp()
+        for alias in cls.shard_aliases:
+            connections.settings[alias] = dict(
+                connections[DEFAULT_DB_ALIAS].settings_dict, NAME=os.path.join(cls._shard_dir, f"{alias}.sqlite3"),
+            )
+            call_command('migrate', database=alias, verbosity=0)
+        cls.databases = {*cls.databases, *cls.shard_aliases}
+        cls._shard_settings = override_settings(CAMPUS_DATABASES=list(cls.shard_aliases))
+        cls._shard_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._shard_settings.disable()
+        for alias in cls.shard_aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(cls._shard_dir, ignore_errors=True)
+        forget_campus()
@@ -0,0 +1,382 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from courses.models import Campus, Course, Enrollment, Subject
+from grades.models import Grade
+from grades.tests import create_grade_fixture
+from .routers import PIN_COOKIE, primary, sync_replicas
+from .sharding import campus_report, using_campus
+from .testing import ReplicaTestMixin, ShardTestMixin
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='pass12345', role='student')
+        cls.staff = User.objects.create_user('staff', password='pass12345', role='admin', is_staff=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(PROFILING_DIR=self.directory)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_only_signed_requests_are_profiled(self):
+        from .profiling import HEADER, list_captures, make_token
+
+        self.client.force_login(self.student)
+        url = reverse('accounts:student_dashboard')
+        self.assertNotIn(HEADER, self.client.get(url))
+        self.assertNotIn(HEADER, self.client.get(url, {'_profile': 'profile:forged:token'}))
+
+        response = self.client.get(url, {'_profile': make_token()})
+        capture, = list_captures()
+        self.assertEqual(response[HEADER], capture['stem'])
+        self.assertEqual((capture['url_name'], capture['status'], capture['mode']), ('accounts:student_dashboard', 200, 'cprofile'))
+        self.assertEqual(capture['files'], ['.json', '.folded', '.prof'])
+        with open(os.path.join(self.directory, capture['stem'] + '.folded')) as f:
+            self.assertIn('student_dashboard (accounts/views.py:', f.read())
+
+    def test_sampling_profiler_and_one_in_n_sampling(self):
+        from .profiling import HEADER, list_captures, make_token
+
+        self.client.force_login(self.student)
+        self.client.get(reverse('accounts:view_all_grades'), HTTP_X_PROFILE=make_token(), data={'_profile_mode': 'sample'})
+        self.assertEqual(list_captures()[0]['files'], ['.json', '.folded'])
+        with override_settings(PROFILING_SAMPLE_RATE=1):
+            # Sampled captures are saved, but their names are not handed to whoever made the request
+            self.assertNotIn(HEADER, self.client.get(reverse('accounts:login')))
+        self.assertEqual(len(list_captures()), 2)
+
+    def test_admin_page_lists_and_downloads_captures(self):
+        from .profiling import list_captures, make_token
+
+        self.client.force_login(self.student)
+        self.client.get(reverse('accounts:student_dashboard'), {'_profile': make_token()})
+        stem = list_captures()[0]['stem']
+        download = reverse('admin_profile_download', args=[stem, 'prof'])
+        self.assertEqual(self.client.get(download).status_code, 302)
+
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get(reverse('admin_profiles')), stem)
+        response = self.client.get(download)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(self.client.get(reverse('admin_profile_download', args=[stem, 'py'])).status_code, 404)
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        Subject.objects.create(code='CS101', name='Intro', course=course, instructor=cls.instructor)
+
+    def test_fingerprint_ignores_literals_and_in_list_length(self):
+        from .slowqueries import fingerprint
+
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND n = 3'),
+            fingerprint('SELECT *  FROM t WHERE id IN (%s, %s, %s, %s) AND n = 42'),
+        )
+        self.assertNotEqual(fingerprint('SELECT a FROM t'), fingerprint('SELECT b FROM t'))
+
+    def test_records_params_view_stack_and_plan(self):
+        from .slowqueries import _current_view, recording
+
+        token = _current_view.set('courses:subject_list')
+        try:
+            with recording(threshold_ms=0) as entries:
+                list(Subject.objects.filter(code='CS101'))
+        finally:
+            _current_view.reset(token)
+        entry, = entries
+        self.assertEqual(entry['view'], 'courses:subject_list')
+        self.assertIn("'CS101'", entry['params'])
+        self.assertTrue(entry['stack'][0].startswith('StudentGradeManagementSystem/tests.py:'), entry['stack'])
+        self.assertTrue(any('courses_subject' in step for step in entry['plan']))
+
+        with recording(threshold_ms=10_000) as entries:
+            list(Subject.objects.all())
+        self.assertEqual(entries, [])
+
+    def test_log_rotation_and_top_offenders_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from . import slowqueries
+        from .slowqueries import recording
+
+        directory = tempfile.mkdtemp()
+        log = os.path.join(directory, 'slow.log')
+        # Room for about one entry per file, so every write past the first rotates
+        with override_settings(SLOW_QUERY_LOG=log, SLOW_QUERY_LOG_MAX_BYTES=1500, SLOW_QUERY_LOG_BACKUPS=5):
+            slowqueries.close_log()
+            try:
+                with recording(threshold_ms=0, sink=slowqueries.write_entry):
+                    for _ in range(3):
+                        list(Subject.objects.filter(code='CS101'))
+                    Course.objects.count()
+            finally:
+                slowqueries.close_log()
+            self.assertTrue(os.path.exists(f"{log}.1"))
+            self.assertLess(os.path.getsize(log), 1500)
+
+            groups = slowqueries.aggregate(slowqueries.read_log(log))
+            self.assertEqual(sorted(group['count'] for group in groups), [1, 3])
+            out = StringIO()
+            call_command('slow_queries', log=log, order='count', top=1, stdout=out)
+        self.assertIn('3x', out.getvalue())
+        self.assertIn('courses_subject', out.getvalue())
+        shutil.rmtree(directory)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='pass12345', role='student')
+
+    def setUp(self):
+        from . import metrics
+
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def sample(self, text, line):
+        """Value of one exposition line, or None if absent"""
+        for candidate in text.splitlines():
+            if candidate.rsplit(' ', 1)[0] == line:
+                return float(candidate.rsplit(' ', 1)[1])
+        return None
+
+    def test_requests_queries_and_domain_counters(self):
+        from courses.models import Course, Enrollment, Subject
+        from grades.models import Grade
+
+        self.client.post(reverse('accounts:login'), {'username': 'student', 'password': 'wrong'})
+        self.client.post(reverse('accounts:login'), {'username': 'student', 'password': 'pass12345'})
+        self.client.get(reverse('accounts:student_dashboard'))
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        subject = Subject.objects.create(code='CS101', name='Intro', course=course)
+        Grade.objects.create(enrollment=Enrollment.objects.create(student=self.student, subject=subject))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertEqual(self.sample(text, 'logins_total'), 1)
+        self.assertEqual(self.sample(text, 'failed_logins_total'), 1)
+        self.assertEqual(self.sample(text, 'grades_saved_total'), 1)
+        self.assertEqual(self.sample(text, 'announcements_created_total'), 0)
+        self.assertEqual(self.sample(text, 'http_requests_total{method="POST",status="302",view="accounts:login"}'), 1)
+        dashboard = 'status="200",view="accounts:student_dashboard"'
+        self.assertEqual(self.sample(text, f'http_request_duration_seconds_bucket{{{dashboard},le="+Inf"}}'), 1)
+        self.assertEqual(self.sample(text, f'http_request_duration_seconds_count{{{dashboard}}}'), 1)
+        self.assertGreater(self.sample(text, 'db_queries_total{view="accounts:student_dashboard"}'), 0)
+
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9').status_code, 403)
+        with override_settings(METRICS_TOKEN='scrape-me'):
+            bearer = {'REMOTE_ADDR': '203.0.113.9', 'HTTP_AUTHORIZATION': 'Bearer scrape-me'}
+            self.assertEqual(self.client.get(reverse('metrics'), **bearer).status_code, 200)
+            bearer['HTTP_AUTHORIZATION'] = 'Bearer wrong'
+            self.assertEqual(self.client.get(reverse('metrics'), **bearer).status_code, 403)
+
+    def test_cache_hit_ratio(self):
+        from django.core.cache import cache
+        from . import metrics
+
+        cache.set('metrics-test', 1)
+        cache.get_many(['metrics-test', 'metrics-missing', 'metrics-other'])
+        self.assertIn('cache_hit_ratio 0.3333333333333333', metrics.render())
+
+    def test_thread_and_process_updates_are_summed(self):
+        import multiprocessing
+        import threading
+        from . import metrics
+
+        threads = [threading.Thread(target=lambda: [metrics.logins.inc() for _ in range(1000)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.sample(metrics.render(), 'logins_total'), 8000)
+        # The finished threads' shards were folded into the retired totals
+        self.assertEqual(len(metrics._get_store()._shards), 0)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        with override_settings(METRICS_MULTIPROC_DIR=directory):
+            metrics.reset()
+            metrics.logins.inc(2)
+            child = multiprocessing.get_context('fork').Process(target=metrics.logins.inc, args=(5,))
+            child.start()
+            child.join()
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertEqual(self.sample(metrics.render(), 'logins_total'), 7)
+
+
+class DatabaseProfileTests(TestCase):
+    def test_production_pragmas_on_a_file_database(self):
+        from django.conf import settings
+        from django.db import connection
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        if settings.DATABASE_PROFILE != 'production':
+            self.skipTest('SGMS_DATABASE_PROFILE is not production')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        db = DatabaseWrapper(dict(connection.settings_dict, NAME=os.path.join(directory, 'profile.sqlite3')), alias='profile')
+        self.addCleanup(db.close)
+
+        with db.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store'):
+                pragmas[name] = cursor.execute(f"PRAGMA {name}").fetchone()[0]
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal', 'synchronous': 1, 'mmap_size': 268435456, 'cache_size': -65536, 'temp_store': 2,
+        })
+        self.assertEqual(db.transaction_mode, 'IMMEDIATE')
+        self.assertEqual(db.settings_dict['CONN_MAX_AGE'], 600)
+
+
+class ReplicaRoutingTests(ReplicaTestMixin, TransactionTestCase):
+    def setUp(self):
+        with primary():
+            self.instructor, self.grade = create_grade_fixture()
+        super().setUp()
+
+    def test_reads_use_the_replica_unless_forced(self):
+        self.assertEqual(Grade.objects.get(id=self.grade.id)._state.db, 'replica')
+        with primary():
+            self.assertEqual(Grade.objects.get(id=self.grade.id)._state.db, 'default')
+
+        grade = Grade.objects.get(id=self.grade.id)
+        grade.prelim_grade = 75
+        grade.save()
+        self.assertIsNone(Grade.objects.get(id=self.grade.id).prelim_grade)
+        sync_replicas()
+        self.assertEqual(Grade.objects.get(id=self.grade.id).prelim_grade, 75)
+
+    def test_no_stale_read_after_edit_grade(self):
+        self.client.force_login(self.instructor)
+        response = self.client.post(
+            reverse('grades:edit_grade', args=[self.grade.id]),
+            {'prelim_grade': '90', 'midterm_grade': '85', 'final_grade': '88'}, follow=True,
+        )
+        self.assertIn(PIN_COOKIE, self.client.cookies)
+        self.assertEqual(response.context['students_data'][0]['grade'].prelim_grade, 90)
+
+        # Without the pin the same page still reads the replica until it is synced
+        del self.client.cookies[PIN_COOKIE]
+        url = reverse('courses:subject_students', args=[self.grade.enrollment.subject_id])
+        self.assertIsNone(self.client.get(url).context['students_data'][0]['grade'].prelim_grade)
+        sync_replicas()
+        self.assertEqual(self.client.get(url).context['students_data'][0]['grade'].prelim_grade, 90)
+
+
+class CampusShardingTests(ShardTestMixin, TransactionTestCase):
+    def setUp(self):
+        from grades.models import Grade
+
+        super().setUp()
+        self.north = Campus.objects.create(code='NORTH', name='North Campus', database='campus_a')
+        self.south = Campus.objects.create(code='SOUTH', name='South Campus', database='campus_b')
+        self.teacher = User.objects.create_user('north-teacher', password='pass12345', role='instructor', campus=self.north)
+        self.student = User.objects.create_user('north-student', password='pass12345', role='student', campus=self.north)
+        with using_campus('campus_a'):
+            course = Course.objects.create(code='BSCS', name='BS Computer Science', campus=self.north)
+            self.subject = Subject.objects.create(code='CS101', name='Intro', course=course, instructor=self.teacher)
+            enrollment = Enrollment.objects.create(student=self.student, subject=self.subject)
+            Grade.objects.create(enrollment=enrollment, prelim_grade=80, midterm_grade=85, final_grade=90)
+        with using_campus('campus_b'):
+            course = Course.objects.create(code='BSIT', name='BS Information Technology', campus=self.south)
+            Subject.objects.create(code='IT101', name='Systems', course=course)
+
+    def test_campus_rows_stay_on_their_database(self):
+        self.assertEqual(
+            {alias: Enrollment.objects.using(alias).count() for alias in ('default', 'campus_a', 'campus_b')},
+            {'default': 0, 'campus_a': 1, 'campus_b': 0},
+        )
+        # Users are copied to their own campus only; the campus directory to every shard
+        self.assertTrue(User.objects.using('campus_a').filter(username='north-student').exists())
+        self.assertFalse(User.objects.using('campus_b').filter(username='north-student').exists())
+        self.assertEqual(Campus.objects.using('campus_b').count(), 2)
+
+    def test_requests_are_routed_by_the_users_campus(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('courses:subject_students', args=[self.subject.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['student'].username for row in response.context['students_data']], ['north-student'])
+
+    def test_query_budget_counts_queries_on_the_campus_database(self):
+        from .querybudget import QueryRecorder, wrap_connections
+
+        self.client.force_login(self.teacher)
+        with wrap_connections(QueryRecorder(locate=False)) as recorder:
+            self.client.get(reverse('courses:subject_students', args=[self.subject.id]))
+        self.assertTrue([query for query in recorder.queries if 'courses_enrollment' in query['sql']])
+
+    def test_report_gathers_every_campus_and_deletes_reach_the_shards(self):
+        report = campus_report()
+        rows = {row['campus']: row for row in report['rows']}
+        self.assertEqual((rows['NORTH']['enrollments'], rows['NORTH']['graded']), (1, 1))
+        self.assertEqual((rows['SOUTH']['subjects'], rows['SOUTH']['database']), (1, 'campus_b'))
+        self.assertEqual(report['total']['subjects'], 2)
+
+        self.student.delete()
+        self.assertFalse(Enrollment.objects.using('campus_a').exists())
+        self.assertFalse(User.objects.using('campus_a').filter(username='north-student').exists())
+
+    def test_account_purge_reaches_the_campus_database(self):
+        from accounts.deletion import purge_user, request_deletion
+        from grades.models import Grade
+
+        request_deletion(self.student)
+        result = purge_user(self.student.pk, batch_size=1)
+        self.assertEqual(result['deleted']['courses.Enrollment'], 1)
+        self.assertFalse(Grade.objects.using('campus_a').exists())
+        self.assertFalse(User.objects.using('campus_a').filter(username='north-student').exists())
+        self.assertFalse(User.objects.filter(username='north-student').exists())
+
+    def test_scheduler_digests_and_live_topics_cover_every_campus(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core import mail
+        from django.core.management import call_command
+        from django.utils import timezone
+        from announcements import pubsub
+        from announcements.models import Announcement, DigestPreference
+
+        self.student.email = 'north@example.com'
+        self.student.save()
+        now = timezone.now()
+        with using_campus('campus_a'):
+            DigestPreference.objects.create(user=self.student, frequency='daily')
+            scheduled = Announcement(
+                title='Enrollment opens', content='Body', announcement_type='system', created_by=self.teacher,
+                publish_at=now + timedelta(hours=1),
+            )
+            scheduled.apply_schedule(True, now)
+            scheduled.save()
+        # Due now
+        Announcement.objects.using('campus_a').filter(pk=scheduled.pk).update(publish_at=now, next_transition_at=now)
+
+        out = StringIO()
+        call_command('run_announcement_scheduler', once=True, stdout=out)
+        self.assertIn('updated 1 announcement(s)', out.getvalue())
+        scheduled.refresh_from_db()
+        self.assertTrue(scheduled.is_active)
+        call_command('send_digests', stdout=StringIO())
+        self.assertEqual([message.to for message in mail.outbox], [['north@example.com']])
+        self.assertIn('Enrollment opens', mail.outbox[0].body)
+
+        # Subject ids repeat across campuses, so their live topics must not
+        self.assertNotEqual(pubsub.subject_topic(self.subject.id, 'campus_a'), pubsub.subject_topic(self.subject.id, 'campus_b'))
+        with using_campus('campus_a'):
+            self.assertEqual(pubsub.subject_topic(self.subject.id), f"campus_a:subject:{self.subject.id}")
@@ -20,18 +20,25 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
 
+from . import metrics, profiling, sharding
+
 admin.site.site_header = "Student Grade Management System Administration"
 admin.site.site_title = "Student Portal Admin"
 admin.site.index_title = "Admin Dashboard"
 
 urlpatterns = [
+    path('admin/profiles/', profiling.profile_list, name='admin_profiles'),
+    path('admin/profiles/<str:stem>.<str:ext>', profiling.profile_download, name='admin_profile_download'),
+    path('admin/campus-report/', sharding.campus_report_view, name='admin_campus_report'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics.metrics_view, name='metrics'),
     path('', RedirectView.as_view(url='/accounts/login/', permanent=False), name='home'),
     path('dashboard/', RedirectView.as_view(url='/accounts/dashboard/', permanent=False), name='dashboard'),
     path('accounts/', include('accounts.urls')),
     path('courses/', include('courses.urls')),
     path('grades/', include('grades.urls')),
     path('announcements/', include('announcements.urls')),
+    path('api/v1/', include('api.urls')),
     # Future app URLs
 ]
 
@@ -1,6 +1,16 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from courses.search import filter_matching, fts_available
 from .models import User, StudentProfile, InstructorProfile
+from .search import USER_FTS_TABLE
+
+
+def search_profiles(queryset, search_term, id_field):
+    """Profiles whose user matches the FTS5 index, or whose ID is search_term exactly (a unique index lookup)"""
+    from django.db.models import Q
+    users = filter_matching(User.objects.all(), USER_FTS_TABLE, search_term)
+    return queryset.filter(Q(user__in=users.values('pk')) | Q(**{id_field: search_term.strip()}))
+
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -8,19 +18,28 @@ class UserAdmin(BaseUserAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name', 'role', 'is_active', 'date_joined']
     list_filter = ['role', 'is_active', 'is_staff', 'date_joined']
     search_fields = ['username', 'email', 'first_name', 'last_name']
+    search_help_text = 'Searches usernames, names and emails through the full-text index'
+    # Skip the second, unfiltered COUNT(*) behind "N results (M total)"
+    show_full_result_count = False
     ordering = ['-date_joined']
     
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Additional Info', {
-            'fields': ('role', 'phone_number', 'profile_picture', 'date_of_birth', 'address')
+            'fields': ('role', 'campus', 'phone_number', 'profile_picture', 'date_of_birth', 'address')
         }),
     )
     
     add_fieldsets = BaseUserAdmin.add_fieldsets + (
         ('Additional Info', {
-            'fields': ('role', 'email', 'first_name', 'last_name', 'phone_number')
+            'fields': ('role', 'campus', 'email', 'first_name', 'last_name', 'phone_number')
         }),
     )
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Use the FTS5 index instead of icontains scans; also serves the user autocomplete widgets"""
+        if not search_term or not fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return filter_matching(queryset, USER_FTS_TABLE, search_term), False
 
 
 @admin.register(StudentProfile)
@@ -29,12 +48,20 @@ class StudentProfileAdmin(admin.ModelAdmin):
     list_display = ['student_id', 'user', 'enrolled_date']
     list_filter = ['enrolled_date']
     search_fields = ['student_id', 'user__username', 'user__first_name', 'user__last_name']
+    list_select_related = ['user']
+    show_full_result_count = False
+    autocomplete_fields = ['user']
     ordering = ['student_id']
     fieldsets = (
         ('Student Information', {
             'fields': ('user', 'student_id')
         }),
     )
+    
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return search_profiles(queryset, search_term, 'student_id'), False
 
 
 @admin.register(InstructorProfile)
@@ -43,10 +70,18 @@ class InstructorProfileAdmin(admin.ModelAdmin):
     list_display = ['employee_id', 'user', 'hire_date']
     list_filter = ['hire_date']
     search_fields = ['employee_id', 'user__username', 'user__first_name', 'user__last_name']
+    list_select_related = ['user']
+    show_full_result_count = False
+    autocomplete_fields = ['user']
     ordering = ['employee_id']
     fieldsets = (
         ('Instructor Information', {
             'fields': ('user', 'employee_id', 'hire_date')
         }),
     )
+    
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return search_profiles(queryset, search_term, 'employee_id'), False
 
@@ -0,0 +1,121 @@
+"""
+Deferred account deletion
+
+Deleting an account from the profile page only deactivates it and queues
+`accounts.purge_account`. The purge job then removes everything that
+cascades from the user in batches of BATCH_SIZE rows. Each batch is its own
+short transaction, so other writers wait for one batch at most, never for
+the whole cascade. Children are purged before their parents (grades before
+enrollments, inbox entries before announcements), which keeps every batch's
+own cascade small. SET_NULL references such as Subject.instructor are
+cleared in batches the same way. The user row goes last.
+
+Sharded dependents are purged on the user's campus database as well. The job reports
+its progress (rows deleted per model) on the Job row, and a retried job
+picks up where the failed one stopped.
+"""
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.utils import timezone
+
+from StudentGradeManagementSystem.sharding import campus_database, is_sharded, using_campus
+
+BATCH_SIZE = 500
+
+
+def request_deletion(user):
+    """Deactivate the account now and queue the purge of its data"""
+    from jobs.queue import enqueue
+
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        user.is_active = False
+        user.deletion_requested_at = timezone.now()
+        user.save(update_fields=['is_active', 'deletion_requested_at'])
+        return enqueue('accounts.purge_account', {'user_id': user.pk})
+
+
+def _databases(model, user):
+    """Sharded rows can only point at a user on 'default' and the shard their copy lives on"""
+    if not is_sharded(model):
+        return [DEFAULT_DB_ALIAS]
+    return list(dict.fromkeys([DEFAULT_DB_ALIAS, campus_database(user.campus_id)]))
+
+
+def _batches(queryset, batch_size):
+    """Primary keys of the rows still matching queryset, batch_size at a time"""
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+
+
+class _Purge:
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.deleted = Counter()
+        self.cleared = Counter()
+
+    def _progress(self, step):
+        from jobs.queue import report_progress
+        report_progress(step=step, deleted=dict(self.deleted), cleared=dict(self.cleared))
+
+    def clear(self, queryset, field):
+        """Set a SET_NULL reference to NULL in batches"""
+        model, alias = queryset.model, queryset.db
+        for ids in _batches(queryset, self.batch_size):
+            with transaction.atomic(using=alias):
+                self.cleared[model._meta.label] += model._base_manager.using(alias).filter(pk__in=ids).update(**{field: None})
+            self._progress(f"{model._meta.label}.{field}")
+
+    def delete(self, queryset, path=()):
+        """Delete queryset's rows in batches, after their own cascading children"""
+        model, alias = queryset.model, queryset.db
+        path = (*path, model)
+        for relation in model._meta.related_objects:
+            if relation.many_to_many or relation.related_model in path:
+                continue
+            children = relation.related_model._base_manager.using(alias).filter(
+                **{f"{relation.field.name}__in": queryset.values('pk')}
+            )
+            if relation.on_delete is models.CASCADE:
+                self.delete(children, path)
+            elif relation.on_delete is models.SET_NULL:
+                self.clear(children, relation.field.name)
+
+        for ids in _batches(queryset, self.batch_size):
+            with transaction.atomic(using=alias):
+                _, counts = model._base_manager.using(alias).filter(pk__in=ids).delete()
+            self.deleted.update(counts)
+            self._progress(model._meta.label)
+
+
+def purge_user(user_id, batch_size=None):
+    """Remove a user who asked for deletion, and what depends on them, batch by batch"""
+    from .images import delete_picture
+    from .models import User
+
+    user = User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id, deletion_requested_at__isnull=False).first()
+    if user is None:
+        # Already purged, or the request was withdrawn by an admin
+        return {'deleted': {}, 'cleared': {}}
+
+    purge = _Purge(batch_size or BATCH_SIZE)
+    for relation in User._meta.related_objects:
+        if relation.many_to_many:
+            continue
+        for alias in _databases(relation.related_model, user):
+            with using_campus(alias):
+                rows = relation.related_model._base_manager.using(alias).filter(**{relation.field.name: user_id})
+                if relation.on_delete is models.CASCADE:
+                    purge.delete(rows, path=(User,))
+                elif relation.on_delete is models.SET_NULL:
+                    purge.clear(rows, relation.field.name)
+
+    # Little is left: group memberships, and the copies on the shards (courses.signals)
+    _, counts = User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id).delete()
+    purge.deleted.update(counts)
+    if user.profile_picture:
+        delete_picture(user.profile_picture.name, user.profile_picture_hash)
+    return {'deleted': dict(purge.deleted), 'cleared': dict(purge.cleared)}
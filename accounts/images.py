@@ -0,0 +1,169 @@
+"""
+Profile picture processing pipeline
+
+Uploads are streamed to disk in chunks while their SHA-256 digest is computed,
+stored once per digest (identical uploads share a single file), and resized
+into fixed WebP/JPEG variants by a background job (accounts/tasks.py).
+
+Because originals are shared, storing one and pointing a user at it must not
+interleave with deleting it once unreferenced: both happen under
+picture_lock(), a lock file that also serializes other processes.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: the lock then only covers threads of this process
+    fcntl = None
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS
+
+PICTURE_DIR = 'profile_pictures'
+VARIANT_DIR = 'profile_pictures/variants'
+VARIANT_SIZES = (64, 128, 256)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+_thread_lock = threading.Lock()
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload is not an image Pillow can decode"""
+
+
+@contextmanager
+def picture_lock():
+    """
+    Hold the profile picture lock; not reentrant. Wrap store_upload() and the
+    save that references its result in it; delete_picture() takes it itself
+    """
+    directory = os.path.join(settings.MEDIA_ROOT, PICTURE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    with _thread_lock, open(os.path.join(directory, '.lock'), 'a') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+
+
+def picture_name(digest, ext):
+    """Storage name of the deduplicated original for a content digest"""
+    return f"{PICTURE_DIR}/{digest[:2]}/{digest}{ext}"
+
+
+def variant_name(digest, size, fmt):
+    """Storage name of a resized variant"""
+    return f"{VARIANT_DIR}/{digest}/{size}.{fmt}"
+
+
+def store_upload(uploaded_file):
+    """
+    Stream an upload to disk and return (storage name, digest).
+    If a file with the same content already exists it is reused.
+    """
+    from PIL import Image
+
+    hasher = hashlib.sha256()
+    tmp_dir = os.path.join(settings.MEDIA_ROOT, PICTURE_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in uploaded_file.chunks():
+                hasher.update(chunk)
+                tmp.write(chunk)
+
+        try:
+            with Image.open(tmp_path) as image:
+                image.verify()
+                image_format = image.format
+        except Exception as exc:
+            raise InvalidImageError('Uploaded file is not a valid image.') from exc
+
+        digest = hasher.hexdigest()
+        ext = '.' + (image_format or 'img').lower().replace('jpeg', 'jpg')
+        name = picture_name(digest, ext)
+        path = default_storage.path(name)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return name, digest
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def generate_variants(name, digest):
+    """Write every missing size/format variant for a stored original"""
+    from PIL import Image, ImageOps
+
+    with Image.open(default_storage.path(name)) as source:
+        source = ImageOps.exif_transpose(source).convert('RGB')
+        for size in VARIANT_SIZES:
+            targets = {
+                fmt: default_storage.path(variant_name(digest, size, fmt))
+                for fmt in VARIANT_FORMATS
+            }
+            if all(os.path.exists(path) for path in targets.values()):
+                continue
+            thumbnail = ImageOps.fit(source, (size, size), Image.LANCZOS)
+            for fmt, path in targets.items():
+                pil_format, options = VARIANT_FORMATS[fmt]
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                thumbnail.save(path, pil_format, **options)
+
+
+def process_profile_picture(user_id, name, digest):
+    """Generate variants and flag the user once they are ready"""
+    from .models import User
+
+    generate_variants(name, digest)
+    User.objects.filter(pk=user_id, profile_picture_hash=digest).update(
+        profile_picture_variants_ready=True
+    )
+
+
+def schedule_variants(user_id, name, digest):
+    """Queue variant generation for `run_worker`"""
+    if getattr(settings, 'PROFILE_PICTURE_SYNC', False):
+        process_profile_picture(user_id, name, digest)
+    else:
+        from jobs.queue import enqueue
+        enqueue('accounts.process_profile_picture', {'user_id': user_id, 'name': name, 'digest': digest})
+
+
+def delete_picture(name, digest):
+    """Delete an original and its variants unless another user still shares them"""
+    with picture_lock():
+        _delete_unreferenced(name, digest)
+
+
+def _delete_unreferenced(name, digest):
+    from .models import User
+
+    # Under the lock, an upload of the same content has either saved its reference or not stored its file yet
+    if digest and User.objects.using(DEFAULT_DB_ALIAS).filter(profile_picture_hash=digest).exists():
+        return
+    if name and default_storage.exists(name):
+        default_storage.delete(name)
+    if not digest:
+        return
+    for size in VARIANT_SIZES:
+        for fmt in VARIANT_FORMATS:
+            variant = variant_name(digest, size, fmt)
+            if default_storage.exists(variant):
+                default_storage.delete(variant)
+    variant_dir = default_storage.path(f"{VARIANT_DIR}/{digest}")
+    if os.path.isdir(variant_dir) and not os.listdir(variant_dir):
+        os.rmdir(variant_dir)
@@ -0,0 +1,32 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from accounts.images import InvalidImageError, delete_picture, picture_lock, process_profile_picture, store_upload
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Deduplicate existing profile pictures and generate their resized variants'
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True).filter(
+            profile_picture_variants_ready=False
+        )
+        processed = 0
+        for user in users.iterator():
+            old_name = user.profile_picture.name
+            if not default_storage.exists(old_name):
+                self.stderr.write(f"Missing file for {user.username}: {old_name}")
+                continue
+            try:
+                with picture_lock(), default_storage.open(old_name, 'rb') as original:
+                    name, digest = store_upload(original)
+                    User.objects.filter(pk=user.pk).update(profile_picture=name, profile_picture_hash=digest)
+            except InvalidImageError:
+                self.stderr.write(f"Skipping {user.username}: {old_name} is not a valid image")
+                continue
+            process_profile_picture(user.pk, name, digest)
+            if old_name != name and not User.objects.filter(profile_picture=old_name).exists():
+                delete_picture(old_name, '')
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} profile picture(s)"))
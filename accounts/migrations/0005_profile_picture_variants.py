@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_remove_instructorprofile_department_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_variants_ready',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
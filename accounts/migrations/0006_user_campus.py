@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_profile_picture_variants'),
+        ('courses', '0006_campus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='campus',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='users', to='courses.campus'),
+        ),
+    ]
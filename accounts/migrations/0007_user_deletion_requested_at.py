@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_user_campus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='deletion_requested_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+TABLE = 'accounts_user_fts'
+CONTENT_TABLE = 'accounts_user'
+COLUMNS = ('username', 'first_name', 'last_name', 'email')
+
+
+def create_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends keep the admin's icontains search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from courses.search import fts_schema_sql
+    for statement in fts_schema_sql(TABLE, CONTENT_TABLE, COLUMNS):
+        schema_editor.execute(statement)
+    schema_editor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from courses.search import fts_drop_sql
+    for statement in fts_drop_sql(TABLE):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_user_deletion_requested_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -14,6 +14,8 @@ class User(AbstractUser):
     ]
     
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
+    # Decides which campus database the user's requests are routed to
+    campus = models.ForeignKey('courses.Campus', on_delete=models.SET_NULL, null=True, blank=True, related_name='users')
     phone_number = models.CharField(
         max_length=15, 
         blank=True, 
@@ -21,8 +23,12 @@ class User(AbstractUser):
         validators=[RegexValidator(regex=r'^\+?1?\d{9,15}$', message="Enter a valid phone number.")]
     )
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    profile_picture_hash = models.CharField(max_length=64, blank=True, default='', db_index=True, editable=False)
+    profile_picture_variants_ready = models.BooleanField(default=False, editable=False)
     date_of_birth = models.DateField(blank=True, null=True)
     address = models.TextField(blank=True, null=True)
+    # Set when the user deletes their account; the account is inactive until the purge job removes it
+    deletion_requested_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -45,6 +51,19 @@ class User(AbstractUser):
     @property
     def is_admin_role(self):
         return self.role == 'admin'
+    
+    def avatar_url(self, size, fmt='jpg'):
+        """
+        URL of the resized profile picture variant, or of the original
+        while the background worker has not produced the variants yet
+        """
+        if not self.profile_picture:
+            return ''
+        if not self.profile_picture_variants_ready or not self.profile_picture_hash:
+            return self.profile_picture.url
+        from django.core.files.storage import default_storage
+        from .images import variant_name
+        return default_storage.url(variant_name(self.profile_picture_hash, size, fmt))
 
 
 class StudentProfile(models.Model):
@@ -0,0 +1,6 @@
+"""
+Full-text index over users, for the admin searches and autocomplete
+widgets that pick a student or an instructor (see courses/search.py)
+"""
+USER_FTS_TABLE = 'accounts_user_fts'
+USER_FTS_COLUMNS = ('username', 'first_name', 'last_name', 'email')
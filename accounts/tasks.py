@@ -0,0 +1,9 @@
+from jobs.queue import task
+from .deletion import purge_user
+from .images import process_profile_picture
+
+# Resizing is CPU-bound; a failed run is retried a few times, then left for `process_profile_pictures`
+task('accounts.process_profile_picture', max_attempts=3)(process_profile_picture)
+
+# Purges are long and nobody waits on them, so quicker jobs go first; a retry resumes where the last run stopped
+task('accounts.purge_account', priority=-1, max_attempts=10)(purge_user)
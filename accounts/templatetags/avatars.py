@@ -0,0 +1,26 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(user, size, css_class='', alt='', style=''):
+    """
+    Render a user's profile picture as a <picture> element with a WebP source
+    and JPEG fallback. URLs are derived from fields already loaded on the
+    user, so no extra queries are issued.
+    """
+    if not user.profile_picture:
+        return ''
+    if not user.profile_picture_variants_ready:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" width="{}" height="{}">',
+            user.profile_picture.url, alt, css_class, style, size, size,
+        )
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp">'
+        '<img src="{}" alt="{}" class="{}" style="{}" width="{}" height="{}" loading="lazy"></picture>',
+        user.avatar_url(size, 'webp'), user.avatar_url(size, 'jpg'),
+        alt, css_class, style, size, size,
+    )
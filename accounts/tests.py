@@ -1,3 +1,333 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from StudentGradeManagementSystem.querybudget import QueryBudgetTestMixin
+from StudentGradeManagementSystem.queryplans import QueryPlanTestMixin
+from .images import VARIANT_SIZES, variant_name
+from .models import User
+
+
+def make_image(color='red', size=(600, 400)):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ProfilePictureTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, PROFILE_PICTURE_SYNC=True)
+        self.settings_override.enable()
+        self.user = User.objects.create_user('alice', password='pass12345', role='student')
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, data, client=None):
+        return (client or self.client).post(reverse('accounts:profile'), {
+            'action': 'update_profile',
+            'profile_picture': SimpleUploadedFile('me.png', data, content_type='image/png'),
+        })
+
+    def test_upload_generates_variants(self):
+        self.upload(make_image())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.profile_picture_variants_ready)
+        for size in VARIANT_SIZES:
+            for fmt in ('webp', 'jpg'):
+                path = os.path.join(self.media_root, variant_name(self.user.profile_picture_hash, size, fmt))
+                self.assertTrue(os.path.exists(path))
+        self.assertIn('/64.webp', self.user.avatar_url(64, 'webp'))
+
+    def test_upload_queues_variants(self):
+        from jobs.models import Job
+        from jobs.worker import Worker
+
+        with override_settings(PROFILE_PICTURE_SYNC=False):
+            response = self.upload(make_image('green'))
+        self.assertEqual(response.status_code, 302)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_picture_variants_ready)
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload['user_id']), ('accounts.process_profile_picture', self.user.pk))
+
+        self.assertEqual(Worker().work(once=True), {'done': 1})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.profile_picture_variants_ready)
+
+    def test_identical_uploads_share_one_file(self):
+        other = User.objects.create_user('bob', password='pass12345', role='student')
+        other_client = self.client_class()
+        other_client.force_login(other)
+        data = make_image('blue')
+        self.upload(data)
+        self.upload(data, client=other_client)
+        self.user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.user.profile_picture.name, other.profile_picture.name)
+
+        # Removing one user's photo keeps the file the other still references
+        self.client.post(reverse('accounts:profile'), {'action': 'remove_photo'})
+        self.assertTrue(os.path.exists(other.profile_picture.path))
+
+        other_client.post(reverse('accounts:profile'), {'action': 'remove_photo'})
+        self.assertFalse(os.path.exists(other.profile_picture.path))
+        self.assertFalse(os.path.exists(os.path.join(
+            self.media_root, variant_name(other.profile_picture_hash, 64, 'jpg')
+        )))
+
+    def test_rejects_non_image(self):
+        self.upload(b'not an image')
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_picture)
+
+
+class ProfilePictureLockTests(TransactionTestCase):
+    def test_delete_waits_for_an_upload_of_the_same_image(self):
+        from django.core.files.storage import default_storage
+        from django.db import connection
+        from .images import delete_picture, picture_lock, store_upload
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        user = User.objects.create_user('alice', role='student')
+
+        def delete(name, digest):
+            try:
+                delete_picture(name, digest)
+            finally:
+                connection.close()
+
+        with override_settings(MEDIA_ROOT=media_root):
+            # The last owner removes the photo while alice uploads the same image
+            with picture_lock():
+                name, digest = store_upload(SimpleUploadedFile('me.png', make_image('blue')))
+                deleter = threading.Thread(target=delete, args=(name, digest))
+                deleter.start()
+                deleter.join(0.2)
+                self.assertTrue(deleter.is_alive())
+                User.objects.filter(pk=user.pk).update(profile_picture=name, profile_picture_hash=digest)
+            deleter.join()
+            self.assertTrue(default_storage.exists(name))
+
+
+class DashboardQueryPlanTests(QueryPlanTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from announcements.models import Announcement
+        from courses.models import Course, Subject, Enrollment
+        from grades.models import Grade
+
+        cls.instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        cls.student = User.objects.create_user('student', password='pass12345', role='student')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        subject = Subject.objects.create(code='CS101', name='Intro', course=course, instructor=cls.instructor)
+        Grade.objects.create(enrollment=Enrollment.objects.create(student=cls.student, subject=subject))
+        Announcement.objects.create(title='Welcome', content='Body', created_by=cls.instructor)
+
+    def test_student_pages_are_indexed(self):
+        self.client.force_login(self.student)
+        for name in ('accounts:view_all_grades', 'accounts:view_all_announcements'):
+            with self.subTest(name):
+                self.assertViewUsesIndexes(reverse(name))
+
+    def test_dashboards_only_sort_their_own_rows(self):
+        # Recent grades and the subject list sort by columns of a joined table, over one user's rows
+        self.client.force_login(self.student)
+        self.assertViewUsesIndexes(reverse('accounts:student_dashboard'), allow=['USE TEMP B-TREE FOR ORDER BY'])
+        self.client.force_login(self.instructor)
+        self.assertViewUsesIndexes(reverse('accounts:instructor_dashboard'), allow=['USE TEMP B-TREE FOR ORDER BY'])
+
+    def test_dashboards_keep_their_orderings(self):
+        from courses.models import Course, Subject, Enrollment
+        from grades.models import Grade
+
+        early = Course.objects.create(code='ABCOM', name='AB Communication')
+        subject = Subject.objects.create(code='ZZ900', name='Late enrollment', course=early, instructor=self.instructor)
+        enrollment = Enrollment.objects.create(student=self.student, subject=subject)
+        Enrollment.objects.filter(pk=enrollment.pk).update(enrolled_date=enrollment.enrolled_date.replace(year=2000))
+        latest = Grade.objects.create(enrollment=enrollment)
+
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('accounts:student_dashboard'))
+        self.assertEqual(list(response.context['grades'])[0], latest)
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('accounts:instructor_dashboard'))
+        self.assertEqual([s.code for s in response.context['subjects']], ['ZZ900', 'CS101'])
+
+
+class AccountQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Query counts must not grow with the number of subjects, grades or announcements"""
+    budgets = {
+        'accounts:student_dashboard': 15,
+        'accounts:view_all_grades': 7,
+        'accounts:view_all_announcements': 7,
+        'accounts:instructor_dashboard': 9,
+        'accounts:profile': 4,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        from announcements.models import Announcement
+        from courses.models import Course, Subject, Enrollment
+        from grades.models import Grade
+
+        cls.instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        cls.student = User.objects.create_user('student', password='pass12345', role='student')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        for i in range(6):
+            subject = Subject.objects.create(code=f'CS10{i}', name='Intro', course=course, instructor=cls.instructor)
+            enrollment = Enrollment.objects.create(student=cls.student, subject=subject, status='completed' if i % 2 else 'enrolled')
+            Grade.objects.create(enrollment=enrollment, prelim_grade=90, midterm_grade=85, final_grade=80)
+            Announcement.objects.create(
+                title=f'Notice {i}', content='Body', announcement_type='course', created_by=cls.instructor
+            ).set_audience([subject.id])
+
+    def test_student_views_stay_within_budget(self):
+        self.client.force_login(self.student)
+        for name in ('accounts:student_dashboard', 'accounts:view_all_grades', 'accounts:view_all_announcements', 'accounts:profile'):
+            with self.subTest(name):
+                self.assertQueryBudget(reverse(name), self.budgets[name])
+
+    def test_instructor_dashboard_stays_within_budget(self):
+        self.client.force_login(self.instructor)
+        self.assertQueryBudget(reverse('accounts:instructor_dashboard'), self.budgets['accounts:instructor_dashboard'])
+
+    @override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_MAX_QUERIES=3)
+    def test_middleware_reports_and_logs_offenders(self):
+        self.client.force_login(self.student)
+        with self.assertLogs('StudentGradeManagementSystem.querybudget', 'WARNING') as logs:
+            response = self.client.get(reverse('accounts:view_all_grades'))
+        self.assertTrue(response['X-Query-Budget'].startswith('view=accounts:view_all_grades; queries='))
+        self.assertIn('accounts:view_all_grades ran', logs.output[0])
+
+
+class KeysetPagingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from courses.models import Course, Subject, Enrollment
+        from grades.models import Grade
+
+        instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        cls.student = User.objects.create_user('student', password='pass12345', role='student')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        for i in range(30):
+            subject = Subject.objects.create(code=f'CS{i:03}', name='Intro', course=course, instructor=instructor)
+            Grade.objects.create(enrollment=Enrollment.objects.create(student=cls.student, subject=subject), prelim_grade=90)
+
+    def codes(self, response):
+        return [grade.enrollment.subject.code for grade in response.context['grades']]
+
+    def test_grades_page_by_cursor(self):
+        self.client.force_login(self.student)
+        url = reverse('accounts:view_all_grades')
+        first = self.client.get(url)
+        self.assertEqual(len(first.context['grades']), 25)
+        self.assertEqual(first.context['total_subjects'], 30)
+        self.assertFalse(first.context['page'].has_previous)
+
+        second = self.client.get(url + first.context['page'].next_query)
+        self.assertEqual(self.codes(second), [f'CS{i:03}' for i in range(4, -1, -1)])
+        self.assertFalse(second.context['page'].has_next)
+        back = self.client.get(url + second.context['page'].previous_query)
+        self.assertEqual(self.codes(back), self.codes(first))
+        self.assertContains(back, 'Next &rarr;')
+
+        self.assertEqual(self.client.get(url, {'after': 'nonsense'}).status_code, 404)
+
+
+class ProfileAdminSearchTests(TestCase):
+    def test_search_matches_names_through_the_index_or_an_exact_student_id(self):
+        from .models import StudentProfile
+
+        for n, name in enumerate(['Ana', 'Bea', 'Anabel']):
+            user = User.objects.create_user(f'student{n}', role='student', first_name=name)
+            StudentProfile.objects.create(user=user, student_id=f'2026-{n:04}')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass12345'))
+
+        def found(term):
+            response = self.client.get(reverse('admin:accounts_studentprofile_changelist'), {'q': term})
+            return sorted(profile.user.first_name for profile in response.context['cl'].result_list)
+
+        self.assertEqual(found('ana'), ['Ana', 'Anabel'])
+        self.assertEqual(found('2026-0001'), ['Bea'])
+        self.assertEqual(found('2026'), [])
+
+
+# Deletes reach every shard, so run against 'default' alone even when SGMS_CAMPUS_SHARDS is set
+@override_settings(CAMPUS_DATABASES=[])
+class AccountDeletionTests(TestCase):
+    def setUp(self):
+        from courses.models import Course, Enrollment, Subject
+        from grades.models import Grade
+
+        self.instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        self.student = User.objects.create_user('student', password='pass12345', role='student')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        self.subjects = [
+            Subject.objects.create(code=f"CS10{n}", name=f"Subject {n}", course=course, instructor=self.instructor)
+            for n in range(5)
+        ]
+        for subject in self.subjects:
+            enrollment = Enrollment.objects.create(student=self.student, subject=subject)
+            Grade.objects.create(enrollment=enrollment, prelim_grade=80)
+
+    def delete_account(self, user):
+        self.client.force_login(user)
+        return self.client.post(reverse('accounts:profile'), {'action': 'delete_account', 'password_confirm': 'pass12345'})
+
+    def test_request_deactivates_and_queues_purge(self):
+        from courses.models import Enrollment
+        from jobs.models import Job
+
+        response = self.delete_account(self.student)
+        self.assertRedirects(response, reverse('accounts:login'), fetch_redirect_response=False)
+        self.student.refresh_from_db()
+        self.assertFalse(self.student.is_active)
+        self.assertIsNotNone(self.student.deletion_requested_at)
+        self.assertNotIn('_auth_user_id', self.client.session)
+        # Nothing is deleted on the request path
+        self.assertEqual(Enrollment.objects.filter(student=self.student).count(), 5)
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload), ('accounts.purge_account', {'user_id': self.student.pk}))
+
+    def test_purge_deletes_in_batches(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from grades.models import Grade
+        from jobs.models import Job
+        from jobs.worker import Worker
+
+        self.delete_account(self.student)
+        with mock.patch('accounts.deletion.BATCH_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(Worker().work(once=True), {'done': 1})
+
+        self.assertFalse(User.objects.filter(pk=self.student.pk).exists())
+        self.assertFalse(Grade.objects.exists())
+        enrollment_deletes = [q for q in queries if q['sql'].startswith('DELETE FROM "courses_enrollment"')]
+        self.assertEqual(len(enrollment_deletes), 3)
+        job = Job.objects.get()
+        self.assertEqual(job.result['deleted']['courses.Enrollment'], 5)
+        self.assertEqual(job.result['deleted']['grades.Grade'], 5)
+        self.assertEqual(job.progress['step'], 'courses.Enrollment')
+
+    def test_instructor_purge_keeps_subjects(self):
+        from courses.models import Subject
+        from jobs.worker import Worker
+
+        self.delete_account(self.instructor)
+        Worker().work(once=True)
+
+        self.assertFalse(User.objects.filter(pk=self.instructor.pk).exists())
+        self.assertEqual(Subject.objects.filter(instructor__isnull=True).count(), 5)
@@ -111,17 +111,16 @@ def student_dashboard(request):
         return redirect('dashboard')
     
     # Get student's enrollments and grades
-    from django.db import models
     from courses.models import Enrollment
     from grades.models import Grade
-    from announcements.models import Announcement
+    from announcements import inbox
     
     enrollments = Enrollment.objects.filter(
         student=request.user,
         status='enrolled'
     ).select_related('subject', 'subject__course', 'subject__instructor')
     
-    # Get grades
+    # Most recently graded first; only the student's own few grades are sorted
     grades = Grade.objects.filter(
         enrollment__student=request.user
     ).select_related('enrollment__subject').order_by('-created_at')[:5]
@@ -131,7 +130,7 @@ def student_dashboard(request):
         enrollment__student=request.user,
         enrollment__status='completed',
         grade_point__isnull=False
-    )
+    ).select_related('enrollment__subject').order_by()
     
     total_points = 0
     total_units = 0
@@ -142,20 +141,16 @@ def student_dashboard(request):
     
     gpa = round(total_points / total_units, 2) if total_units > 0 else 0
     
-    # Get announcements
-    enrolled_subjects = enrollments.values_list('subject', flat=True)
-    announcements = Announcement.objects.filter(
-        is_active=True
-    ).filter(
-        models.Q(announcement_type='system') |
-        models.Q(subject__in=enrolled_subjects)
-    ).order_by('-created_at')[:5]
+    # Get announcements from the student's materialized inbox
+    read_state = inbox.read_state(request.user)
+    announcements = inbox.flag_unread(inbox.feed(request.user, limit=5), read_state)
     
     context = {
         'enrollments': enrollments,
         'grades': grades,
         'gpa': gpa,
         'announcements': announcements,
+        'unread_announcements': inbox.unread_count(request.user, read_state),
         'total_enrollments': enrollments.count(),
     }
     
@@ -169,26 +164,29 @@ def instructor_dashboard(request):
         messages.error(request, 'Access denied')
         return redirect('dashboard')
     
-    from courses.models import Subject, Enrollment
-    from announcements.models import Announcement
+    from courses.models import Subject, Enrollment, with_enrollment_counts
+    from announcements.models import Announcement, audience_prefetch
     
-    # Get instructor's subjects
-    subjects = Subject.objects.filter(instructor=request.user)
+    # Get instructor's subjects, in the default course code order
+    subjects = with_enrollment_counts(
+        Subject.objects.filter(instructor=request.user).select_related('course')
+    )
     
     # Get total students across all subjects
-    total_students = Enrollment.objects.filter(
+    total_students = User.objects.filter(id__in=Enrollment.objects.filter(
         subject__instructor=request.user,
         status='enrolled'
-    ).values('student').distinct().count()
+    ).values('student_id')).count()
     
     # Get recent announcements
-    announcements = Announcement.objects.filter(
+    announcements = list(Announcement.objects.filter(
         created_by=request.user
-    ).order_by('-created_at')[:5]
+    ).prefetch_related(audience_prefetch()).order_by('-created_at')[:5])
+    subjects = list(subjects)
     
     context = {
         'subjects': subjects,
-        'total_subjects': subjects.count(),
+        'total_subjects': len(subjects),
         'total_students': total_students,
         'announcements': announcements,
     }
@@ -277,8 +275,24 @@ def profile(request):
         if action == 'update_profile':
             # Handle profile picture upload separately
             if 'profile_picture' in request.FILES:
-                request.user.profile_picture = request.FILES['profile_picture']
-                request.user.save()
+                from .images import InvalidImageError, picture_lock, store_upload, schedule_variants, delete_picture
+                old_name = request.user.profile_picture.name if request.user.profile_picture else None
+                old_digest = request.user.profile_picture_hash
+                # A shared original must not be deleted between storing it and saving the reference
+                with picture_lock():
+                    try:
+                        name, digest = store_upload(request.FILES['profile_picture'])
+                    except InvalidImageError as e:
+                        messages.error(request, str(e))
+                        return redirect('accounts:profile')
+                    if digest != old_digest:
+                        request.user.profile_picture.name = name
+                        request.user.profile_picture_hash = digest
+                        request.user.profile_picture_variants_ready = False
+                        request.user.save()
+                if digest != old_digest:
+                    schedule_variants(request.user.pk, name, digest)
+                    delete_picture(old_name, old_digest)
                 messages.success(request, 'Profile picture updated successfully!')
                 return redirect('accounts:profile')
             
@@ -296,12 +310,26 @@ def profile(request):
         elif action == 'remove_photo':
             # Remove profile picture and revert to default
             if request.user.profile_picture:
-                request.user.profile_picture.delete(save=False)
+                from .images import delete_picture
+                old_name = request.user.profile_picture.name
+                old_digest = request.user.profile_picture_hash
                 request.user.profile_picture = None
+                request.user.profile_picture_hash = ''
+                request.user.profile_picture_variants_ready = False
                 request.user.save()
+                # Files are shared by content hash, so only delete them once unreferenced
+                delete_picture(old_name, old_digest)
                 messages.success(request, 'Profile picture removed successfully!')
             return redirect('accounts:profile')
         
+        elif action == 'update_digest':
+            from announcements.models import DigestPreference
+            frequency = request.POST.get('digest_frequency')
+            if request.user.is_student and frequency in dict(DigestPreference.FREQUENCY_CHOICES):
+                DigestPreference.objects.update_or_create(user=request.user, defaults={'frequency': frequency})
+                messages.success(request, 'Digest preference saved!')
+            return redirect('accounts:profile')
+        
         elif action == 'change_password':
             old_password = request.POST.get('old_password')
             new_password = request.POST.get('new_password')
@@ -324,13 +352,23 @@ def profile(request):
         elif action == 'delete_account':
             password = request.POST.get('password_confirm')
             if request.user.check_password(password):
-                request.user.delete()
+                # Deactivate now; the account and its records are removed by a background job
+                from .deletion import request_deletion
+                request_deletion(request.user)
+                logout(request)
                 messages.success(request, 'Your account has been deleted')
                 return redirect('accounts:login')
             else:
                 messages.error(request, 'Incorrect password')
     
-    return render(request, 'accounts/profile.html')
+    context = {}
+    if request.user.is_student:
+        from announcements.models import DigestPreference
+        preference = DigestPreference.objects.filter(user=request.user).values_list('frequency', flat=True).first()
+        context['digest_frequency'] = preference or 'off'
+        context['digest_choices'] = DigestPreference.FREQUENCY_CHOICES
+    
+    return render(request, 'accounts/profile.html', context)
 
 
 @login_required
@@ -340,45 +378,45 @@ def view_all_grades(request):
         messages.error(request, 'Access denied. Students only.')
         return redirect('accounts:dashboard')
     
+    from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
     from courses.models import Enrollment
     from grades.models import Grade
+    from StudentGradeManagementSystem.pagination import paginate
     
-    # Get all grades for the student
-    grades = Grade.objects.filter(
-        enrollment__student=request.user
+    # Page through the graded enrollments so enrollment_student_date_idx gives the order, id breaking ties
+    enrollments = Enrollment.objects.filter(
+        student=request.user, grade__isnull=False
     ).select_related(
-        'enrollment__subject',
-        'enrollment__subject__course',
-        'enrollment__subject__instructor'
-    ).order_by('-enrollment__enrolled_date')
-    
-    # Calculate overall statistics
-    total_subjects = grades.count()
-    completed_grades = grades.filter(weighted_average__isnull=False)
-    
-    # Calculate GPA
-    total_points = 0
-    total_units = 0
-    for grade in completed_grades:
-        if grade.grade_point is not None:
-            units = grade.enrollment.subject.units
-            total_points += (grade.grade_point * units)
-            total_units += units
-    
-    gpa = round(total_points / total_units, 2) if total_units > 0 else 0
-    
-    # Calculate passed/failed count
-    passed = completed_grades.exclude(letter_grade='5.00').count()
-    failed = completed_grades.filter(letter_grade='5.00').count()
-    incomplete = total_subjects - completed_grades.count()
+        'grade',
+        'subject',
+        'subject__course',
+        'subject__instructor'
+    )
+    page = paginate(request, enrollments, ['-enrolled_date', 'id'])
+    grades = Grade.objects.filter(enrollment__student=request.user)
+    
+    # Statistics over every grade, not just this page, in one aggregate query
+    completed = Q(weighted_average__isnull=False)
+    counted = completed & Q(grade_point__isnull=False)
+    stats = grades.aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=completed),
+        failed=Count('id', filter=completed & Q(letter_grade='5.00')),
+        points=Sum(ExpressionWrapper(
+            F('grade_point') * F('enrollment__subject__units'), output_field=DecimalField(max_digits=10, decimal_places=2)
+        ), filter=counted),
+        units=Sum('enrollment__subject__units', filter=counted),
+    )
+    gpa = round(stats['points'] / stats['units'], 2) if stats['units'] else 0
     
     context = {
-        'grades': grades,
-        'total_subjects': total_subjects,
+        'grades': [enrollment.grade for enrollment in page],
+        'page': page,
+        'total_subjects': stats['total'],
         'gpa': gpa,
-        'passed': passed,
-        'failed': failed,
-        'incomplete': incomplete,
+        'passed': stats['completed'] - stats['failed'],
+        'failed': stats['failed'],
+        'incomplete': stats['total'] - stats['completed'],
     }
     
     return render(request, 'accounts/view_all_grades.html', context)
@@ -391,26 +429,16 @@ def view_all_announcements(request):
         messages.error(request, 'Access denied. Students only.')
         return redirect('accounts:dashboard')
     
-    from django.db import models
-    from courses.models import Enrollment
-    from announcements.models import Announcement
-    
-    # Get student's enrolled subjects
-    enrolled_subjects = Enrollment.objects.filter(
-        student=request.user,
-        status='enrolled'
-    ).values_list('subject', flat=True)
+    from announcements import inbox
     
-    # Get all relevant announcements
-    announcements = Announcement.objects.filter(
-        is_active=True
-    ).filter(
-        models.Q(announcement_type='system') |
-        models.Q(subject__in=enrolled_subjects)
-    ).select_related('subject', 'created_by').order_by('-created_at')
+    # System-wide and enrolled-subject announcements, fanned out on write
+    read_state = inbox.read_state(request.user)
+    page, announcements = inbox.feed_page(request)
     
     context = {
-        'announcements': announcements,
+        'announcements': inbox.flag_unread(announcements, read_state),
+        'page': page,
+        'unread_announcements': inbox.unread_count(request.user, read_state),
     }
     
     return render(request, 'accounts/view_all_announcements.html', context)
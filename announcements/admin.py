@@ -1,26 +1,77 @@
+from django import forms
 from django.contrib import admin
-from .models import Announcement
+from django.db.models import Q
+from accounts.search import USER_FTS_TABLE
+from courses.search import filter_matching, fts_available, fts_rowids
+from StudentGradeManagementSystem.changelists import KeysetPaginationMixin
+from .models import Announcement, AnnouncementAudience, audience_prefetch
+from .search import ANNOUNCEMENT_FTS_TABLE
+
+class AnnouncementAudienceInline(admin.TabularInline):
+    """Subjects and whole courses a course-specific announcement targets"""
+    model = AnnouncementAudience
+    extra = 1
+    fields = ['subject', 'course']
+    autocomplete_fields = ['subject', 'course']
+
+
+class AnnouncementAdminForm(forms.ModelForm):
+    """Shows is_active as the author's intent, so it stays checked on scheduled announcements"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial['is_active'] = self.instance.is_active or self.instance.is_scheduled
+
 
 @admin.register(Announcement)
-class AnnouncementAdmin(admin.ModelAdmin):
+class AnnouncementAdmin(KeysetPaginationMixin, admin.ModelAdmin):
     """Admin for Announcement model"""
-    list_display = ['title', 'announcement_type', 'subject', 'created_by', 'is_active', 'created_at']
-    list_filter = ['announcement_type', 'is_active', 'created_at', 'subject__course']
-    search_fields = ['title', 'content', 'subject__code', 'subject__name', 'created_by__username']
+    form = AnnouncementAdminForm
+    list_display = ['title', 'announcement_type', 'audience_label', 'created_by', 'is_active', 'created_at']
+    list_filter = ['announcement_type', 'is_active', 'created_at', 'audience__subject__course']
+    search_fields = ['title', 'content', 'created_by__username']
+    autocomplete_fields = ['created_by']
+    inlines = [AnnouncementAudienceInline]
+    search_help_text = 'Searches titles, content and authors through the full-text indexes'
     ordering = ['-created_at']
     
     fieldsets = (
         ('Announcement Information', {
-            'fields': ('title', 'content', 'announcement_type', 'subject')
+            'fields': ('title', 'content', 'announcement_type')
         }),
         ('Settings', {
             'fields': ('created_by', 'is_active')
         }),
+        ('Schedule', {
+            'fields': ('publish_at', 'expire_at'),
+            'description': 'Active announcements with a future publish time stay hidden until then'
+        }),
     )
     
+    @admin.display(description='Audience')
+    def audience_label(self, obj):
+        return obj.audience_label or '-'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('created_by').prefetch_related(audience_prefetch())
+    
     def save_model(self, request, obj, form, change):
         """Automatically set created_by to current user if not set"""
         if not obj.pk:  # If creating new object
             obj.created_by = request.user
+        obj.apply_schedule(obj.is_active)
         super().save_model(request, obj, form, change)
-
+    
+    def save_related(self, request, form, formsets, change):
+        """Refresh the inboxes once the audience inline has been saved"""
+        super().save_related(request, form, formsets, change)
+        from . import inbox
+        inbox.sync_announcement(form.instance)
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Use the FTS5 indexes instead of icontains scans across joins"""
+        if not search_term or not fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        authors = Q(created_by__in=fts_rowids(USER_FTS_TABLE, search_term))
+        return filter_matching(queryset, ANNOUNCEMENT_FTS_TABLE, search_term, also=authors), False
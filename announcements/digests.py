@@ -0,0 +1,134 @@
+"""
+Batched announcement email digests
+
+Due students are processed in batches: one query loads the inbox rows of a
+whole batch, announcement bodies come from cached pre-rendered fragments,
+and every message goes out over a single reused mail connection.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Announcement, DigestPreference, InboxEntry, audience_prefetch
+
+PERIODS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+FRAGMENT_TIMEOUT = 60 * 60 * 24 * 8
+
+
+def fragment_key(announcement_id, database=None):
+    # Announcement ids repeat across campus databases
+    from StudentGradeManagementSystem.sharding import current_database
+    return f"announcements:digest-fragment:{database or current_database()}:{announcement_id}"
+
+
+def invalidate_fragment(announcement_id, database=None):
+    cache.delete(fragment_key(announcement_id, database))
+
+
+def render_fragments(announcement_ids):
+    """Pre-rendered digest text for each announcement, rendering only cache misses"""
+    keys = {fragment_key(i): i for i in announcement_ids}
+    cached = cache.get_many(keys)
+    fragments = {keys[key]: text for key, text in cached.items()}
+    missing = [i for i in announcement_ids if i not in fragments]
+    if missing:
+        rendered = {}
+        for announcement in Announcement.objects.filter(id__in=missing).select_related('created_by').prefetch_related(
+            audience_prefetch()
+        ):
+            text = render_to_string('announcements/email/digest_item.txt', {'announcement': announcement})
+            fragments[announcement.id] = rendered[fragment_key(announcement.id)] = text
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+    return fragments
+
+
+def _due_preferences(frequency, now):
+    cutoff = now - PERIODS[frequency]
+    return DigestPreference.objects.filter(frequency=frequency).filter(
+        Q(last_sent_at__isnull=True) | Q(last_sent_at__lte=cutoff)
+    ).exclude(user__email='').filter(user__is_active=True).values(
+        'user_id', 'user__email', 'user__first_name', 'user__username', 'last_sent_at'
+    ).order_by('user_id')
+
+
+def send_digests(frequency, now=None, batch_size=200, connection=None):
+    """Send one digest to every due student; returns delivery statistics"""
+    now = now or timezone.now()
+    default_since = now - PERIODS[frequency]
+    started = time.perf_counter()
+    stats = {'students': 0, 'messages': 0}
+
+    preferences = list(_due_preferences(frequency, now))
+    if not preferences:
+        stats['seconds'] = 0.0
+        stats['messages_per_second'] = 0.0
+        return stats
+    earliest = min(p['last_sent_at'] or default_since for p in preferences)
+
+    # System-wide rows are shared by every student, so load them once
+    shared = list(InboxEntry.objects.filter(
+        student__isnull=True,
+        created_at__gt=earliest,
+        created_at__lte=now
+    ).values_list('announcement_id', 'created_at').order_by('-created_at'))
+
+    connection = connection or get_connection()
+    connection.open()
+    try:
+        for offset in range(0, len(preferences), batch_size):
+            batch = preferences[offset:offset + batch_size]
+            personal = defaultdict(list)
+            for student_id, announcement_id, created_at in InboxEntry.objects.filter(
+                student_id__in=[p['user_id'] for p in batch],
+                created_at__gt=earliest,
+                created_at__lte=now
+            ).values_list('student_id', 'announcement_id', 'created_at').order_by('-created_at'):
+                personal[student_id].append((announcement_id, created_at))
+
+            digests = []
+            for preference in batch:
+                since = preference['last_sent_at'] or default_since
+                items = sorted(
+                    (item for item in personal[preference['user_id']] + shared if item[1] > since),
+                    key=lambda item: item[1],
+                    reverse=True
+                )
+                if items:
+                    digests.append((preference, [announcement_id for announcement_id, _ in items]))
+
+            fragments = render_fragments({i for _, ids in digests for i in ids})
+            messages = [
+                EmailMessage(
+                    subject=f"Your {frequency} announcement digest ({len(ids)} new)",
+                    body=render_to_string('announcements/email/digest.txt', {
+                        'name': preference['user__first_name'] or preference['user__username'],
+                        'frequency': frequency,
+                        'items': [fragments[i] for i in ids if i in fragments],
+                    }),
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[preference['user__email']],
+                    connection=connection,
+                )
+                for preference, ids in digests
+            ]
+            if messages:
+                stats['messages'] += connection.send_messages(messages) or 0
+            DigestPreference.objects.filter(user_id__in=[p['user_id'] for p in batch]).update(last_sent_at=now)
+            stats['students'] += len(batch)
+    finally:
+        connection.close()
+
+    elapsed = time.perf_counter() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['messages_per_second'] = round(stats['messages'] / elapsed, 1) if elapsed else 0.0
+    return stats
@@ -0,0 +1,217 @@
+"""
+Fan-out on write for the student announcement feed
+
+Announcements are copied into InboxEntry rows when they are created,
+edited or (de)activated, and enrollment changes backfill or retract a
+student's rows, so reading a feed is an index range scan on
+(student, created_at) instead of a join over enrollments. The rows carry
+the announcement's publish time and sequence rather than its creation
+time and id, so a scheduled announcement sorts and counts as new from
+the moment it goes out.
+"""
+import heapq
+from operator import attrgetter
+
+from django.db import router, transaction
+from django.db.models import Max, Q, prefetch_related_objects
+from django.utils import timezone
+
+from StudentGradeManagementSystem.pagination import PAGE_SIZE, paginate
+from .models import Announcement, AnnouncementAudience, InboxEntry, ReadState, audience_prefetch
+
+
+def _course_recipients(announcement):
+    """Ids of students enrolled in any targeted subject or in a subject of a targeted course"""
+    from courses.models import Enrollment, Subject
+    audience = AnnouncementAudience.objects.filter(announcement=announcement)
+    course_subjects = Subject.objects.filter(
+        course_id__in=audience.filter(course__isnull=False).values('course_id')
+    ).values('id')
+    # Both terms test enrollment.subject_id, so each side is an index lookup rather than a scan
+    return set(Enrollment.objects.filter(status='enrolled').filter(
+        Q(subject_id__in=audience.filter(subject__isnull=False).values('subject_id'))
+        | Q(subject_id__in=course_subjects)
+    ).order_by().values_list('student_id', flat=True))
+
+
+def sync_announcement(announcement):
+    """Bring an announcement's inbox rows in line with its type, audience and visibility"""
+    existing = set(InboxEntry.objects.filter(
+        announcement=announcement
+    ).order_by().values_list('student_id', flat=True))
+    
+    if not announcement.is_active:
+        target = set()
+    elif announcement.announcement_type == 'system':
+        target = {None}
+    else:
+        target = _course_recipients(announcement)
+    
+    stale = existing - target
+    if None in stale:
+        InboxEntry.objects.filter(announcement=announcement, student__isnull=True).delete()
+        stale.discard(None)
+    if stale:
+        InboxEntry.objects.filter(announcement=announcement, student_id__in=stale).delete()
+    
+    missing = target - existing
+    if missing:
+        InboxEntry.objects.bulk_create([
+            InboxEntry(
+                announcement=announcement, student_id=student_id,
+                created_at=announcement.published_at, sequence=announcement.sequence
+            )
+            for student_id in missing
+        ], ignore_conflicts=True, batch_size=500)
+    
+    # Keep the copied keys in step if the publish stamp was ever edited
+    if existing & target:
+        InboxEntry.objects.filter(announcement=announcement).exclude(
+            created_at=announcement.published_at, sequence=announcement.sequence
+        ).update(created_at=announcement.published_at, sequence=announcement.sequence)
+
+
+def sync_student(student_id):
+    """Backfill or retract a student's course announcements after an enrollment change"""
+    from courses.models import Enrollment
+    
+    enrolled = Enrollment.objects.filter(student_id=student_id, status='enrolled')
+    visible = Announcement.objects.filter(
+        is_active=True,
+        announcement_type='course'
+    ).filter(
+        Q(audience__subject_id__in=enrolled.values('subject_id'))
+        | Q(audience__course_id__in=enrolled.values('subject__course_id'))
+    ).values_list('id', 'published_at', 'sequence')
+    target = {announcement_id: (published_at, sequence) for announcement_id, published_at, sequence in visible}
+    existing = set(InboxEntry.objects.filter(
+        student_id=student_id
+    ).order_by().values_list('announcement_id', flat=True))
+    
+    stale = existing - target.keys()
+    if stale:
+        InboxEntry.objects.filter(student_id=student_id, announcement_id__in=stale).delete()
+    
+    missing = target.keys() - existing
+    if missing:
+        InboxEntry.objects.bulk_create([
+            InboxEntry(
+                announcement_id=announcement_id, student_id=student_id,
+                created_at=target[announcement_id][0], sequence=target[announcement_id][1]
+            )
+            for announcement_id in missing
+        ], ignore_conflicts=True, batch_size=500)
+
+
+def feed(student, limit=None):
+    """
+    Active announcements visible to a student, newest first.
+    Personal and shared rows are read with two indexed range scans and merged.
+    """
+    personal, shared = (entries.order_by('-created_at') for entries in _feed_sources(student))
+    if limit is not None:
+        personal, shared = personal[:limit], shared[:limit]
+    
+    merged = heapq.merge(personal, shared, key=attrgetter('created_at'), reverse=True)
+    announcements = [entry.announcement for entry in merged]
+    if limit is not None:
+        announcements = announcements[:limit]
+    prefetch_related_objects(announcements, audience_prefetch())
+    return announcements
+
+
+def _feed_sources(student):
+    """The student's personal inbox rows and the shared ones"""
+    entries = InboxEntry.objects.select_related('announcement', 'announcement__created_by')
+    return [entries.filter(student=student), entries.filter(student__isnull=True)]
+
+
+def feed_page(request, per_page=PAGE_SIZE):
+    """
+    The page of request.user's feed at the ?after= or ?before= cursor, as
+    (KeysetPage of inbox rows, their announcements). The two sources are
+    merged by pagination.seek(); id breaks ties in inbox_student_created_idx order.
+    """
+    page = paginate(request, _feed_sources(request.user), ['-created_at', 'id'], per_page)
+    announcements = [entry.announcement for entry in page]
+    prefetch_related_objects(announcements, audience_prefetch())
+    return page, announcements
+
+
+def _visible_entries(student):
+    return InboxEntry.objects.filter(Q(student=student) | Q(student__isnull=True))
+
+
+def visible_announcement_ids(student):
+    """Subquery of the ids in a student's feed"""
+    return _visible_entries(student).values('announcement_id')
+
+
+def read_state(student):
+    """The student's read watermark, created on first use"""
+    state, _ = ReadState.objects.get_or_create(user=student)
+    return state
+
+
+def unread_count(student, state=None):
+    """
+    Number of unread feed items. Only rows above the watermark are counted,
+    so the cost tracks the unread backlog rather than the feed size.
+    """
+    state = state or read_state(student)
+    return _visible_entries(student).filter(
+        sequence__gt=state.last_read_seq
+    ).exclude(sequence__in=state.read_seqs).count()
+
+
+def flag_unread(announcements, state):
+    """Set is_unread on already-loaded announcements without further queries"""
+    for announcement in announcements:
+        announcement.is_unread = not state.is_read(announcement.sequence)
+    return announcements
+
+
+def _locked_read_state(student, using):
+    """The student's read state, locked against concurrent writers until the transaction ends"""
+    # Writing first takes SQLite's write lock too, where select_for_update is a no-op
+    ReadState.objects.using(using).filter(user=student).update(updated_at=timezone.now())
+    return ReadState.objects.using(using).select_for_update().get(user=student)
+
+
+def mark_read(student, announcement_ids):
+    """
+    Mark announcements read, advancing the watermark over any contiguous read run.
+    Ids that are not in the student's feed above the watermark are ignored.
+    """
+    using = router.db_for_write(ReadState)
+    read_state(student)
+    with transaction.atomic(using=using):
+        state = _locked_read_state(student, using)
+        # Feed items above the watermark, oldest first
+        pending = list(_visible_entries(student).using(using).filter(
+            sequence__gt=state.last_read_seq
+        ).order_by('sequence').values_list('sequence', 'announcement_id'))
+        requested = set(announcement_ids)
+        read = {sequence for sequence, announcement_id in pending if announcement_id in requested}
+        read.update(set(state.read_seqs).intersection(sequence for sequence, _ in pending))
+        for sequence, _ in pending:
+            if sequence not in read:
+                break
+            state.last_read_seq = sequence
+        
+        state.read_seqs = sorted(i for i in read if i > state.last_read_seq)
+        state.save(update_fields=['last_read_seq', 'read_seqs', 'updated_at'])
+    return state
+
+
+def mark_all_read(student):
+    """Move the watermark past every item currently in the feed"""
+    using = router.db_for_write(ReadState)
+    read_state(student)
+    with transaction.atomic(using=using):
+        state = _locked_read_state(student, using)
+        latest = _visible_entries(student).using(using).aggregate(latest=Max('sequence'))['latest']
+        state.last_read_seq = max(state.last_read_seq, latest or 0)
+        state.read_seqs = []
+        state.save(update_fields=['last_read_seq', 'read_seqs', 'updated_at'])
+    return state
@@ -0,0 +1,105 @@
+"""
+In-process load test for the announcement SSE endpoint
+
+Opens many concurrent streams against the ASGI application on a single
+event loop, publishes one event and measures how many clients received
+it. Thread counts are sampled while every connection is open to show the
+endpoint does not need a thread per client.
+"""
+import asyncio
+import threading
+import time
+
+from django.urls import reverse
+
+
+class _StreamClient:
+    """Minimal ASGI HTTP client that keeps a streaming response open"""
+
+    def __init__(self, app, path, cookie, host):
+        self.app = app
+        self.scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', host.encode()), (b'cookie', cookie.encode()), (b'accept', b'text/event-stream')],
+            'client': ('127.0.0.1', 0),
+            'server': (host, 80),
+        }
+        self.status = None
+        self.opened = asyncio.Event()
+        self.received = asyncio.Event()
+        self._disconnect = asyncio.Event()
+        self._request_sent = False
+        self.task = None
+
+    async def _receive(self):
+        if not self._request_sent:
+            self._request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self._disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def _send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body':
+            body = message.get('body', b'')
+            if body.startswith(b'retry:'):
+                self.opened.set()
+            elif b'event: announcement' in body:
+                self.received.set()
+            if not message.get('more_body', False):
+                self.opened.set()
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.app(self.scope, self._receive, self._send))
+
+    async def close(self):
+        self._disconnect.set()
+        try:
+            await asyncio.wait_for(self.task, timeout=5)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.task.cancel()
+
+
+async def run_sse_load(session_cookie, connections, publish, host='localhost', timeout=30):
+    """
+    Hold `connections` SSE streams open, call `publish()` from a worker thread
+    and return timing, delivery and thread-count statistics.
+    """
+    from django.core.asgi import get_asgi_application
+
+    app = get_asgi_application()
+    path = reverse('announcements:announcement_stream')
+    threads_before = threading.active_count()
+
+    started = time.perf_counter()
+    clients = [_StreamClient(app, path, session_cookie, host) for _ in range(connections)]
+    for client in clients:
+        client.start()
+    await asyncio.wait_for(asyncio.gather(*(c.opened.wait() for c in clients)), timeout)
+    open_seconds = time.perf_counter() - started
+    threads_open = threading.active_count()
+
+    published = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, publish)
+    done, _ = await asyncio.wait([asyncio.ensure_future(c.received.wait()) for c in clients], timeout=timeout)
+    delivery_seconds = time.perf_counter() - published
+
+    await asyncio.gather(*(client.close() for client in clients))
+    return {
+        'connections': connections,
+        'accepted': sum(1 for c in clients if c.status == 200),
+        'delivered': len(done),
+        'open_seconds': round(open_seconds, 3),
+        'delivery_seconds': round(delivery_seconds, 3),
+        'threads_before': threads_before,
+        'threads_while_open': threads_open,
+    }
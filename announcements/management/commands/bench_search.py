@@ -0,0 +1,77 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import User
+from announcements.models import Announcement
+from announcements.search import ANNOUNCEMENT_FTS_TABLE, search_announcements
+from courses.search import filter_matching, fts_available
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark FTS5 announcement search against the icontains baseline on synthetic data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--announcements', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('FTS5 search is only available on SQLite')
+        rng = random.Random(options['seed'])
+        vocabulary = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(4, 9))) for _ in range(5000)]
+        # Zipf-like word frequencies so some terms are common and most are rare
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        def words(count):
+            return ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=count))
+
+        try:
+            with transaction.atomic():
+                author = User.objects.create_user(f'bench-search-{time.time_ns()}', role='instructor')
+                now = timezone.now()
+                total = options['announcements']
+                started = time.perf_counter()
+                for offset in range(0, total, 10_000):
+                    Announcement.objects.bulk_create([
+                        Announcement(title=words(6), content=words(40), created_by=author, created_at=now, updated_at=now)
+                        for _ in range(min(10_000, total - offset))
+                    ])
+                self.stdout.write(f"Inserted {total} announcements in {time.perf_counter() - started:.1f}s")
+
+                terms = [vocabulary[rng.randint(0, 50)] for _ in range(options['queries'] // 2)]
+                terms += [vocabulary[rng.randint(500, 4999)] for _ in range(options['queries'] - len(terms))]
+                self.report(terms)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def timed(self, func):
+        started = time.perf_counter()
+        func()
+        return (time.perf_counter() - started) * 1000
+
+    def report(self, terms):
+        base = Announcement.objects.all()
+        cases = {
+            'icontains top 50': lambda t: list(base.filter(Q(title__icontains=t) | Q(content__icontains=t)).order_by('-created_at')[:50]),
+            'fts ranked top 50': lambda t: search_announcements(t, base, limit=50),
+            'icontains count': lambda t: base.filter(Q(title__icontains=t) | Q(content__icontains=t)).count(),
+            'fts count': lambda t: filter_matching(base, ANNOUNCEMENT_FTS_TABLE, t).count(),
+        }
+        self.stdout.write(f"{'case':<20}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+        for name, func in cases.items():
+            timings = sorted(self.timed(lambda: func(term)) for term in terms)
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(f"{name:<20}{statistics.median(timings):>10.1f}{p95:>10.1f}{timings[-1]:>10.1f}")
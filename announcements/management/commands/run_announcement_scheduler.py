@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from announcements.scheduler import next_due, run_due
+from StudentGradeManagementSystem.sharding import fan_out
+
+
+class Command(BaseCommand):
+    help = 'Publish and expire scheduled announcements on every campus database as they become due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process due announcements once and exit')
+        parser.add_argument('--interval', type=float, default=30, help='Maximum seconds to sleep between ticks')
+
+    def handle(self, *args, **options):
+        while True:
+            changed = sum(fan_out(lambda alias: run_due()).values())
+            if changed or options['verbosity'] > 1:
+                self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} updated {changed} announcement(s)")
+            if options['once']:
+                return
+            # Sleep until the next transition, but wake up regularly to notice new schedules
+            upcoming = [due for due in fan_out(lambda alias: next_due()).values() if due is not None]
+            delay = options['interval']
+            if upcoming:
+                delay = min(delay, max((min(upcoming) - timezone.now()).total_seconds(), 0.5))
+            time.sleep(delay)
@@ -0,0 +1,30 @@
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from announcements.digests import PERIODS, send_digests
+from StudentGradeManagementSystem.sharding import fan_out
+
+
+class Command(BaseCommand):
+    help = 'Email announcement digests to students on every campus database whose daily or weekly digest is due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frequency', choices=sorted(PERIODS), default='daily')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--backend', help='Email backend path, e.g. django.core.mail.backends.console.EmailBackend')
+
+    def handle(self, *args, **options):
+        def send(alias):
+            # One mail connection per campus thread
+            connection = get_connection(options['backend']) if options['backend'] else None
+            return send_digests(options['frequency'], batch_size=options['batch_size'], connection=connection)
+
+        results = fan_out(send).values()
+        messages = sum(stats['messages'] for stats in results)
+        students = sum(stats['students'] for stats in results)
+        # The campuses are sent in parallel, so the slowest one is the run time
+        seconds = max(stats['seconds'] for stats in results)
+        rate = round(messages / seconds, 1) if seconds else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {messages} digest(s) to {students} due student(s) in {seconds}s ({rate} messages/s)"
+        ))
@@ -0,0 +1,48 @@
+import asyncio
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from announcements import pubsub
+from announcements.loadtest import run_sse_load
+
+
+class Command(BaseCommand):
+    help = 'Open many concurrent announcement SSE streams in-process and report delivery and thread usage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='Student account the streams authenticate as')
+        parser.add_argument('--connections', type=int, default=2000)
+        parser.add_argument('--timeout', type=float, default=60)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'], role='student')
+        except User.DoesNotExist:
+            raise CommandError(f"No student named {options['username']}")
+
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        cookie = f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+        def publish():
+            pubsub.get_broker().publish(pubsub.SYSTEM_TOPIC, {'id': 0, 'title': 'load test'})
+
+        try:
+            stats = asyncio.run(run_sse_load(cookie, options['connections'], publish, timeout=options['timeout']))
+        finally:
+            session.delete()
+
+        for key, value in stats.items():
+            self.stdout.write(f"{key:>20}: {value}")
+        if stats['delivered'] < stats['connections']:
+            raise CommandError('Not every connection received the published event')
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['connections']} streams served with {stats['threads_while_open']} threads"
+        ))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_inbox(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Announcement = apps.get_model('announcements', 'Announcement')
+    InboxEntry = apps.get_model('announcements', 'InboxEntry')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+
+    entries = []
+    for announcement in Announcement.objects.using(db).filter(is_active=True).iterator():
+        if announcement.announcement_type == 'system':
+            recipients = [None]
+        elif announcement.subject_id:
+            recipients = Enrollment.objects.using(db).filter(
+                subject_id=announcement.subject_id, status='enrolled'
+            ).values_list('student_id', flat=True)
+        else:
+            recipients = []
+        entries.extend(
+            InboxEntry(announcement_id=announcement.id, student_id=student_id, created_at=announcement.created_at)
+            for student_id in recipients
+        )
+    InboxEntry.objects.using(db).bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('announcements', '0001_initial'),
+        ('courses', '0003_alter_subject_options_remove_subject_year_level'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('announcement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='announcements.announcement')),
+                ('student', models.ForeignKey(blank=True, help_text='Empty for shared system-wide entries', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Inbox Entry',
+                'verbose_name_plural': 'Inbox Entries',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['student', '-created_at'], name='inbox_student_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('announcement', 'student'), name='unique_inbox_entry')],
+            },
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('announcements', '0004_announcement_fts'),
+        ('courses', '0004_subject_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcement',
+            name='expire_at',
+            field=models.DateTimeField(blank=True, help_text='Leave blank to keep it visible', null=True),
+        ),
+        migrations.AddField(
+            model_name='announcement',
+            name='next_transition_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='announcement',
+            name='publish_at',
+            field=models.DateTimeField(blank=True, help_text='Leave blank to publish immediately', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(condition=models.Q(('next_transition_at__isnull', False)), fields=['next_transition_at'], name='announcement_transition_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['subject', '-created_at'], name='announcement_active_idx'),
+        ),
+    ]
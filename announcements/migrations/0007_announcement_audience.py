@@ -0,0 +1,152 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:46
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Identical course announcements from one author posted this close together are merged
+DUPLICATE_WINDOW = timedelta(minutes=10)
+
+
+def copy_and_merge_audiences(apps, schema_editor):
+    """
+    Move each announcement's subject into the audience table, folding the
+    copies instructors posted once per subject into a single announcement
+    """
+    db = schema_editor.connection.alias
+    Announcement = apps.get_model('announcements', 'Announcement')
+    AnnouncementAudience = apps.get_model('announcements', 'AnnouncementAudience')
+    InboxEntry = apps.get_model('announcements', 'InboxEntry')
+
+    keepers = {}
+    audience = []
+    duplicates = {}
+    rows = Announcement.objects.using(db).filter(
+        announcement_type='course', subject__isnull=False
+    ).order_by('created_at', 'id').values_list(
+        'id', 'subject_id', 'created_by_id', 'title', 'content', 'is_active', 'publish_at', 'expire_at', 'created_at'
+    )
+    for announcement_id, subject_id, *key, created_at in rows.iterator():
+        key = tuple(key)
+        keeper = keepers.get(key)
+        if keeper and created_at - keeper[1] <= DUPLICATE_WINDOW:
+            duplicates[announcement_id] = keeper[0]
+            if subject_id not in keeper[2]:
+                keeper[2].add(subject_id)
+                audience.append(AnnouncementAudience(announcement_id=keeper[0], subject_id=subject_id))
+            continue
+        keepers[key] = (announcement_id, created_at, {subject_id})
+        audience.append(AnnouncementAudience(announcement_id=announcement_id, subject_id=subject_id))
+    AnnouncementAudience.objects.using(db).bulk_create(audience, batch_size=500)
+
+    if not duplicates:
+        return
+    # Students of the merged subjects keep their inbox rows, now pointing at the survivor
+    existing = set(InboxEntry.objects.using(db).filter(
+        announcement_id__in=set(duplicates.values())
+    ).values_list('announcement_id', 'student_id'))
+    moved = []
+    for entry in InboxEntry.objects.using(db).filter(announcement_id__in=list(duplicates)).order_by('id').iterator():
+        key = (duplicates[entry.announcement_id], entry.student_id)
+        if key not in existing:
+            existing.add(key)
+            moved.append(InboxEntry(announcement_id=key[0], student_id=key[1], created_at=entry.created_at))
+    duplicate_ids = list(duplicates)
+    for offset in range(0, len(duplicate_ids), 500):
+        Announcement.objects.using(db).filter(id__in=duplicate_ids[offset:offset + 500]).delete()
+    InboxEntry.objects.using(db).bulk_create(moved, batch_size=500)
+
+
+def restore_subjects(apps, schema_editor):
+    """Point each announcement back at its first targeted subject (merged copies are not split again)"""
+    db = schema_editor.connection.alias
+    Announcement = apps.get_model('announcements', 'Announcement')
+    AnnouncementAudience = apps.get_model('announcements', 'AnnouncementAudience')
+    for announcement_id, subject_id in AnnouncementAudience.objects.using(db).filter(
+        subject__isnull=False
+    ).order_by('-id').values_list('announcement_id', 'subject_id'):
+        Announcement.objects.using(db).filter(id=announcement_id).update(subject_id=subject_id)
+
+
+def recreate_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from courses.search import fts_schema_sql
+    table, columns = 'announcements_announcement_fts', ('title', 'content')
+    for statement in fts_schema_sql(table, 'announcements_announcement', columns):
+        schema_editor.execute(statement)
+    schema_editor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('announcements', '0006_digest_preference'),
+        ('courses', '0004_subject_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnouncementAudience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Announcement Audience',
+                'verbose_name_plural': 'Announcement Audiences',
+            },
+        ),
+        migrations.AddField(
+            model_name='announcementaudience',
+            name='announcement',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audience', to='announcements.announcement'),
+        ),
+        migrations.AddField(
+            model_name='announcementaudience',
+            name='course',
+            field=models.ForeignKey(blank=True, help_text='Targets every subject in the course', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='announcement_audiences', to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='announcementaudience',
+            name='subject',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='announcement_audiences', to='courses.subject'),
+        ),
+        migrations.AddIndex(
+            model_name='announcementaudience',
+            index=models.Index(fields=['subject', 'announcement'], name='audience_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='announcementaudience',
+            index=models.Index(fields=['course', 'announcement'], name='audience_course_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='announcementaudience',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('course__isnull', True), ('subject__isnull', False)), models.Q(('course__isnull', False), ('subject__isnull', True)), _connector='OR'), name='audience_subject_xor_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='announcementaudience',
+            constraint=models.UniqueConstraint(fields=('announcement', 'subject'), name='unique_audience_subject'),
+        ),
+        migrations.AddConstraint(
+            model_name='announcementaudience',
+            constraint=models.UniqueConstraint(fields=('announcement', 'course'), name='unique_audience_course'),
+        ),
+        migrations.RunPython(copy_and_merge_audiences, restore_subjects),
+        migrations.RemoveIndex(
+            model_name='announcement',
+            name='announcement_active_idx',
+        ),
+        migrations.RemoveField(
+            model_name='announcement',
+            name='subject',
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['announcement_type', '-created_at'], name='announcement_active_type_idx'),
+        ),
+        # Removing the subject column rebuilds the table on SQLite, which drops the FTS triggers
+        migrations.RunPython(recreate_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('announcements', '0007_announcement_audience'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(fields=['created_by', '-created_at'], name='announcement_author_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def stamp_published(apps, schema_editor):
+    """
+    Stamp the visible announcements as published and copy the stamps to their
+    inbox rows. Ids were the read keys so far, so they become the sequence
+    numbers and existing read watermarks stay valid.
+    """
+    db = schema_editor.connection.alias
+    Announcement = apps.get_model('announcements', 'Announcement')
+    InboxEntry = apps.get_model('announcements', 'InboxEntry')
+    ChangeSequence = apps.get_model('courses', 'ChangeSequence')
+
+    published = Announcement.objects.using(db).filter(is_active=True)
+    published.update(
+        published_at=Greatest('created_at', Coalesce('publish_at', 'created_at')),
+        sequence=F('id'),
+    )
+    last = published.aggregate(last=models.Max('id'))['last'] or 0
+    ChangeSequence.objects.using(db).update_or_create(name='announcements', defaults={'value': last})
+
+    stamps = Announcement.objects.using(db).filter(pk=OuterRef('announcement_id'))
+    InboxEntry.objects.using(db).filter(announcement__is_active=True).update(
+        created_at=Subquery(stamps.values('published_at')),
+        sequence=Subquery(stamps.values('sequence')),
+    )
+
+
+def restore_created_at(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Announcement = apps.get_model('announcements', 'Announcement')
+    InboxEntry = apps.get_model('announcements', 'InboxEntry')
+    stamps = Announcement.objects.using(db).filter(pk=OuterRef('announcement_id'))
+    InboxEntry.objects.using(db).update(created_at=Subquery(stamps.values('created_at')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('announcements', '0008_hot_query_indexes'),
+        ('courses', '0007_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcement',
+            name='published_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='announcement',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='inboxentry',
+            name='sequence',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RenameField(
+            model_name='readstate',
+            old_name='last_read_id',
+            new_name='last_read_seq',
+        ),
+        migrations.RenameField(
+            model_name='readstate',
+            old_name='read_ids',
+            new_name='read_seqs',
+        ),
+        migrations.RunPython(stamp_published, restore_created_at),
+        migrations.AddIndex(
+            model_name='inboxentry',
+            index=models.Index(fields=['student', 'sequence'], name='inbox_student_sequence_idx'),
+        ),
+    ]
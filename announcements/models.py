@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, router, transaction
 from accounts.models import User
-from courses.models import Subject
+from courses.models import Course, Subject
+
+# ChangeSequence counter behind Announcement.sequence
+PUBLISH_SEQUENCE = 'announcements'
 
 class Announcement(models.Model):
     """
@@ -16,15 +19,7 @@ class Announcement(models.Model):
     content = models.TextField()
     announcement_type = models.CharField(max_length=20, choices=ANNOUNCEMENT_TYPE_CHOICES, default='system')
     
-    # If course-specific, link to subject
-    subject = models.ForeignKey(
-        Subject, 
-        on_delete=models.CASCADE, 
-        null=True, 
-        blank=True,
-        related_name='announcements',
-        help_text="Leave blank for system-wide announcements"
-    )
+    # Course-specific announcements target subjects and/or whole courses via AnnouncementAudience
     
     # Creator (admin or instructor)
     created_by = models.ForeignKey(
@@ -36,6 +31,16 @@ class Announcement(models.Model):
     # Visibility
     is_active = models.BooleanField(default=True, help_text="Uncheck to hide this announcement")
     
+    # Scheduling
+    publish_at = models.DateTimeField(null=True, blank=True, help_text="Leave blank to publish immediately")
+    expire_at = models.DateTimeField(null=True, blank=True, help_text="Leave blank to keep it visible")
+    # When the scheduler next has to flip is_active; empty when nothing is pending
+    next_transition_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Stamped the first time the announcement becomes visible; the feed sorts by the time
+    # and tracks reads by the sequence, so a scheduled post shows up as new when it publishes
+    published_at = models.DateTimeField(null=True, blank=True, editable=False)
+    sequence = models.BigIntegerField(null=True, blank=True, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -44,17 +49,231 @@ class Announcement(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Announcement'
         verbose_name_plural = 'Announcements'
+        indexes = [
+            models.Index(
+                fields=['next_transition_at'],
+                name='announcement_transition_idx',
+                condition=models.Q(next_transition_at__isnull=False),
+            ),
+            models.Index(
+                fields=['announcement_type', '-created_at'],
+                name='announcement_active_type_idx',
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(fields=['created_by', '-created_at'], name='announcement_author_idx'),
+        ]
     
     def __str__(self):
         type_str = f"[{self.get_announcement_type_display()}]"
-        subject_str = f" - {self.subject.code}" if self.subject else ""
-        return f"{type_str} {self.title}{subject_str}"
+        return f"{type_str} {self.title}"
+    
+    def save(self, *args, **kwargs):
+        """Stamp the publish time and the next publish sequence number on the first visible save"""
+        if not self.is_active or self.sequence is not None:
+            return super().save(*args, **kwargs)
+        from django.utils import timezone
+        from courses.sync import allocate
+        
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = list({*kwargs['update_fields'], 'published_at', 'sequence'})
+        with transaction.atomic(using=using, savepoint=False):
+            self.published_at = timezone.now()
+            self.sequence = allocate(using, name=PUBLISH_SEQUENCE)
+            super().save(*args, **kwargs)
     
     def clean(self):
-        """Validate that course-specific announcements have a subject"""
+        """Validate the publish/expiry window (audiences are validated where they are set)"""
         from django.core.exceptions import ValidationError
-        if self.announcement_type == 'course' and not self.subject:
-            raise ValidationError("Course-specific announcements must have a subject selected.")
-        if self.announcement_type == 'system' and self.subject:
-            raise ValidationError("System-wide announcements should not have a subject selected.")
+        if self.publish_at and self.expire_at and self.expire_at <= self.publish_at:
+            raise ValidationError("The expiry time must be after the publish time.")
+    
+    @property
+    def is_scheduled(self):
+        """Waiting for publish_at before becoming visible"""
+        return not self.is_active and self.next_transition_at is not None
+    
+    def apply_schedule(self, visible, now=None):
+        """
+        Set is_active and the next transition from the publish/expiry window.
+        visible is the author's intent; hidden announcements never transition.
+        """
+        from django.utils import timezone
+        now = now or timezone.now()
+        if not visible:
+            self.is_active, self.next_transition_at = False, None
+        elif self.publish_at and now < self.publish_at:
+            self.is_active, self.next_transition_at = False, self.publish_at
+        elif self.expire_at and now >= self.expire_at:
+            self.is_active, self.next_transition_at = False, None
+        else:
+            self.is_active, self.next_transition_at = True, self.expire_at
+    
+    @property
+    def audience_label(self):
+        """Comma-separated subject and course codes; prefetch audience__subject and audience__course"""
+        return ', '.join(
+            target.subject.code if target.subject_id else f"All {target.course.code}"
+            for target in self.audience.all()
+        )
+    
+    def set_audience(self, subject_ids=(), course_ids=()):
+        """Replace the targeted subjects and courses, then refresh the student inboxes"""
+        from . import inbox
+        subject_ids, course_ids = set(subject_ids), set(course_ids)
+        if self.announcement_type == 'system':
+            subject_ids, course_ids = set(), set()
+        
+        existing = set(self.audience.values_list('subject_id', 'course_id'))
+        wanted = {(subject_id, None) for subject_id in subject_ids} | {(None, course_id) for course_id in course_ids}
+        if existing == wanted:
+            # save() already brought the inbox in line with an unchanged audience
+            return
+        for subject_id, course_id in existing - wanted:
+            self.audience.filter(subject_id=subject_id, course_id=course_id).delete()
+        AnnouncementAudience.objects.bulk_create([
+            AnnouncementAudience(announcement=self, subject_id=subject_id, course_id=course_id)
+            for subject_id, course_id in sorted(wanted - existing, key=lambda target: (target[0] or 0, target[1] or 0))
+        ])
+        getattr(self, '_prefetched_objects_cache', {}).pop('audience', None)
+        inbox.sync_announcement(self)
+
+
+class AnnouncementAudience(models.Model):
+    """
+    One target of a course-specific announcement: a single subject or a whole course
+    Posting the same notice to several sections is one announcement with several rows here
+    """
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, related_name='audience')
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='announcement_audiences'
+    )
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='announcement_audiences',
+        help_text="Targets every subject in the course"
+    )
+    
+    class Meta:
+        verbose_name = 'Announcement Audience'
+        verbose_name_plural = 'Announcement Audiences'
+        indexes = [
+            models.Index(fields=['subject', 'announcement'], name='audience_subject_idx'),
+            models.Index(fields=['course', 'announcement'], name='audience_course_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(subject__isnull=False, course__isnull=True) | models.Q(subject__isnull=True, course__isnull=False),
+                name='audience_subject_xor_course',
+            ),
+            models.UniqueConstraint(fields=['announcement', 'subject'], name='unique_audience_subject'),
+            models.UniqueConstraint(fields=['announcement', 'course'], name='unique_audience_course'),
+        ]
+    
+    def __str__(self):
+        target = self.subject.code if self.subject_id else f"All {self.course.code}"
+        return f"{self.announcement.title} -> {target}"
+
+
+def audience_prefetch(prefix=''):
+    """Prefetch loading an announcement's audience with its subjects and courses in one query"""
+    return models.Prefetch(
+        f'{prefix}audience',
+        queryset=AnnouncementAudience.objects.select_related('subject', 'course').order_by('id')
+    )
+
+
+class InboxEntry(models.Model):
+    """
+    Materialized announcement feed (fan-out on write)
+    One row per enrolled student for course-specific announcements and a
+    single shared row (no student) for system-wide announcements
+    """
+    announcement = models.ForeignKey(
+        Announcement,
+        on_delete=models.CASCADE,
+        related_name='inbox_entries'
+    )
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='inbox_entries',
+        help_text="Empty for shared system-wide entries"
+    )
+    # Copied from the announcement's published_at and sequence, so feed reads and
+    # unread counts never touch the announcement table
+    created_at = models.DateTimeField()
+    sequence = models.BigIntegerField()
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Inbox Entry'
+        verbose_name_plural = 'Inbox Entries'
+        indexes = [
+            models.Index(fields=['student', '-created_at'], name='inbox_student_created_idx'),
+            models.Index(fields=['student', 'announcement'], name='inbox_student_announcement_idx'),
+            models.Index(fields=['student', 'sequence'], name='inbox_student_sequence_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['announcement', 'student'], name='unique_inbox_entry'),
+        ]
+    
+    def __str__(self):
+        recipient = self.student.username if self.student_id else 'everyone'
+        return f"{self.announcement.title} -> {recipient}"
 
+
+class ReadState(models.Model):
+    """
+    Compact per-student read tracking, keyed by Announcement.sequence
+    Every announcement published at or below last_read_seq counts as read;
+    read_seqs holds the sparse set of announcements read above the watermark
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='announcement_read_state')
+    last_read_seq = models.BigIntegerField(default=0)
+    read_seqs = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Read State'
+        verbose_name_plural = 'Read States'
+    
+    def __str__(self):
+        return f"{self.user.username} read up to #{self.last_read_seq} (+{len(self.read_seqs)})"
+    
+    def is_read(self, sequence):
+        return sequence <= self.last_read_seq or sequence in self.read_seqs
+
+
+class DigestPreference(models.Model):
+    """
+    How often a student receives an email digest of new announcements
+    """
+    FREQUENCY_CHOICES = [
+        ('off', 'Off'),
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+    ]
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='digest_preference')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='off')
+    last_sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Digest Preference'
+        verbose_name_plural = 'Digest Preferences'
+        indexes = [
+            models.Index(fields=['frequency', 'last_sent_at'], name='digest_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.get_frequency_display()}"
@@ -0,0 +1,167 @@
+"""
+Publish/subscribe for live announcement delivery
+
+Views publish announcement events to topics ("system", "<db>:subject:<id>"
+or "<db>:course:<id>") and the SSE stream subscribes to the topics relevant
+to a student. Every campus database numbers its subjects and courses on its
+own, so their topics carry the database alias. The
+backend is chosen with settings.ANNOUNCEMENT_BROKER so the in-process
+broker can be swapped for one backed by an external message broker.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+SYSTEM_TOPIC = 'system'
+
+
+def subject_topic(subject_id, database=None):
+    from StudentGradeManagementSystem.sharding import current_database
+    return f"{database or current_database()}:subject:{subject_id}"
+
+
+def course_topic(course_id, database=None):
+    from StudentGradeManagementSystem.sharding import current_database
+    return f"{database or current_database()}:course:{course_id}"
+
+
+class BaseBroker:
+    """Interface every broker backend implements"""
+
+    def publish(self, topic, event):
+        """Deliver an event to every current subscriber of a topic (callable from any thread)"""
+        raise NotImplementedError
+
+    def subscribe(self, topics):
+        """
+        Async context manager yielding an asyncio.Queue that receives the
+        events published to any of the given topics
+        """
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    """
+    Fans events out to asyncio queues inside this process
+    Subscribers are grouped by event loop so a publish costs one
+    call_soon_threadsafe per loop rather than one per connection.
+    """
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # loop -> topic -> set of queues
+        self._subscribers = defaultdict(lambda: defaultdict(set))
+
+    def publish(self, topic, event):
+        with self._lock:
+            loops = [loop for loop, topics in self._subscribers.items() if topics.get(topic)]
+        for loop in loops:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._dispatch, loop, topic, event)
+
+    def _dispatch(self, loop, topic, event):
+        with self._lock:
+            queues = list(self._subscribers.get(loop, {}).get(topic, ()))
+        for queue in queues:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client must not hold up everyone else; it can catch up by reloading
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, topics):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            for topic in topics:
+                self._subscribers[loop][topic].add(queue)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                loop_topics = self._subscribers.get(loop, {})
+                for topic in topics:
+                    loop_topics.get(topic, set()).discard(queue)
+                    if topic in loop_topics and not loop_topics[topic]:
+                        del loop_topics[topic]
+                if not loop_topics:
+                    self._subscribers.pop(loop, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({queue for topics in self._subscribers.values() for queues in topics.values() for queue in queues})
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker configured by settings.ANNOUNCEMENT_BROKER"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'ANNOUNCEMENT_BROKER', 'announcements.pubsub.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def announcement_event(announcement):
+    """
+    Serializable payload pushed to subscribers. Drafts, hidden, scheduled and
+    expired announcements send only their id, so clients can drop them
+    without ever receiving unpublished text.
+    """
+    if not announcement.is_active:
+        return {'id': announcement.id, 'is_active': False}
+    return {
+        'id': announcement.id,
+        'title': announcement.title,
+        'content': announcement.content,
+        'announcement_type': announcement.announcement_type,
+        'audience': announcement.audience_label or None,
+        'is_active': announcement.is_active,
+        'created_at': announcement.created_at.isoformat(),
+        'updated_at': announcement.updated_at.isoformat(),
+    }
+
+
+def announcement_topics(announcement):
+    """Topics an announcement is delivered on (empty if it has no audience)"""
+    if announcement.announcement_type == 'system':
+        return {SYSTEM_TOPIC}
+    return {
+        subject_topic(target.subject_id) if target.subject_id else course_topic(target.course_id)
+        for target in announcement.audience.all()
+    }
+
+
+def publish_announcement(announcement, previous_topics=()):
+    """
+    Publish an announcement once the surrounding transaction commits.
+    previous_topics also notifies the old audience when an edit moved it.
+    """
+    from django.db.models import prefetch_related_objects
+    from .models import audience_prefetch
+
+    # Topics and the event payload both read the audience; load it once
+    prefetch_related_objects([announcement], audience_prefetch())
+    topics = announcement_topics(announcement) | set(previous_topics)
+    if not topics:
+        return
+    event = announcement_event(announcement)
+
+    def send():
+        broker = get_broker()
+        for topic in topics:
+            broker.publish(topic, event)
+
+    transaction.on_commit(send)
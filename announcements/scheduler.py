@@ -0,0 +1,41 @@
+"""
+Publish/expiry scheduler for announcements
+
+Each announcement stores the time of its next visibility change in
+next_transition_at (partially indexed), so a tick only reads rows that
+are due instead of re-evaluating every schedule. Both functions work on the
+campus database of the current context; the run_announcement_scheduler
+command runs them on every campus database through fan_out().
+"""
+from django.db import router, transaction
+from django.utils import timezone
+
+from . import pubsub
+from .models import Announcement, audience_prefetch
+
+
+def run_due(now=None, batch_size=500):
+    """Apply every transition that is due at `now`; returns the number of announcements changed"""
+    now = now or timezone.now()
+    changed = 0
+    while True:
+        with transaction.atomic(using=router.db_for_write(Announcement)):
+            due = list(Announcement.objects.prefetch_related(audience_prefetch()).filter(
+                next_transition_at__lte=now
+            ).order_by('next_transition_at')[:batch_size])
+            for announcement in due:
+                # Rows with a pending transition are always meant to be visible in their window
+                announcement.apply_schedule(True, now)
+                # save() fires the inbox fan-out, which publishes or retracts the rows
+                announcement.save(update_fields=['is_active', 'next_transition_at', 'updated_at'])
+                pubsub.publish_announcement(announcement)
+        changed += len(due)
+        if len(due) < batch_size:
+            return changed
+
+
+def next_due():
+    """Earliest pending transition, or None"""
+    return Announcement.objects.filter(
+        next_transition_at__isnull=False
+    ).order_by('next_transition_at').values_list('next_transition_at', flat=True).first()
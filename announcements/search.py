@@ -0,0 +1,18 @@
+from django.db.models import Q
+
+from courses.search import fts_available, in_rank_order, ranked_ids
+from .models import Announcement
+
+ANNOUNCEMENT_FTS_TABLE = 'announcements_announcement_fts'
+ANNOUNCEMENT_FTS_COLUMNS = ('title', 'content')
+
+
+def search_announcements(query, queryset=None, limit=50):
+    """Announcements matching query, ranked with title matches weighted above content"""
+    queryset = Announcement.objects.all() if queryset is None else queryset
+    if not fts_available(queryset.db):
+        return list(queryset.filter(
+            Q(title__icontains=query) | Q(content__icontains=query)
+        ).order_by('-created_at')[:limit])
+    ids = ranked_ids(ANNOUNCEMENT_FTS_TABLE, query, '5.0, 1.0', limit, within=queryset)
+    return in_rank_order(queryset, ids)
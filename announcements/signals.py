@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from courses.models import Enrollment
+from . import inbox
+from .digests import invalidate_fragment
+from .models import Announcement
+
+
+@receiver(post_save, sender=Announcement)
+def fan_out_announcement(sender, instance, created=False, raw=False, **kwargs):
+    """Publish, update or retract an announcement's inbox rows"""
+    if raw:
+        return
+    # A new course announcement has no audience rows yet; set_audience() fans it out
+    if not (created and instance.announcement_type == 'course'):
+        inbox.sync_announcement(instance)
+    invalidate_fragment(instance.pk, kwargs.get('using'))
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, raw=False, **kwargs):
+    """Backfill or retract course announcements when an enrollment changes"""
+    if not raw:
+        inbox.sync_student(instance.student_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    inbox.sync_student(instance.student_id)
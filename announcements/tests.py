@@ -1,3 +1,440 @@
+from unittest import mock
+
 from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from courses.models import Course, Subject, Enrollment
+from StudentGradeManagementSystem.querybudget import QueryBudgetTestMixin
+from StudentGradeManagementSystem.queryplans import QueryPlanTestMixin
+from . import inbox
+from .models import Announcement, InboxEntry
+
+
+class AnnouncementTestMixin:
+    def setUp(self):
+        self.instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        self.student = User.objects.create_user('student', password='pass12345', role='student')
+        self.other_student = User.objects.create_user('other', password='pass12345', role='student')
+        self.course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        self.subject = Subject.objects.create(code='CS101', name='Intro', course=self.course, instructor=self.instructor)
+        self.other_subject = Subject.objects.create(code='CS102', name='Data', course=self.course, instructor=self.instructor)
+        self.enrollment = Enrollment.objects.create(student=self.student, subject=self.subject)
+
+    def announce(self, title='Notice', subject=None, courses=(), **kwargs):
+        announcement = Announcement.objects.create(
+            title=title,
+            content='Body',
+            announcement_type='course' if subject or courses else 'system',
+            created_by=self.instructor,
+            **kwargs
+        )
+        if subject or courses:
+            announcement.set_audience([subject.id] if subject else [], [course.id for course in courses])
+        return announcement
+
+
+class InboxFanOutTests(AnnouncementTestMixin, TestCase):
+    def test_course_announcement_fans_out_to_enrolled_students(self):
+        announcement = self.announce(subject=self.subject)
+        self.assertEqual(
+            list(InboxEntry.objects.filter(announcement=announcement).values_list('student_id', flat=True)),
+            [self.student.id]
+        )
+
+    def test_system_announcement_uses_one_shared_row(self):
+        announcement = self.announce()
+        entries = InboxEntry.objects.filter(announcement=announcement)
+        self.assertEqual(entries.count(), 1)
+        self.assertIsNone(entries.get().student_id)
+        self.assertEqual(inbox.feed(self.other_student), [announcement])
+
+    def test_feed_is_newest_first_across_shared_and_personal_rows(self):
+        first = self.announce('first', subject=self.subject)
+        second = self.announce('second')
+        third = self.announce('third', subject=self.subject)
+        self.assertEqual(inbox.feed(self.student), [third, second, first])
+        self.assertEqual(inbox.feed(self.student, limit=2), [third, second])
+
+    def test_deactivating_and_moving_retracts_rows(self):
+        announcement = self.announce(subject=self.subject)
+        announcement.is_active = False
+        announcement.save()
+        self.assertFalse(InboxEntry.objects.filter(announcement=announcement).exists())
+
+        announcement.is_active = True
+        announcement.save()
+        announcement.set_audience([self.other_subject.id])
+        self.assertEqual(inbox.feed(self.student), [])
+
+    def test_edit_view_resyncs_inbox(self):
+        announcement = self.announce(subject=self.subject)
+        self.client.force_login(self.instructor)
+        self.client.post(reverse('announcements:edit_announcement', args=[announcement.id]), {
+            'title': 'Now system-wide',
+            'content': 'Body',
+            'announcement_type': 'system',
+            'is_active': 'on',
+        })
+        self.assertEqual(inbox.feed(self.other_student), [announcement])
+
+    def test_enrollment_changes_backfill_and_retract(self):
+        announcement = self.announce(subject=self.other_subject)
+        enrollment = Enrollment.objects.create(student=self.student, subject=self.other_subject)
+        self.assertEqual(inbox.feed(self.student), [announcement])
+
+        enrollment.status = 'dropped'
+        enrollment.save()
+        self.assertEqual(inbox.feed(self.student), [])
+
+
+class AudienceTests(AnnouncementTestMixin, TestCase):
+    def test_one_announcement_reaches_every_targeted_subject(self):
+        Enrollment.objects.create(student=self.other_student, subject=self.other_subject)
+        announcement = Announcement.objects.create(
+            title='Lab closed', content='Body', announcement_type='course', created_by=self.instructor
+        )
+        announcement.set_audience([self.subject.id, self.other_subject.id])
+        self.assertEqual(inbox.feed(self.student), [announcement])
+        self.assertEqual(inbox.feed(self.other_student), [announcement])
+        self.assertEqual(announcement.audience_label, 'CS101, CS102')
+
+        announcement.set_audience([self.other_subject.id])
+        self.assertEqual(inbox.feed(self.student), [])
+
+    def test_course_audience_follows_enrollments(self):
+        announcement = self.announce('Orientation', courses=[self.course])
+        self.assertEqual(inbox.feed(self.student), [announcement])
+        self.assertEqual(inbox.feed(self.other_student), [])
+
+        Enrollment.objects.create(student=self.other_student, subject=self.other_subject)
+        self.assertEqual(inbox.feed(self.other_student), [announcement])
+
+    def test_create_view_accepts_several_subjects(self):
+        self.client.force_login(self.instructor)
+        self.client.post(reverse('announcements:create_announcement'), {
+            'title': 'Exam week',
+            'content': 'Body',
+            'announcement_type': 'course',
+            'subjects': [self.subject.id, self.other_subject.id],
+            'is_active': 'on',
+        })
+        announcement = Announcement.objects.get(title='Exam week')
+        self.assertEqual(
+            set(announcement.audience.values_list('subject_id', flat=True)),
+            {self.subject.id, self.other_subject.id}
+        )
+
+    def test_instructors_cannot_target_other_subjects_or_courses(self):
+        foreign = Subject.objects.create(code='CS999', name='Other', course=self.course)
+        self.client.force_login(self.instructor)
+        for data in ({'subjects': [self.subject.id, foreign.id]}, {'courses': [self.course.id]}):
+            self.client.post(reverse('announcements:create_announcement'), {
+                'title': 'Sneaky', 'content': 'Body', 'announcement_type': 'course', 'is_active': 'on', **data
+            })
+        self.assertFalse(Announcement.objects.filter(title='Sneaky').exists())
+
+
+class ReadStateTests(AnnouncementTestMixin, TestCase):
+    def test_watermark_advances_over_contiguous_reads(self):
+        first = self.announce('first', subject=self.subject)
+        second = self.announce('second')
+        third = self.announce('third', subject=self.subject)
+        self.assertEqual(inbox.unread_count(self.student), 3)
+
+        state = inbox.mark_read(self.student, [third.id])
+        self.assertEqual((state.last_read_seq, state.read_seqs), (0, [third.sequence]))
+        self.assertEqual(inbox.unread_count(self.student), 2)
+
+        state = inbox.mark_read(self.student, [first.id, second.id])
+        self.assertEqual((state.last_read_seq, state.read_seqs), (third.sequence, []))
+        self.assertEqual(inbox.unread_count(self.student), 0)
+
+    def test_ids_outside_the_feed_are_not_stored(self):
+        first = self.announce('first', subject=self.subject)
+        third = self.announce('third', subject=self.subject)
+        hidden = self.announce('hidden', subject=self.other_subject)
+        state = inbox.mark_read(self.student, [third.id, hidden.id, hidden.id + 1000])
+        self.assertEqual((state.last_read_seq, state.read_seqs), (0, [third.sequence]))
+
+        # Retracted rows drop out of read_seqs on the next write
+        third.is_active = False
+        third.save()
+        state = inbox.mark_read(self.student, [])
+        self.assertEqual(state.read_seqs, [])
+        self.assertEqual(inbox.unread_count(self.student), 1)
+        self.assertEqual(inbox.mark_read(self.student, [first.id]).last_read_seq, first.sequence)
+
+    def test_bulk_mark_all_endpoint(self):
+        self.announce('first', subject=self.subject)
+        self.announce('second')
+        self.client.force_login(self.student)
+        self.client.post(reverse('announcements:mark_read'), {'all': '1'})
+        self.assertEqual(inbox.unread_count(self.student), 0)
+
+        self.announce('third')
+        response = self.client.get(reverse('accounts:student_dashboard'))
+        self.assertEqual(response.context['unread_announcements'], 1)
+        self.assertEqual([a.is_unread for a in response.context['announcements']], [True, False, False])
+
+
+class AnnouncementStreamTests(AnnouncementTestMixin, TestCase):
+    def test_thousand_idle_streams_share_a_handful_of_threads(self):
+        from asgiref.sync import async_to_sync
+        from .loadtest import run_sse_load
+        from . import pubsub
+
+        self.client.force_login(self.student)
+        cookie = f"sessionid={self.client.cookies['sessionid'].value}"
+
+        def publish():
+            pubsub.get_broker().publish(pubsub.subject_topic(self.subject.id), {'id': 1, 'title': 'Live'})
+
+        stats = async_to_sync(run_sse_load)(cookie, 1000, publish, host='testserver')
+        self.assertEqual(stats['accepted'], 1000)
+        self.assertEqual(stats['delivered'], 1000)
+        self.assertLess(stats['threads_while_open'] - stats['threads_before'], 20)
+        self.assertEqual(pubsub.get_broker().subscriber_count(), 0)
+
+    def test_create_view_publishes_to_subject_topic(self):
+        from . import pubsub
+
+        self.client.force_login(self.instructor)
+        with mock.patch.object(pubsub.get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('announcements:create_announcement'), {
+                    'title': 'Quiz moved',
+                    'content': 'Body',
+                    'announcement_type': 'course',
+                    'subjects': [self.subject.id],
+                    'is_active': 'on',
+                })
+        topic, event = publish.call_args.args
+        self.assertEqual((topic, event['title']), (pubsub.subject_topic(self.subject.id), 'Quiz moved'))
+
+    def test_hidden_announcements_publish_only_their_id(self):
+        from . import pubsub
+
+        self.client.force_login(self.instructor)
+        with mock.patch.object(pubsub.get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('announcements:create_announcement'), {
+                    'title': 'Draft exam answers',
+                    'content': 'Secret',
+                    'announcement_type': 'course',
+                    'subjects': [self.subject.id],
+                })
+        announcement = Announcement.objects.get(title='Draft exam answers')
+        self.assertEqual(publish.call_args.args[1], {'id': announcement.id, 'is_active': False})
+
+
+class AnnouncementSearchTests(AnnouncementTestMixin, TestCase):
+    def test_students_only_find_announcements_in_their_feed(self):
+        visible = self.announce('Midterm schedule', subject=self.subject)
+        self.announce('Midterm room change', subject=self.other_subject)
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('announcements:search_announcements'), {'q': 'midterm'})
+        self.assertEqual(response.context['announcements'], [visible])
+
+    def test_title_matches_rank_first(self):
+        from .search import search_announcements
+        in_content = Announcement.objects.create(
+            title='Reminder', content='Bring your laptop to the lab', created_by=self.instructor
+        )
+        in_title = Announcement.objects.create(
+            title='Laptop policy', content='Details inside', created_by=self.instructor
+        )
+        self.assertEqual(search_announcements('laptop'), [in_title, in_content])
+
+    def test_admin_search_matches_the_author_as_well(self):
+        mine = self.announce('Lab hours')
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        Announcement.objects.create(title='Teacher evaluations', content='Body', created_by=admin)
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:announcements_announcement_changelist'), {'q': 'teacher'})
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+        response = self.client.get(reverse('admin:announcements_announcement_changelist'), {'q': 'lab'})
+        self.assertEqual(list(response.context['cl'].result_list), [mine])
+
+
+class SchedulerTests(AnnouncementTestMixin, TestCase):
+    def test_scheduled_announcement_publishes_and_expires_when_due(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .scheduler import run_due
+
+        now = timezone.now()
+        announcement = Announcement(
+            title='Enrollment opens', content='Body', announcement_type='system', created_by=self.instructor,
+            publish_at=now + timedelta(hours=1), expire_at=now + timedelta(hours=2),
+        )
+        announcement.apply_schedule(True, now)
+        announcement.save()
+        self.assertTrue(announcement.is_scheduled)
+        self.assertEqual(inbox.feed(self.student), [])
+
+        self.assertEqual(run_due(now + timedelta(minutes=30)), 0)
+        self.assertEqual(run_due(now + timedelta(hours=1)), 1)
+        self.assertEqual(inbox.feed(self.student), [announcement])
+
+        self.assertEqual(run_due(now + timedelta(hours=3)), 1)
+        announcement.refresh_from_db()
+        self.assertFalse(announcement.is_active)
+        self.assertIsNone(announcement.next_transition_at)
+        self.assertEqual(inbox.feed(self.student), [])
+
+    def test_published_announcement_is_new_to_readers_and_digests(self):
+        from datetime import timedelta
+        from django.core import mail
+        from django.utils import timezone
+        from .digests import send_digests
+        from .models import DigestPreference
+        from .scheduler import run_due
+
+        self.student.email = 'student@example.com'
+        self.student.save()
+        DigestPreference.objects.create(user=self.student, frequency='daily')
+        now = timezone.now()
+        scheduled = Announcement(
+            title='Enrollment opens', content='Body', announcement_type='system', created_by=self.instructor,
+            publish_at=now + timedelta(hours=1),
+        )
+        scheduled.apply_schedule(True, now)
+        scheduled.save()
+        newer = self.announce('Room change', subject=self.subject)
+        inbox.mark_all_read(self.student)
+        send_digests('daily', now=timezone.now())
+        self.assertEqual(len(mail.outbox), 1)
+
+        run_due(now + timedelta(hours=1))
+        scheduled.refresh_from_db()
+        self.assertGreater(scheduled.sequence, newer.sequence)
+        self.assertEqual(inbox.unread_count(self.student), 1)
+        self.assertEqual(inbox.feed(self.student), [scheduled, newer])
+
+        send_digests('daily', now=timezone.now() + timedelta(days=1, seconds=1))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('Enrollment opens', mail.outbox[1].body)
+        self.assertNotIn('Room change', mail.outbox[1].body)
+
+    def test_admin_resave_keeps_the_schedule(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        publish_at = timezone.now() + timedelta(hours=1)
+        announcement = Announcement(
+            title='Enrollment opens', content='Body', announcement_type='system', created_by=self.instructor,
+            publish_at=publish_at,
+        )
+        announcement.apply_schedule(True)
+        announcement.save()
+
+        self.client.force_login(admin)
+        url = reverse('admin:announcements_announcement_change', args=[announcement.pk])
+        form = self.client.get(url).context['adminform'].form
+        self.assertTrue(form.initial['is_active'])
+        response = self.client.post(url, {
+            'title': 'Enrollment opens soon', 'content': 'Body', 'announcement_type': 'system',
+            'created_by': self.instructor.pk, 'is_active': 'on',
+            'publish_at_0': timezone.localtime(publish_at).strftime('%Y-%m-%d'),
+            'publish_at_1': timezone.localtime(publish_at).strftime('%H:%M:%S'),
+            'audience-TOTAL_FORMS': 0, 'audience-INITIAL_FORMS': 0,
+        })
+        self.assertEqual(response.status_code, 302)
+        announcement.refresh_from_db()
+        self.assertEqual(announcement.title, 'Enrollment opens soon')
+        self.assertTrue(announcement.is_scheduled)
+        self.assertIsNotNone(announcement.next_transition_at)
+
+    def test_hidden_announcements_never_transition(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        announcement = self.announce(publish_at=timezone.now() + timedelta(hours=1))
+        announcement.apply_schedule(False)
+        self.assertIsNone(announcement.next_transition_at)
+        self.assertFalse(announcement.is_active)
+
+
+class DigestTests(AnnouncementTestMixin, TestCase):
+    def test_digest_batches_only_new_items_per_student(self):
+        from datetime import timedelta
+        from django.core import mail
+        from django.utils import timezone
+        from .digests import send_digests
+        from .models import DigestPreference
+
+        self.student.email = 'student@example.com'
+        self.student.save()
+        self.other_student.email = 'other@example.com'
+        self.other_student.save()
+        DigestPreference.objects.create(user=self.student, frequency='daily')
+        DigestPreference.objects.create(user=self.other_student, frequency='daily')
+        self.announce('Lab moved', subject=self.subject)
+        self.announce('Campus closed')
+
+        stats = send_digests('daily', now=timezone.now() + timedelta(seconds=1))
+        self.assertEqual((stats['students'], stats['messages']), (2, 2))
+        bodies = {message.to[0]: message.body for message in mail.outbox}
+        self.assertIn('Lab moved', bodies['student@example.com'])
+        self.assertIn('Campus closed', bodies['student@example.com'])
+        self.assertNotIn('Lab moved', bodies['other@example.com'])
+
+        # Nothing is due again until the next period
+        self.assertEqual(send_digests('daily', now=timezone.now() + timedelta(hours=1))['messages'], 0)
+
+    def test_digest_reuses_one_connection(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .digests import send_digests
+        from .models import DigestPreference
+
+        for i in range(5):
+            user = User.objects.create_user(f'reader{i}', email=f'reader{i}@example.com', role='student')
+            DigestPreference.objects.create(user=user, frequency='weekly')
+        self.announce('Holiday')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as opened:
+            stats = send_digests('weekly', now=timezone.now() + timedelta(seconds=1), batch_size=2)
+        self.assertEqual(stats['messages'], 5)
+        self.assertEqual(opened.call_count, 1)
+
+
+class AnnouncementQueryPlanTests(QueryPlanTestMixin, AnnouncementTestMixin, TestCase):
+    def test_instructor_pages_and_fan_out_are_indexed(self):
+        self.announce('Welcome', subject=self.subject)
+        self.client.force_login(self.instructor)
+        self.assertViewUsesIndexes(reverse('announcements:my_announcements'))
+        self.assertViewUsesIndexes(reverse('announcements:create_announcement'), {
+            'title': 'Quiz', 'content': 'Body', 'announcement_type': 'course',
+            'subjects': [self.subject.id, self.other_subject.id], 'is_active': 'on',
+        }, method='post')
+
+    def test_enrollment_backfill_is_indexed(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from StudentGradeManagementSystem.queryplans import captured_plan_problems
+
+        self.announce('Welcome', courses=[self.course])
+        with CaptureQueriesContext(connection) as captured:
+            Enrollment.objects.create(student=self.other_student, subject=self.other_subject)
+        self.assertEqual(captured_plan_problems(captured.captured_queries), [])
+
+
+class AnnouncementQueryBudgetTests(QueryBudgetTestMixin, AnnouncementTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            self.announce(f'Notice {i}', subject=self.subject if i % 2 else None)
+
+    def test_instructor_views_stay_within_budget(self):
+        announcement = Announcement.objects.first()
+        self.client.force_login(self.instructor)
+        self.assertQueryBudget(reverse('announcements:my_announcements'), 4)
+        self.assertQueryBudget(reverse('announcements:create_announcement'), 3)
+        self.assertQueryBudget(reverse('announcements:edit_announcement', args=[announcement.id]), 5)
+        self.assertQueryBudget(reverse('announcements:search_announcements'), 5, {'q': 'notice'})
 
-# Create your tests here.
+    def test_search_stays_within_budget_for_students(self):
+        self.client.force_login(self.student)
+        self.assertQueryBudget(reverse('announcements:search_announcements'), 5, {'q': 'notice'})
@@ -8,4 +8,7 @@ urlpatterns = [
     path('my-announcements/', views.my_announcements, name='my_announcements'),
     path('edit/<int:announcement_id>/', views.edit_announcement, name='edit_announcement'),
     path('delete/<int:announcement_id>/', views.delete_announcement, name='delete_announcement'),
+    path('mark-read/', views.mark_read, name='mark_read'),
+    path('stream/', views.announcement_stream, name='announcement_stream'),
+    path('search/', views.search_announcements, name='search_announcements'),
 ]
@@ -1,13 +1,79 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.contrib import messages
-from .models import Announcement
-from courses.models import Subject
+from django.utils.http import url_has_allowed_host_and_scheme
+from . import inbox, pubsub
+from .models import Announcement, audience_prefetch
+from courses.models import Course, Subject
+from StudentGradeManagementSystem.pagination import paginate
+from StudentGradeManagementSystem.routers import use_primary
+
+def _parse_schedule(request):
+    """Read the optional publish/expiry datetime-local inputs as aware datetimes"""
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+    
+    values = []
+    for field in ('publish_at', 'expire_at'):
+        raw = request.POST.get(field, '').strip()
+        if not raw:
+            values.append(None)
+            continue
+        value = parse_datetime(raw)
+        if value is None:
+            raise ValueError(f'Invalid {field.replace("_at", "")} time.')
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        values.append(value)
+    publish_at, expire_at = values
+    if publish_at and expire_at and expire_at <= publish_at:
+        raise ValueError('The expiry time must be after the publish time.')
+    return publish_at, expire_at
+
+
+def _parse_audience(request, announcement_type):
+    """Validate the selected subjects and courses; returns (subject_ids, course_ids)"""
+    if announcement_type != 'course':
+        return set(), set()
+    try:
+        subject_ids = {int(i) for i in request.POST.getlist('subjects')}
+        course_ids = {int(i) for i in request.POST.getlist('courses')}
+    except ValueError:
+        raise ValueError('Invalid subject selected.')
+    if not subject_ids and not course_ids:
+        raise ValueError('Select at least one subject or course for a course-specific announcement.')
+    
+    subjects = Subject.objects.filter(id__in=subject_ids)
+    if request.user.is_instructor:
+        # Instructors can only announce for their own subjects
+        if course_ids:
+            raise ValueError('Only administrators can announce to a whole course.')
+        subjects = subjects.filter(instructor=request.user)
+    if subjects.count() != len(subject_ids):
+        raise ValueError('You can only create announcements for your own subjects.')
+    if Course.objects.filter(id__in=course_ids).count() != len(course_ids):
+        raise ValueError('Invalid course selected.')
+    return subject_ids, course_ids
+
+
+def _audience_choices(user):
+    """Subjects and courses a user may target"""
+    if user.is_instructor:
+        return Subject.objects.filter(instructor=user).order_by('course_id', 'semester', 'code'), Course.objects.none()
+    return Subject.objects.all(), Course.objects.all()
+
 
 @login_required
 def create_announcement(request):
     """Create a new announcement (instructors and admins)"""
-    if not (request.user.is_instructor or request.user.is_admin):
+    if not (request.user.is_instructor or request.user.is_admin_role):
         messages.error(request, 'Only instructors and administrators can create announcements.')
         return redirect('accounts:dashboard')
     
@@ -15,13 +81,18 @@ def create_announcement(request):
         title = request.POST.get('title', '').strip()
         content = request.POST.get('content', '').strip()
         announcement_type = request.POST.get('announcement_type', 'system')
-        subject_id = request.POST.get('subject')
         is_active = request.POST.get('is_active') == 'on'
         
         # Validation
         if not title or not content:
             messages.error(request, 'Title and content are required.')
             return redirect('announcements:create_announcement')
+        try:
+            publish_at, expire_at = _parse_schedule(request)
+            subject_ids, course_ids = _parse_audience(request, announcement_type)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('announcements:create_announcement')
         
         # Create announcement
         announcement = Announcement(
@@ -29,34 +100,24 @@ def create_announcement(request):
             content=content,
             announcement_type=announcement_type,
             created_by=request.user,
-            is_active=is_active
+            publish_at=publish_at,
+            expire_at=expire_at,
         )
+        announcement.apply_schedule(is_active)
         
-        # If course-specific, link to subject
-        if announcement_type == 'course' and subject_id:
-            try:
-                subject = Subject.objects.get(id=subject_id)
-                # Instructors can only announce for their own subjects
-                if request.user.is_instructor and subject.instructor != request.user:
-                    messages.error(request, 'You can only create announcements for your own subjects.')
-                    return redirect('announcements:create_announcement')
-                announcement.subject = subject
-            except Subject.DoesNotExist:
-                messages.error(request, 'Invalid subject selected.')
-                return redirect('announcements:create_announcement')
-        
-        announcement.save()
+        with transaction.atomic():
+            announcement.save()
+            announcement.set_audience(subject_ids, course_ids)
+        pubsub.publish_announcement(announcement)
         messages.success(request, 'Announcement created successfully!')
         return redirect('accounts:dashboard')
     
-    # Get subjects for the dropdown
-    if request.user.is_instructor:
-        subjects = Subject.objects.filter(instructor=request.user)
-    else:  # Admin
-        subjects = Subject.objects.all()
+    # Subjects (and, for admins, whole courses) for the audience pickers
+    subjects, courses = _audience_choices(request.user)
     
     context = {
         'subjects': subjects,
+        'courses': courses,
     }
     return render(request, 'announcements/create_announcement.html', context)
 
@@ -64,65 +125,64 @@ def create_announcement(request):
 @login_required
 def my_announcements(request):
     """View all announcements created by the current user"""
-    if not (request.user.is_instructor or request.user.is_admin):
+    if not (request.user.is_instructor or request.user.is_admin_role):
         messages.error(request, 'Access denied.')
         return redirect('accounts:dashboard')
     
     announcements = Announcement.objects.filter(
         created_by=request.user
-    ).select_related('subject').order_by('-created_at')
+    ).select_related('created_by').prefetch_related(audience_prefetch())
+    # id breaks ties in the order of announcement_author_idx
+    page = paginate(request, announcements, ['-created_at', 'id'])
     
     context = {
-        'announcements': announcements,
+        'announcements': page.object_list,
+        'page': page,
     }
     return render(request, 'announcements/my_announcements.html', context)
 
 
 @login_required
+@use_primary
 def edit_announcement(request, announcement_id):
     """Edit an existing announcement"""
     announcement = get_object_or_404(Announcement, id=announcement_id)
     
     # Check permission
-    if announcement.created_by != request.user and not request.user.is_admin:
+    if announcement.created_by_id != request.user.id and not request.user.is_admin_role:
         messages.error(request, 'You can only edit your own announcements.')
         return redirect('announcements:my_announcements')
     
     if request.method == 'POST':
+        previous_topics = pubsub.announcement_topics(announcement)
         announcement.title = request.POST.get('title', '').strip()
         announcement.content = request.POST.get('content', '').strip()
         announcement.announcement_type = request.POST.get('announcement_type', 'system')
-        announcement.is_active = request.POST.get('is_active') == 'on'
-        
-        # Update subject if course-specific
-        if announcement.announcement_type == 'course':
-            subject_id = request.POST.get('subject')
-            if subject_id:
-                try:
-                    subject = Subject.objects.get(id=subject_id)
-                    if request.user.is_instructor and subject.instructor != request.user:
-                        messages.error(request, 'You can only link to your own subjects.')
-                        return redirect('announcements:edit_announcement', announcement_id=announcement_id)
-                    announcement.subject = subject
-                except Subject.DoesNotExist:
-                    messages.error(request, 'Invalid subject selected.')
-                    return redirect('announcements:edit_announcement', announcement_id=announcement_id)
-        else:
-            announcement.subject = None
+        try:
+            announcement.publish_at, announcement.expire_at = _parse_schedule(request)
+            subject_ids, course_ids = _parse_audience(request, announcement.announcement_type)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('announcements:edit_announcement', announcement_id=announcement_id)
+        announcement.apply_schedule(request.POST.get('is_active') == 'on')
         
-        announcement.save()
+        with transaction.atomic():
+            announcement.save()
+            announcement.set_audience(subject_ids, course_ids)
+        pubsub.publish_announcement(announcement, previous_topics)
         messages.success(request, 'Announcement updated successfully!')
         return redirect('announcements:my_announcements')
     
-    # Get subjects for the dropdown
-    if request.user.is_instructor:
-        subjects = Subject.objects.filter(instructor=request.user)
-    else:
-        subjects = Subject.objects.all()
+    # Subjects (and, for admins, whole courses) for the audience pickers
+    subjects, courses = _audience_choices(request.user)
+    audience = list(announcement.audience.values_list('subject_id', 'course_id'))
     
     context = {
         'announcement': announcement,
         'subjects': subjects,
+        'courses': courses,
+        'selected_subject_ids': {subject_id for subject_id, _ in audience if subject_id},
+        'selected_course_ids': {course_id for _, course_id in audience if course_id},
     }
     return render(request, 'announcements/edit_announcement.html', context)
 
@@ -133,7 +193,7 @@ def delete_announcement(request, announcement_id):
     announcement = get_object_or_404(Announcement, id=announcement_id)
     
     # Check permission
-    if announcement.created_by != request.user and not request.user.is_admin:
+    if announcement.created_by_id != request.user.id and not request.user.is_admin_role:
         messages.error(request, 'You can only delete your own announcements.')
         return redirect('announcements:my_announcements')
     
@@ -144,3 +204,89 @@ def delete_announcement(request, announcement_id):
     
     return redirect('announcements:my_announcements')
 
+
+
+@login_required
+def mark_read(request):
+    """Mark announcements as read in bulk (students)"""
+    if not request.user.is_student:
+        messages.error(request, 'Access denied. Students only.')
+        return redirect('accounts:dashboard')
+    
+    if request.method == 'POST':
+        if request.POST.get('all'):
+            inbox.mark_all_read(request.user)
+        else:
+            try:
+                announcement_ids = [int(i) for i in request.POST.getlist('announcement_ids')]
+            except ValueError:
+                messages.error(request, 'Invalid announcement selected.')
+                return redirect('accounts:view_all_announcements')
+            inbox.mark_read(request.user, announcement_ids)
+    
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('accounts:view_all_announcements')
+
+
+async def _event_stream(topics):
+    """Yield server-sent events for the given topics, with periodic keep-alives"""
+    heartbeat = getattr(settings, 'ANNOUNCEMENT_STREAM_HEARTBEAT', 15)
+    async with pubsub.get_broker().subscribe(topics) as queue:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield f"id: {event['id']}\nevent: announcement\ndata: {json.dumps(event)}\n\n"
+
+
+@login_required
+async def announcement_stream(request):
+    """Server-sent event stream of new and updated announcements (students, ASGI)"""
+    user = await request.auser()
+    if not user.is_student:
+        return HttpResponseForbidden('Students only.')
+    
+    from courses.models import Enrollment
+    enrolled = await sync_to_async(list)(Enrollment.objects.filter(
+        student=user,
+        status='enrolled'
+    ).values_list('subject_id', 'subject__course_id'))
+    topics = {pubsub.SYSTEM_TOPIC}
+    for subject_id, course_id in enrolled:
+        topics.update((pubsub.subject_topic(subject_id), pubsub.course_topic(course_id)))
+    
+    response = StreamingHttpResponse(_event_stream(topics), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def search_announcements(request):
+    """Ranked full-text search over the announcements the user can see"""
+    from django.db.models import Q
+    from .search import search_announcements as search
+    
+    if request.user.is_student:
+        visible = Announcement.objects.filter(id__in=inbox.visible_announcement_ids(request.user))
+    elif request.user.is_instructor or request.user.is_admin_role:
+        visible = Announcement.objects.filter(
+            Q(created_by=request.user) | Q(announcement_type='system', is_active=True)
+        )
+    else:
+        messages.error(request, 'Access denied.')
+        return redirect('accounts:dashboard')
+    
+    query = request.GET.get('q', '').strip()
+    announcements = search(query, visible.select_related('created_by').prefetch_related(audience_prefetch())) if query else []
+    
+    context = {
+        'query': query,
+        'announcements': announcements,
+    }
+    return render(request, 'announcements/search.html', context)
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceVersion',
+            fields=[
+                ('key', models.CharField(help_text='e.g. student:42, subject:7, catalog', max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resource Version',
+                'verbose_name_plural': 'Resource Versions',
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import models
+
+class ResourceVersion(models.Model):
+    """
+    Version stamp of an API resource (see api/versions.py)
+    Changed whenever the data behind the resource changes; ETags are derived from it
+    """
+    key = models.CharField(max_length=100, primary_key=True, help_text="e.g. student:42, subject:7, catalog")
+    version = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Resource Version'
+        verbose_name_plural = 'Resource Versions'
+    
+    def __str__(self):
+        return f"{self.key} @ {self.version}"
@@ -0,0 +1,64 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import StudentProfile, User
+from announcements.models import Announcement
+from courses.models import Course, Enrollment, Subject
+from grades.models import GPA, Grade
+from .versions import bump, student_key, subject_key
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def enrollment_changed(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        bump(student_key(instance.student_id), subject_key(instance.subject_id), using=using)
+
+
+@receiver(post_save, sender=Grade)
+@receiver(post_delete, sender=Grade)
+def grade_changed(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    if Grade.enrollment.is_cached(instance):
+        enrollment = instance.enrollment
+        keys = enrollment.student_id, enrollment.subject_id
+    else:
+        keys = Enrollment.objects.using(using).filter(pk=instance.enrollment_id).values_list('student_id', 'subject_id').first()
+    if keys:
+        bump(student_key(keys[0]), subject_key(keys[1]), using=using)
+
+
+@receiver(post_save, sender=GPA)
+@receiver(post_delete, sender=GPA)
+def gpa_changed(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        bump(student_key(instance.student_id), using=using)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def catalog_changed(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        bump('catalog', using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_delete, sender=StudentProfile)
+def directory_changed(sender, instance, using, raw=False, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no resource shows
+    if raw or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    bump('directory', using=using)
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+def announcements_changed(sender, instance, using, raw=False, **kwargs):
+    # Views save and set the audience in one transaction, so the inbox rows are in place by commit
+    if not raw:
+        bump('announcements', using=using)
@@ -0,0 +1,193 @@
+import json
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from announcements.models import Announcement
+from courses.models import Course, Enrollment, Subject
+from grades.models import Grade
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        self.other_instructor = User.objects.create_user('other-teacher', password='pass12345', role='instructor')
+        self.student = User.objects.create_user('student', password='pass12345', role='student', first_name='Ana')
+        self.classmate = User.objects.create_user('classmate', password='pass12345', role='student')
+        self.course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        self.subjects = [
+            Subject.objects.create(code=f"CS10{n}", name=f"Subject {n}", course=self.course, instructor=self.instructor)
+            for n in range(5)
+        ]
+        self.grades = []
+        for subject in self.subjects:
+            enrollment = Enrollment.objects.create(student=self.student, subject=subject)
+            self.grades.append(Grade.objects.create(enrollment=enrollment, prelim_grade=80))
+        Enrollment.objects.create(student=self.classmate, subject=self.subjects[0])
+
+    def get(self, name, *args, user=None, **headers):
+        self.client.force_login(user or self.student)
+        return self.client.get(reverse(f"api:{name}", args=args), **headers)
+
+    def follow_pages(self, url):
+        rows = []
+        while url:
+            data = self.client.get(url).json()
+            rows.extend(data['results'])
+            url = data['next']
+        return rows
+
+    def test_grades_are_compact_values_rows(self):
+        response = self.get('grades')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertNotIn(b', ', response.content)
+        row = response.json()['results'][0]
+        self.assertEqual((row['subject_code'], row['prelim']), ('CS104', '80.00'))
+        self.assertEqual(self.get('grades', user=self.instructor).status_code, 403)
+
+    def test_unchanged_resource_answers_304_without_its_queries(self):
+        etag = self.get('roster', self.subjects[0].id, user=self.instructor)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api:roster', args=[self.subjects[0].id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse([q for q in queries if 'courses_enrollment' in q['sql']])
+
+    def test_writes_change_only_the_affected_etags(self):
+        roster = self.get('roster', self.subjects[0].id, user=self.instructor)['ETag']
+        other_roster = self.get('roster', self.subjects[1].id, user=self.instructor)['ETag']
+        grades = self.get('grades')['ETag']
+        classmate = self.get('grades', user=self.classmate)['ETag']
+
+        grade = self.grades[0]
+        grade.final_grade = 95
+        grade.save()
+
+        self.assertNotEqual(self.get('roster', self.subjects[0].id, user=self.instructor)['ETag'], roster)
+        self.assertEqual(self.get('roster', self.subjects[1].id, user=self.instructor)['ETag'], other_roster)
+        self.assertNotEqual(self.get('grades')['ETag'], grades)
+        self.assertEqual(self.get('grades', user=self.classmate)['ETag'], classmate)
+
+    def test_cursor_pagination(self):
+        self.client.force_login(self.student)
+        rows = self.follow_pages(reverse('api:grades') + '?limit=2')
+        self.assertEqual([row['subject_code'] for row in rows], ['CS104', 'CS103', 'CS102', 'CS101', 'CS100'])
+
+        self.client.force_login(self.instructor)
+        rows = self.follow_pages(reverse('api:subjects') + '?limit=3')
+        self.assertEqual([row['code'] for row in rows], ['CS100', 'CS101', 'CS102', 'CS103', 'CS104'])
+        self.assertEqual(self.client.get(reverse('api:subjects') + '?cursor=nonsense').status_code, 400)
+        self.assertEqual(self.client.get(reverse('api:subjects') + '?limit=1000').status_code, 400)
+
+    def test_roster_access(self):
+        response = self.get('roster', self.subjects[0].id, user=self.instructor)
+        self.assertEqual(sorted(row['username'] for row in response.json()['results']), ['classmate', 'student'])
+        self.assertEqual(self.get('roster', self.subjects[0].id, user=self.other_instructor).status_code, 403)
+        self.assertEqual(self.get('roster', 999, user=self.instructor).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api:roster', args=[self.subjects[0].id])).status_code, 401)
+
+    def test_feed_merges_system_and_course_announcements(self):
+        for n in range(3):
+            Announcement.objects.create(title=f"System {n}", content='Body', created_by=self.instructor)
+        for subject in self.subjects[:2]:
+            announcement = Announcement.objects.create(
+                title=f"About {subject.code}", content='Body', announcement_type='course', created_by=self.instructor,
+            )
+            announcement.set_audience(subject_ids=[subject.id])
+        etag = self.get('announcements')['ETag']
+
+        rows = self.follow_pages(reverse('api:announcements') + '?limit=2')
+        self.assertEqual(
+            [row['title'] for row in rows], ['About CS101', 'About CS100', 'System 2', 'System 1', 'System 0'],
+        )
+        self.client.force_login(self.instructor)
+        self.assertEqual(len(self.follow_pages(reverse('api:announcements'))), 3)
+
+        Announcement.objects.create(title='Another', content='Body', created_by=self.instructor)
+        self.assertNotEqual(self.get('announcements')['ETag'], etag)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        self.subject = Subject.objects.create(code='CS101', name='Programming', course=course, instructor=self.instructor)
+        self.enrollments = [
+            Enrollment.objects.create(student=User.objects.create_user(f"student{n}", role='student'), subject=self.subject)
+            for n in range(4)
+        ]
+        self.grade = Grade.objects.create(enrollment=self.enrollments[0], prelim_grade=80)
+        self.url = reverse('api:subject_changes', args=[self.subject.id])
+        self.client.force_login(self.instructor)
+
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(self.url, params).json()
+
+    def patch(self, *edits):
+        return self.client.patch(self.url, json.dumps({'changes': list(edits)}), content_type='application/json')
+
+    def test_delta_returns_only_rows_changed_since_the_cursor(self):
+        first = self.client.get(self.url, {'limit': 3}).json()
+        rest = self.client.get(first['next']).json()
+        self.assertIsNone(rest['next'])
+        self.assertEqual(sorted(row['id'] for row in first['results'] + rest['results']), [e.id for e in self.enrollments])
+        self.assertEqual(self.sync(rest['cursor'])['results'], [])
+
+        self.grade.final_grade = 90
+        self.grade.save()
+        dropped = self.enrollments.pop()
+        dropped_id = dropped.id
+        dropped.delete()
+        data = self.sync(rest['cursor'])
+        self.assertEqual([(row['id'], row['final']) for row in data['results']], [(self.enrollments[0].id, '90.00')])
+        self.assertEqual(data['results'][0]['version'], Grade.objects.get(pk=self.grade.pk).change_seq)
+        self.assertEqual(data['deleted'], [dropped_id])
+        self.assertEqual(self.sync(data['cursor']), {**data, 'results': [], 'deleted': []})
+
+    def test_upload_applies_edits_and_reports_conflicts(self):
+        rows = {row['id']: row for row in self.sync()['results']}
+        first, second, third = self.enrollments[:3]
+        response = self.patch(
+            {'id': first.id, 'version': rows[first.id]['version'], 'midterm': 85, 'final': '90'},
+            {'id': second.id, 'version': 0, 'prelim': 70},
+            {'id': third.id, 'version': 0, 'prelim': 101},
+            {'id': 999, 'version': 0, 'prelim': 70},
+        )
+        result = response.json()
+        self.assertEqual([row['id'] for row in result['applied']], [first.id, second.id])
+        self.assertEqual([row['id'] for row in result['errors']], [third.id, 999])
+        grade = Grade.objects.get(enrollment=first)
+        self.assertEqual((grade.weighted_average, grade.change_seq), (Decimal('85.50'), result['applied'][0]['version']))
+        self.assertEqual(Grade.objects.get(enrollment=second).prelim_grade, 70)
+
+        # The same edit again was based on a version that is no longer current
+        result = self.patch({'id': first.id, 'version': rows[first.id]['version'], 'final': 60}).json()
+        self.assertEqual(result['applied'], [])
+        self.assertEqual(result['conflicts'][0]['current']['final'], '90.00')
+
+    def test_upload_queries_do_not_grow_with_the_batch(self):
+        def queries(edits):
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(len(self.patch(*edits).json()['applied']), len(edits))
+            return len(captured)
+
+        small = queries([{'id': self.enrollments[1].id, 'version': 0, 'prelim': 80}])
+        large = queries([{'id': e.id, 'version': 0, 'prelim': 80} for e in self.enrollments[2:]])
+        self.assertEqual(small, large)
+
+    def test_upload_is_for_the_subject_instructor(self):
+        self.assertEqual(self.patch({'id': self.enrollments[0].id, 'version': 0}).status_code, 200)
+        self.client.force_login(User.objects.create_user('other', role='instructor'))
+        self.assertEqual(self.patch({'id': self.enrollments[0].id, 'version': 0}).status_code, 403)
+        self.client.force_login(self.instructor)
+        self.assertEqual(self.client.patch(self.url, 'nonsense', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
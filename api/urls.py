@@ -0,0 +1,13 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('grades/', views.grades, name='grades'),
+    path('gpa/', views.gpa, name='gpa'),
+    path('subjects/', views.subjects, name='subjects'),
+    path('subjects/<int:subject_id>/roster/', views.roster, name='roster'),
+    path('subjects/<int:subject_id>/changes/', views.subject_changes, name='subject_changes'),
+    path('announcements/', views.announcements, name='announcements'),
+]
@@ -0,0 +1,74 @@
+"""
+Version stamps behind the API's ETags
+
+Each resource depends on a few keys, and signal handlers (api/signals.py)
+give a key a new stamp whenever its rows change:
+
+- student:<id>  enrollments, grades and GPA rows of a student
+- subject:<id>  enrollments and grades in a subject
+- catalog       any course or subject
+- directory     any user or student profile (names on rosters)
+- announcements any announcement or audience (and so every feed)
+
+An ETag hashes the stamps with the user and the URL, so a conditional GET
+costs one primary-key lookup on api_resourceversion and answers 304 without
+running the resource's queries.
+
+Stamps live in 'default'. A write there stamps in the same transaction. A
+write to a campus shard stamps once it has committed, so a stamp is never
+visible before the data it describes.
+"""
+import hashlib
+import time
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+API_VERSION = 'v1'
+
+
+def student_key(student_id):
+    return f"student:{student_id}"
+
+
+def subject_key(subject_id):
+    return f"subject:{subject_id}"
+
+
+def _write(keys):
+    from .models import ResourceVersion
+
+    # Stamps only have to change, so one upsert replaces the read-increment-write
+    stamp = time.time_ns()
+    ResourceVersion.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+        [ResourceVersion(key=key, version=stamp) for key in sorted(keys)],
+        update_conflicts=True, unique_fields=['key'], update_fields=['version'],
+    )
+
+
+def bump(*keys, using=DEFAULT_DB_ALIAS):
+    """Give keys new stamps, once the transaction on `using` that changed their data commits"""
+    keys = {key for key in keys if key}
+    if not keys:
+        return
+    if using == DEFAULT_DB_ALIAS:
+        _write(keys)
+    else:
+        transaction.on_commit(lambda: _write(keys), using=using)
+
+
+def versions(keys):
+    """{key: stamp}; keys never stamped are 0"""
+    from .models import ResourceVersion
+
+    found = dict(ResourceVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+    return {key: found.get(key, 0) for key in keys}
+
+
+def etag(request, keys):
+    """Strong ETag of the response to `request` for a resource built from `keys`"""
+    stamps = versions(keys)
+    source = '|'.join([
+        API_VERSION, str(request.user.pk), request.get_full_path(),
+        *(f"{key}={stamps[key]}" for key in sorted(stamps)),
+    ])
+    return '"%s"' % hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
@@ -0,0 +1,269 @@
+"""
+JSON API, version 1 (/api/v1/)
+
+Session-authenticated endpoints for a student's grades and GPA, an
+instructor's subjects and rosters, and the announcement feed. Rows are
+serialized straight from .values(), never from model instances. Lists are
+cursor paginated: ?limit= (up to MAX_LIMIT) and the ?cursor= from the
+previous page's "next" link.
+
+Every response carries a strong ETag built from the resource's version
+stamps (api/versions.py). A request whose If-None-Match still matches is
+answered 304 after one stamp lookup, before the resource's own queries run.
+
+The one write is PATCH on a subject's changes, the upload half of the
+delta sync in courses/sync.py.
+"""
+import functools
+import json
+
+from django.db.models import F
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET, require_http_methods
+
+from StudentGradeManagementSystem.pagination import InvalidCursor, keyset_page, position, seek
+from StudentGradeManagementSystem.routers import primary
+from . import versions
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_BATCH = 200
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={'separators': (',', ':')})
+
+
+def api_view(keys):
+    """
+    Decorator for API views. keys(request, **kwargs) checks access (raising
+    ApiError) and names the version stamps the response depends on; the view
+    returns a dict to serialize
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        @require_GET
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return _json({'error': 'Authentication required'}, status=401)
+            try:
+                tag = versions.etag(request, keys(request, *args, **kwargs))
+                if tag in parse_etags(request.headers.get('If-None-Match', '')):
+                    response = HttpResponseNotModified()
+                else:
+                    # Stamps may come from a replica; the data must not be older than them
+                    with primary():
+                        response = _json(view_func(request, *args, **kwargs))
+            except ApiError as error:
+                return _json({'error': error.message}, status=error.status)
+            response['ETag'] = tag
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError(400, 'limit must be an integer') from None
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError(400, f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def _next_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+
+def _page(request, queryset, ordering):
+    """{'results': [...], 'next': url or None} for one keyset page of a .values() queryset"""
+    try:
+        rows, cursor = keyset_page(queryset, ordering, request.GET.get('cursor'), _limit(request))
+    except InvalidCursor as error:
+        raise ApiError(400, str(error)) from None
+    return {'results': rows, 'next': _next_url(request, cursor)}
+
+
+def _student_keys(request):
+    if not request.user.is_student:
+        raise ApiError(403, 'Students only')
+    return [versions.student_key(request.user.pk), 'catalog']
+
+
+def _instructor_keys(request):
+    if not request.user.is_instructor:
+        raise ApiError(403, 'Instructors only')
+    return ['catalog']
+
+
+def _roster_keys(request, subject_id):
+    from courses.models import Subject
+
+    subject = Subject.objects.filter(pk=subject_id).values('instructor_id').first()
+    if subject is None:
+        raise ApiError(404, 'Subject not found')
+    if subject['instructor_id'] != request.user.pk and not request.user.is_staff:
+        raise ApiError(403, 'Only the subject instructor can read its roster')
+    return [versions.subject_key(subject_id), 'directory']
+
+
+def _check_grader(request, subject_id):
+    from courses.models import Subject
+
+    subject = Subject.objects.filter(pk=subject_id).values('instructor_id').first()
+    if subject is None:
+        raise ApiError(404, 'Subject not found')
+    if not request.user.is_instructor or subject['instructor_id'] != request.user.pk:
+        raise ApiError(403, 'Only the subject instructor can change its grades')
+
+
+def _feed_keys(request):
+    keys = ['announcements']
+    if request.user.is_student:
+        # Enrollment changes add or retract course announcements
+        keys.append(versions.student_key(request.user.pk))
+    return keys
+
+
+@api_view(_student_keys)
+def grades(request):
+    """The student's enrollments with their grades, newest first"""
+    from courses.models import Enrollment
+
+    rows = Enrollment.objects.filter(student=request.user).values(
+        'id', 'status', 'enrolled_date', 'subject_id',
+        subject_code=F('subject__code'), subject_name=F('subject__name'), units=F('subject__units'),
+        semester=F('subject__semester'), prelim=F('grade__prelim_grade'), midterm=F('grade__midterm_grade'),
+        final=F('grade__final_grade'), average=F('grade__weighted_average'), letter=F('grade__letter_grade'),
+        grade_point=F('grade__grade_point'), remarks=F('grade__remarks'),
+    )
+    return _page(request, rows, ['-enrolled_date', '-id'])
+
+
+@api_view(_student_keys)
+def gpa(request):
+    """The student's GPA per semester"""
+    from grades.models import GPA
+
+    rows = GPA.objects.filter(student=request.user).values('semester', 'academic_year', 'gpa', 'total_units', 'computed_at')
+    return {'results': list(rows)}
+
+
+@api_view(_instructor_keys)
+def subjects(request):
+    """Subjects taught by the instructor, in subject_instructor_order_idx order"""
+    from courses.models import Subject
+
+    rows = Subject.objects.filter(instructor=request.user).values(
+        'id', 'code', 'name', 'units', 'semester', 'course_id', course_code=F('course__code'),
+    )
+    return _page(request, rows, ['course_id', 'semester', 'code'])
+
+
+@api_view(_roster_keys)
+def roster(request, subject_id):
+    """Students enrolled in a subject with their grades, newest enrollment first"""
+    from courses.models import Enrollment
+
+    rows = Enrollment.objects.filter(subject_id=subject_id, status='enrolled').values(
+        'id', 'enrolled_date', 'student_id',
+        username=F('student__username'), first_name=F('student__first_name'), last_name=F('student__last_name'),
+        student_number=F('student__student_profile__student_id'), prelim=F('grade__prelim_grade'),
+        midterm=F('grade__midterm_grade'), final=F('grade__final_grade'), average=F('grade__weighted_average'),
+        letter=F('grade__letter_grade'),
+    )
+    return _page(request, rows, ['-enrolled_date', '-id'])
+
+
+@api_view(_feed_keys)
+def announcements(request):
+    """
+    The announcement feed, newest first: system-wide announcements, plus a
+    student's course announcements. The personal and shared inbox rows are
+    paged with two index range scans and merged by seek(), as in inbox.feed()
+    """
+    from announcements.models import InboxEntry
+
+    ordering = ['-created_at', '-announcement_id']
+    entries = InboxEntry.objects.values(
+        'announcement_id', 'created_at', title=F('announcement__title'), content=F('announcement__content'),
+        type=F('announcement__announcement_type'), author=F('announcement__created_by__username'),
+    )
+    sources = [entries.filter(student__isnull=True)]
+    if request.user.is_student:
+        sources.append(entries.filter(student=request.user))
+    try:
+        rows, more = seek(sources, ordering, request.GET.get('cursor'), _limit(request))
+    except InvalidCursor as error:
+        raise ApiError(400, str(error)) from None
+    return {'results': rows, 'next': _next_url(request, position(rows[-1], ordering) if more else None)}
+
+
+@api_view(_roster_keys)
+def _subject_changes(request, subject_id):
+    from courses import sync
+
+    try:
+        page = sync.changes(subject_id, request.GET.get('cursor'), _limit(request))
+    except InvalidCursor as error:
+        raise ApiError(400, str(error)) from None
+    page['next'] = _next_url(request, page['cursor']) if page.pop('more') else None
+    return page
+
+
+def _edits(request):
+    """The list of grade edits in a PATCH body, checked for shape"""
+    try:
+        edits = json.loads(request.body)['changes']
+    except (ValueError, KeyError, TypeError):
+        raise ApiError(400, 'Expected a JSON body {"changes": [...]}') from None
+    if not isinstance(edits, list) or not 1 <= len(edits) <= MAX_BATCH:
+        raise ApiError(400, f"changes must be a list of 1 to {MAX_BATCH} edits")
+    for edit in edits:
+        if not isinstance(edit, dict) or not all(isinstance(edit.get(key), int) for key in ('id', 'version')):
+            raise ApiError(400, 'Every edit needs an integer id and version')
+    if len({edit['id'] for edit in edits}) != len(edits):
+        raise ApiError(400, 'An enrollment can only be edited once per batch')
+    return edits
+
+
+def _upload_changes(request, subject_id):
+    from courses import sync
+
+    if not request.user.is_authenticated:
+        return _json({'error': 'Authentication required'}, status=401)
+    try:
+        _check_grader(request, subject_id)
+        edits = _edits(request)
+    except ApiError as error:
+        return _json({'error': error.message}, status=error.status)
+    with primary():
+        return _json(sync.apply(subject_id, edits))
+
+
+@require_http_methods(['GET', 'PATCH'])
+def subject_changes(request, subject_id):
+    """
+    Delta sync of a subject's roster and grades (courses/sync.py). GET returns
+    the enrollments changed after ?cursor= with a cursor for the next sync;
+    PATCH uploads grade edits, each checked against the version it was based on
+    """
+    if request.method == 'PATCH':
+        return _upload_changes(request, subject_id)
+    return _subject_changes(request, subject_id)
@@ -1,17 +1,35 @@
 from django.contrib import admin
-from .models import Course, Subject, Enrollment
+from django.db.models import Q
+from StudentGradeManagementSystem.changelists import DependentRelatedFilter, KeysetPaginationMixin
+from .models import Campus, Course, Subject, Enrollment
+from .search import SUBJECT_FTS_TABLE, filter_enrollments_matching, filter_matching, fts_available
+
+
+class SubjectFilter(DependentRelatedFilter):
+    """Subjects of the course picked in the course filter"""
+    parent_field = 'course'
+
+
+@admin.register(Campus)
+class CampusAdmin(admin.ModelAdmin):
+    """Admin for Campus model"""
+    list_display = ['code', 'name', 'database', 'created_at']
+    search_fields = ['code', 'name']
+    ordering = ['code']
+
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     """Admin for Course/Program model"""
-    list_display = ['code', 'name', 'created_at']
-    list_filter = ['created_at']
+    list_display = ['code', 'name', 'campus', 'created_at']
+    list_filter = ['campus', 'created_at']
+    list_select_related = ['campus']
     search_fields = ['code', 'name', 'description']
     ordering = ['code']
     
     fieldsets = (
         ('Program Information', {
-            'fields': ('code', 'name', 'description'),
+            'fields': ('code', 'name', 'description', 'campus'),
             'description': 'Course represents the degree program (e.g., BSCS, BSIT). Subjects specify year levels.'
         }),
     )
@@ -21,8 +39,14 @@ class CourseAdmin(admin.ModelAdmin):
 class SubjectAdmin(admin.ModelAdmin):
     """Admin for Subject model"""
     list_display = ['code', 'name', 'course', 'semester', 'units', 'instructor']
-    list_filter = ['course', 'semester', 'instructor']
+    # Only the instructors who teach something, read from subject_instructor_order_idx
+    list_filter = ['course', 'semester', ('instructor', admin.RelatedOnlyFieldListFilter)]
+    list_select_related = ['course', 'instructor']
+    # Skip the second, unfiltered COUNT(*) behind "N results (M total)"
+    show_full_result_count = False
+    autocomplete_fields = ['course', 'instructor']
     search_fields = ['code', 'name', 'description', 'course__name']
+    search_help_text = 'Searches code, name and description through the full-text index, and course names'
     ordering = ['course', 'semester', 'code']
     
     fieldsets = (
@@ -34,14 +58,24 @@ class SubjectAdmin(admin.ModelAdmin):
             'description': 'Semester and instructor assignment.'
         }),
     )
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Use the FTS5 index instead of icontains scans across joins"""
+        if not search_term or not fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        # Courses are few, so their names are matched with a plain scan of that table
+        courses = Q(course__in=Course.objects.filter(name__icontains=search_term).values('pk'))
+        return filter_matching(queryset, SUBJECT_FTS_TABLE, search_term, also=courses), False
 
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(KeysetPaginationMixin, admin.ModelAdmin):
     """Admin for Enrollment model"""
     list_display = ['student', 'subject', 'status', 'enrolled_date']
-    list_filter = ['status', 'subject__course', 'enrolled_date']
+    list_filter = ['status', 'subject__course', ('subject', SubjectFilter), 'enrolled_date']
     search_fields = ['student__username', 'student__first_name', 'student__last_name', 'subject__code', 'subject__name']
+    search_help_text = 'Searches student names and subjects through the full-text indexes'
+    autocomplete_fields = ['student', 'subject']
     ordering = ['-enrolled_date']
     
     fieldsets = (
@@ -64,4 +98,14 @@ class EnrollmentAdmin(admin.ModelAdmin):
                 except StudentProfile.DoesNotExist:
                     kwargs["queryset"] = Subject.objects.none()
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
+    
+    def get_queryset(self, request):
+        # Joined for the changelist and for the autocomplete results of GradeAdmin's enrollment field
+        return super().get_queryset(request).select_related('student', 'subject')
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Use the FTS5 indexes instead of icontains scans across joins"""
+        if not search_term or not fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return filter_enrollments_matching(queryset, search_term), False
 
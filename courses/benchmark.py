@@ -0,0 +1,197 @@
+"""
+End-to-end view benchmark
+
+Drives every URL of the accounts, courses, grades and announcements apps
+through the Django test client as each role (GET requests only, so the
+dataset is left unchanged) and records latency percentiles, query counts
+and peak Python memory per view. Results are plain dicts that the
+run_benchmark command writes to JSON so runs can be compared over time.
+"""
+import importlib
+import math
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from StudentGradeManagementSystem.querybudget import QueryRecorder, wrap_connections
+
+URLCONFS = ('accounts.urls', 'courses.urls', 'grades.urls', 'announcements.urls')
+
+# Logging out would end the session; the event stream never finishes
+SKIPPED = {'accounts:logout', 'announcements:announcement_stream'}
+
+QUERY_STRINGS = {
+    'announcements:search_announcements': {'q': 'exam'},
+    'courses:subject_search': {'q': 'lab'},
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+
+def endpoints():
+    """(url name, pattern) for every route in the benchmarked apps"""
+    for module_name in URLCONFS:
+        module = importlib.import_module(module_name)
+        for pattern in module.urlpatterns:
+            name = f"{module.app_name}:{pattern.name}"
+            if name not in SKIPPED:
+                yield name, pattern
+
+
+def benchmark_users(prefix='bench'):
+    """One representative user per role, preferring the seeded dataset"""
+    from accounts.models import User
+    from courses.models import Subject
+
+    users = {}
+    subject = Subject.objects.filter(
+        instructor__username__startswith=f"{prefix}-", enrollments__status='enrolled'
+    ).select_related('instructor').first() or Subject.objects.filter(
+        instructor__isnull=False
+    ).select_related('instructor').first()
+    if subject:
+        users['instructor'] = subject.instructor
+    student = User.objects.filter(
+        role='student', username__startswith=f"{prefix}-", enrollments__status='enrolled'
+    ).first() or User.objects.filter(role='student').first()
+    if student:
+        users['student'] = student
+    admin = User.objects.filter(role='admin', username__startswith=f"{prefix}-").first() \
+        or User.objects.filter(role='admin').first()
+    if admin:
+        users['admin'] = admin
+    return users
+
+
+def url_arguments(users):
+    """Values for the path converters, taken from the instructor's own data"""
+    from announcements.models import Announcement
+    from grades.models import Grade
+
+    instructor = users.get('instructor')
+    if instructor is None:
+        return {}
+    values = {}
+    subject = instructor.subjects_taught.filter(enrollments__status='enrolled').first()
+    if subject:
+        values['subject_id'] = subject.id
+        grade = Grade.objects.filter(enrollment__subject=subject).values_list('id', flat=True).first()
+        if grade:
+            values['grade_id'] = grade
+    announcement = Announcement.objects.filter(created_by=instructor).values_list('id', flat=True).first()
+    if announcement:
+        values['announcement_id'] = announcement
+    return values
+
+
+def _time_request(client, path, data):
+    started = time.perf_counter()
+    # Every alias, so queries routed to replicas and campus shards count too
+    with wrap_connections(QueryRecorder(locate=False)) as recorder:
+        response = client.get(path, data)
+    return (time.perf_counter() - started) * 1000, recorder.count, response.status_code
+
+
+def _peak_memory(client, path, data):
+    tracemalloc.start()
+    try:
+        client.get(path, data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(iterations=20, warmup=2, roles=None, prefix='bench', log=None):
+    """Benchmark every endpoint as every role; returns a JSON-serialisable report"""
+    log = log or (lambda message: None)
+    users = benchmark_users(prefix)
+    arguments = url_arguments(users)
+    results = []
+
+    # Measure the production request path, without debug query logging or the budget middleware
+    with override_settings(DEBUG=False, QUERY_BUDGET_ENABLED=False, ALLOWED_HOSTS=['localhost']):
+        for role, user in users.items():
+            if roles and role not in roles:
+                continue
+            client = Client(SERVER_NAME='localhost')
+            client.force_login(user)
+            for name, pattern in endpoints():
+                params = list(pattern.pattern.converters)
+                if any(param not in arguments for param in params):
+                    log(f"skipping {name}: no data for {', '.join(params)}")
+                    continue
+                path = reverse(name, kwargs={param: arguments[param] for param in params})
+                data = QUERY_STRINGS.get(name, {})
+
+                for _ in range(warmup):
+                    client.get(path, data)
+                timings, queries, statuses = [], [], set()
+                for _ in range(iterations):
+                    elapsed, count, status = _time_request(client, path, data)
+                    timings.append(elapsed)
+                    queries.append(count)
+                    statuses.add(status)
+                timings.sort()
+                result = {
+                    'role': role,
+                    'view': name,
+                    'path': path,
+                    'status': sorted(statuses),
+                    'p50_ms': round(statistics.median(timings), 3),
+                    'p95_ms': round(percentile(timings, 0.95), 3),
+                    'max_ms': round(timings[-1], 3),
+                    'queries': max(queries),
+                    'peak_kb': round(_peak_memory(client, path, data) / 1024, 1),
+                }
+                results.append(result)
+                log(f"{role:<11}{name:<45}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['queries']:>6}{result['peak_kb']:>10.1f}")
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'iterations': iterations,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'dataset': dataset_size(),
+        'results': results,
+    }
+
+
+def dataset_size():
+    from announcements.models import Announcement, InboxEntry
+    from accounts.models import User
+    from grades.models import Grade
+    from .models import Enrollment, Subject
+
+    return {
+        'users': User.objects.count(),
+        'subjects': Subject.objects.count(),
+        'enrollments': Enrollment.objects.count(),
+        'grades': Grade.objects.count(),
+        'announcements': Announcement.objects.count(),
+        'inbox_entries': InboxEntry.objects.count(),
+    }
+
+
+def compare(previous, current):
+    """Rows of (role, view, old p50, new p50, change %) for endpoints present in both reports"""
+    before = {(r['role'], r['view']): r for r in previous['results']}
+    rows = []
+    for result in current['results']:
+        old = before.get((result['role'], result['view']))
+        if old:
+            change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0.0
+            rows.append((result['role'], result['view'], old['p50_ms'], result['p50_ms'], round(change, 1)))
+    return rows
@@ -0,0 +1,421 @@
+"""
+HTTP load generator for a running server
+
+Logs in as seeded students and instructors over real HTTP and replays a
+weighted mix of scenarios (dashboard refreshes, concurrent edit_grade
+POSTs and announcement creation) from many concurrent workers, using
+either threads with blocking sockets or a single asyncio event loop.
+Only the standard library is used, so it runs against `manage.py
+runserver` or any other local WSGI server without external services.
+
+Scenarios are generators that yield Request objects and receive the
+Response, so the same scenario code drives both transports. Results are
+aggregated per step into throughput, a latency histogram and error and
+SQLite lock-timeout rates. Lock timeouts are the 503 responses that
+LockTimeoutMiddleware marks with the X-Database-Locked header.
+"""
+import asyncio
+import http.client
+import random
+import re
+import statistics
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import reverse
+
+from StudentGradeManagementSystem.locks import HEADER as LOCKED_HEADER
+from StudentGradeManagementSystem.routers import use_primary
+
+from .benchmark import percentile
+
+Request = namedtuple('Request', 'step method path data')
+Response = namedtuple('Response', 'status headers body')
+
+# Upper bounds of the latency histogram buckets in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+ANNOUNCEMENT_TITLE = 'Load test announcement'
+DEFAULT_MIX = {'dashboard': 8, 'edit_grade': 3, 'announcement': 1}
+
+_COOKIE = re.compile(r'^\s*([^=;\s]+)=([^;]*)')
+
+
+class Session:
+    """Cookies and CSRF token of one logged-in virtual user"""
+
+    def __init__(self, user):
+        self.user = user
+        self.cookies = {}
+
+    def headers(self, host, body=None):
+        headers = {'Host': host, 'Connection': 'close', 'User-Agent': 'sgms-loadtest'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['Content-Length'] = str(len(body))
+        return headers
+
+    def remember(self, headers):
+        for name, value in headers:
+            if name.lower() == 'set-cookie':
+                match = _COOKIE.match(value)
+                if match:
+                    self.cookies[match.group(1)] = match.group(2)
+
+    def encode(self, request):
+        data = dict(request.data or {})
+        if request.method == 'POST':
+            data.setdefault('csrfmiddlewaretoken', self.cookies.get('csrftoken', ''))
+        return urlencode(data, doseq=True).encode() if request.method == 'POST' else None
+
+
+class Stats:
+    """Thread-safe latency and outcome counters per step"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps = {}
+
+    def record(self, step, milliseconds, outcome, method='GET'):
+        with self._lock:
+            entry = self._steps.setdefault(
+                step, {'method': method, 'timings': [], 'ok': 0, 'error': 0, 'locked': 0, 'timeout': 0}
+            )
+            entry['timings'].append(milliseconds)
+            entry[outcome] += 1
+
+    def summary(self, seconds):
+        """Per step throughput, percentiles, histogram and error rates"""
+        with self._lock:
+            steps = {step: dict(entry, timings=sorted(entry['timings'])) for step, entry in self._steps.items()}
+        report = {}
+        for step, entry in sorted(steps.items()):
+            timings = entry['timings']
+            total = len(timings)
+            histogram = {}
+            for bound in BUCKETS_MS:
+                label = f"<={bound:g}" if bound != float('inf') else '+inf'
+                histogram[label] = sum(1 for t in timings if t <= bound) - sum(histogram.values())
+            report[step] = {
+                'method': entry['method'],
+                'requests': total,
+                'per_second': round(total / seconds, 2) if seconds else 0.0,
+                'p50_ms': round(statistics.median(timings), 2),
+                'p95_ms': round(percentile(timings, 0.95), 2),
+                'p99_ms': round(percentile(timings, 0.99), 2),
+                'max_ms': round(timings[-1], 2),
+                'error_rate': round((entry['error'] + entry['locked'] + entry['timeout']) / total, 4),
+                'lock_timeout_rate': round(entry['locked'] / total, 4),
+                'errors': entry['error'],
+                'lock_timeouts': entry['locked'],
+                'client_timeouts': entry['timeout'],
+                'histogram_ms': histogram,
+            }
+        return report
+
+
+def classify(response, expected):
+    """'ok', 'locked' (SQLite busy timeout, answered with 503 and X-Database-Locked) or 'error'"""
+    if response.status in expected:
+        return 'ok'
+    if response.status == 503 and any(name.lower() == LOCKED_HEADER.lower() for name, _ in response.headers):
+        return 'locked'
+    return 'error'
+
+
+# Scenarios: generators yielding Requests and receiving Responses.
+# Each yields (request, expected statuses) pairs.
+
+def login(session, password):
+    path = reverse('accounts:login')
+    response = yield Request('login page', 'GET', path, None), {200}
+    response = yield Request('login', 'POST', path, {
+        'username': session.user['username'], 'password': password,
+    }), {302}
+    return response.status == 302
+
+
+def dashboard(session):
+    name = 'accounts:instructor_dashboard' if session.user['role'] == 'instructor' else 'accounts:student_dashboard'
+    path = reverse(name)
+    yield Request(f"dashboard ({session.user['role']})", 'GET', path, None), {200}
+
+
+def edit_grade(session, rng):
+    grade_id = rng.choice(session.user['grades'])
+    path = reverse('grades:edit_grade', args=[grade_id])
+    yield Request('edit_grade form', 'GET', path, None), {200}
+    yield Request('edit_grade POST', 'POST', path, {
+        'prelim_grade': rng.randint(60, 100),
+        'midterm_grade': rng.randint(60, 100),
+        'final_grade': rng.randint(60, 100),
+        'remarks': '',
+    }), {302}
+
+
+def create_announcement(session, rng):
+    path = reverse('announcements:create_announcement')
+    yield Request('announcement form', 'GET', path, None), {200}
+    yield Request('announcement POST', 'POST', path, {
+        'title': f"{ANNOUNCEMENT_TITLE} {rng.randint(1, 10 ** 6)}",
+        'content': 'Generated by the HTTP load test.',
+        'announcement_type': 'course',
+        'subjects': [rng.choice(session.user['subjects'])],
+        'is_active': 'on',
+    }), {302}
+
+
+SCENARIOS = {
+    'dashboard': (('student', 'instructor'), lambda session, rng: dashboard(session)),
+    'edit_grade': (('instructor',), edit_grade),
+    'announcement': (('instructor',), create_announcement),
+}
+
+
+def parse_mix(text):
+    """'dashboard=8,edit_grade=3' -> {'dashboard': 8, 'edit_grade': 3}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = int(weight or 1)
+    if not any(mix.values()):
+        raise ValueError('The scenario mix needs at least one positive weight')
+    return mix
+
+
+class _Worker:
+    """One virtual client: logs in once per role, then loops over weighted scenarios"""
+
+    def __init__(self, number, base_url, users, password, mix, stats, timeout):
+        self.rng = random.Random(number)
+        self.host = urlsplit(base_url).netloc
+        self.users = users
+        self.password = password
+        self.mix = mix
+        self.stats = stats
+        self.deadline = None
+        self.timeout = timeout
+        self.sessions = {}
+
+    def sessions_needed(self):
+        roles = {role for name, weight in self.mix.items() if weight for role in SCENARIOS[name][0]}
+        return [Session(self.rng.choice(self.users[role])) for role in sorted(roles) if self.users.get(role)]
+
+    def pick(self):
+        """
+        A (session, scenario) pair, or None once no scenario has a logged-in role.
+        Scenarios whose roles failed to log in are dropped and the rest keep their relative weights.
+        """
+        names = [name for name, weight in self.mix.items() if weight and set(SCENARIOS[name][0]) & self.sessions.keys()]
+        if not names:
+            return None
+        name = self.rng.choices(names, weights=[self.mix[n] for n in names])[0]
+        candidates = [s for s in self.sessions.values() if s.user['role'] in SCENARIOS[name][0]]
+        session = self.rng.choice(candidates)
+        return session, SCENARIOS[name][1](session, self.rng)
+
+    def _record(self, request, started, response, expected):
+        elapsed = (time.perf_counter() - started) * 1000
+        outcome = 'timeout' if response is None else classify(response, expected)
+        self.stats.record(request.step, elapsed, outcome, request.method)
+        return outcome
+
+    # Threaded transport
+
+    def _send(self, session, request):
+        body = session.encode(request)
+        connection = http.client.HTTPConnection(self.host, timeout=self.timeout)
+        try:
+            connection.request(request.method, request.path, body=body, headers=session.headers(self.host, body))
+            reply = connection.getresponse()
+            response = Response(reply.status, reply.getheaders(), reply.read())
+        except (OSError, http.client.HTTPException):
+            return None
+        finally:
+            connection.close()
+        session.remember(response.headers)
+        return response
+
+    def _drive(self, session, scenario):
+        """Run one scenario to completion; False if a step failed"""
+        response = None
+        try:
+            while True:
+                request, expected = scenario.send(response)
+                started = time.perf_counter()
+                response = self._send(session, request)
+                if self._record(request, started, response, expected) != 'ok':
+                    scenario.close()
+                    return False
+        except StopIteration as finished:
+            return finished.value is not False
+
+    def login_threaded(self):
+        for session in self.sessions_needed():
+            if self._drive(session, login(session, self.password)):
+                self.sessions[session.user['role']] = session
+
+    def run_threaded(self):
+        while time.monotonic() < self.deadline:
+            picked = self.pick()
+            if picked is None:
+                return
+            self._drive(*picked)
+
+    # asyncio transport
+
+    async def _send_async(self, session, request):
+        body = session.encode(request)
+        host, _, port = self.host.partition(':')
+        lines = [f"{request.method} {request.path} HTTP/1.1"]
+        lines += [f"{name}: {value}" for name, value in session.headers(self.host, body).items()]
+        payload = ('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b'')
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port or 80)), self.timeout)
+            try:
+                writer.write(payload)
+                await writer.drain()
+                # Connection: close lets the body be read to EOF
+                raw = await asyncio.wait_for(reader.read(), self.timeout)
+            finally:
+                writer.close()
+        except (OSError, asyncio.TimeoutError):
+            return None
+        head, _, content = raw.partition(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        headers = [tuple(part.strip() for part in line.split(':', 1)) for line in header_lines if ':' in line]
+        response = Response(int(status_line.split()[1]), headers, content)
+        session.remember(response.headers)
+        return response
+
+    async def _drive_async(self, session, scenario):
+        response = None
+        try:
+            while True:
+                request, expected = scenario.send(response)
+                started = time.perf_counter()
+                response = await self._send_async(session, request)
+                if self._record(request, started, response, expected) != 'ok':
+                    scenario.close()
+                    return False
+        except StopIteration as finished:
+            return finished.value is not False
+
+    async def login_async(self):
+        for session in self.sessions_needed():
+            if await self._drive_async(session, login(session, self.password)):
+                self.sessions[session.user['role']] = session
+
+    async def run_async(self):
+        while time.monotonic() < self.deadline:
+            picked = self.pick()
+            if picked is None:
+                return
+            await self._drive_async(*picked)
+
+
+@use_primary
+def load_users(prefix, limit=200):
+    """Seeded students and instructors with the grade and subject ids their scenarios need"""
+    from accounts.models import User
+    from grades.models import Grade
+    from .models import Subject
+
+    users = {'student': [], 'instructor': []}
+    for username in User.objects.filter(
+        role='student', username__startswith=f"{prefix}-", enrollments__status='enrolled'
+    ).values_list('username', flat=True).distinct()[:limit]:
+        users['student'].append({'username': username, 'role': 'student'})
+
+    instructors = User.objects.filter(role='instructor', username__startswith=f"{prefix}-").order_by('id')[:limit]
+    for instructor in instructors:
+        subjects = list(Subject.objects.filter(instructor=instructor).values_list('id', flat=True))
+        grades = list(Grade.objects.filter(
+            enrollment__subject_id__in=subjects, enrollment__status='enrolled'
+        ).values_list('id', flat=True)[:500])
+        if subjects and grades:
+            users['instructor'].append({
+                'username': instructor.username, 'role': 'instructor', 'subjects': subjects, 'grades': grades,
+            })
+    return users
+
+
+def _in_parallel(workers, phase, mode):
+    """Run `phase` ('login' or 'run') of every worker concurrently"""
+    if mode == 'asyncio':
+        async def main():
+            await asyncio.gather(*(getattr(worker, f"{phase}_async")() for worker in workers))
+        asyncio.run(main())
+    else:
+        threads = [threading.Thread(target=getattr(worker, f"{phase}_threaded"), daemon=True) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def run_load(base_url, users, password, mix=None, concurrency=20, duration=30, mode='threads', timeout=30):
+    """Log every worker in, replay the scenario mix for `duration` seconds and return the report"""
+    mix = mix or DEFAULT_MIX
+    login_stats, stats = Stats(), Stats()
+    workers = [_Worker(n, base_url, users, password, mix, login_stats, timeout) for n in range(concurrency)]
+
+    # Logins hash passwords and would dominate a short run, so they are measured on their own
+    started = time.perf_counter()
+    _in_parallel(workers, 'login', mode)
+    login_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + duration
+    for worker in workers:
+        worker.stats, worker.deadline = stats, deadline
+    _in_parallel(workers, 'run', mode)
+    seconds = time.perf_counter() - started
+
+    steps = stats.summary(seconds)
+    total = sum(step['requests'] for step in steps.values())
+    reads = [step for step in steps.values() if step['method'] == 'GET']
+    writes = [step for step in steps.values() if step['method'] != 'GET']
+    return {
+        'base_url': base_url,
+        'mode': mode,
+        'concurrency': concurrency,
+        'duration_seconds': round(seconds, 2),
+        'mix': mix,
+        'requests': total,
+        'per_second': round(total / seconds, 2) if seconds else 0.0,
+        'logged_in': sum(len(worker.sessions) for worker in workers),
+        'login': login_stats.summary(login_seconds),
+        'reads': _totals(reads, seconds),
+        'writes': _totals(writes, seconds),
+        'steps': steps,
+    }
+
+
+def _totals(steps, seconds):
+    requests = sum(step['requests'] for step in steps)
+    failed = sum(step['errors'] + step['lock_timeouts'] + step['client_timeouts'] for step in steps)
+    return {
+        'requests': requests,
+        'per_second': round(requests / seconds, 2) if seconds else 0.0,
+        'error_rate': round(failed / requests, 4) if requests else 0.0,
+        'lock_timeouts': sum(step['lock_timeouts'] for step in steps),
+    }
+
+
+def compare(previous, current):
+    """Rows of (name, old req/s, new req/s, change %, old error rate, new error rate) for reads, writes and shared steps"""
+    rows = []
+    pairs = [('reads', previous.get('reads'), current.get('reads')), ('writes', previous.get('writes'), current.get('writes'))]
+    pairs += [(step, previous['steps'].get(step), stats) for step, stats in current['steps'].items()]
+    for name, old, new in pairs:
+        if old and new:
+            change = (new['per_second'] - old['per_second']) / old['per_second'] * 100 if old['per_second'] else 0.0
+            rows.append((name, old['per_second'], new['per_second'], round(change, 1), old['error_rate'], new['error_rate']))
+    return rows
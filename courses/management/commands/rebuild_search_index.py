@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.search import USER_FTS_COLUMNS, USER_FTS_TABLE
+from announcements.search import ANNOUNCEMENT_FTS_COLUMNS, ANNOUNCEMENT_FTS_TABLE
+from courses.search import SUBJECT_FTS_COLUMNS, SUBJECT_FTS_TABLE, fts_available, rebuild_index
+from StudentGradeManagementSystem.sharding import campus_databases
+
+
+class Command(BaseCommand):
+    help = 'Recreate the FTS5 search indexes and their sync triggers on every campus database, then rebuild them'
+
+    def handle(self, *args, **options):
+        for alias in campus_databases():
+            if not fts_available(alias):
+                raise CommandError(f"Full-text indexes are only used with the SQLite backend ({alias})")
+            rebuild_index(SUBJECT_FTS_TABLE, 'courses_subject', SUBJECT_FTS_COLUMNS, using=alias)
+            rebuild_index(ANNOUNCEMENT_FTS_TABLE, 'announcements_announcement', ANNOUNCEMENT_FTS_COLUMNS, using=alias)
+            # Each shard holds copies of its campus's users
+            rebuild_index(USER_FTS_TABLE, 'accounts_user', USER_FTS_COLUMNS, using=alias)
+        self.stdout.write(self.style.SUCCESS('Search indexes rebuilt'))
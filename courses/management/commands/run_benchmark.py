@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.benchmark import compare, run
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every app URL as each role and write p50/p95 latency, query counts and peak memory to JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--role', action='append', choices=['student', 'instructor', 'admin'],
+                            help='Limit to a role (repeatable)')
+        parser.add_argument('--prefix', default='bench', help='Prefix of the seeded dataset to pick users from')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', help='Earlier JSON report to compare p50 latencies against')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        self.stdout.write(f"{'role':<11}{'view':<45}{'p50 ms':>9}{'p95 ms':>9}{'sql':>6}{'peak kb':>10}")
+        report = run(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            roles=options['role'],
+            prefix=options['prefix'],
+            log=self.stdout.write,
+        )
+        if not report['results']:
+            raise CommandError('Nothing was benchmarked; seed data first with manage.py seed_benchmark')
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(report['results'])} results to {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+            self.stdout.write(f"\n{'role':<11}{'view':<45}{'before':>9}{'after':>9}{'change':>9}")
+            for role, view, before, after, change in compare(previous, report):
+                self.stdout.write(f"{role:<11}{view:<45}{before:>9.2f}{after:>9.2f}{change:>8.1f}%")
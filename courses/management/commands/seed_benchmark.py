@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.seeding import DEFAULT_PASSWORD, flush, seed
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic dataset (courses, subjects, enrollments, grades, announcements) with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--subjects', type=int, default=50)
+        parser.add_argument('--announcements', type=int, default=500)
+        parser.add_argument('--courses', type=int, default=4)
+        parser.add_argument('--instructors', type=int, help='Defaults to one per five subjects')
+        parser.add_argument('--enrollments-per-student', type=int, default=6)
+        parser.add_argument('--prefix', default='bench', help='Username and code prefix of the generated rows')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help='Password of every generated user')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--flush', action='store_true', help='Delete a previous dataset with the same prefix first')
+
+    def handle(self, *args, **options):
+        if min(options['students'], options['subjects'], options['courses']) < 1:
+            raise CommandError('--students, --subjects and --courses must be at least 1')
+        if options['flush']:
+            flush(options['prefix'])
+            self.stdout.write(f"Removed the previous '{options['prefix']}' dataset")
+
+        started = time.perf_counter()
+        counts = seed(
+            students=options['students'],
+            subjects=options['subjects'],
+            announcements=options['announcements'],
+            courses=options['courses'],
+            instructors=options['instructors'],
+            enrollments_per_student=options['enrollments_per_student'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+            password=options['password'],
+            log=self.stdout.write,
+        )
+        summary = ', '.join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {time.perf_counter() - started:.1f}s"))
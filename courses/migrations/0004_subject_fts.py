@@ -0,0 +1,34 @@
+from django.db import migrations
+
+TABLE = 'courses_subject_fts'
+CONTENT_TABLE = 'courses_subject'
+COLUMNS = ('code', 'name', 'description')
+
+
+def create_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends use the icontains fallback in courses.search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from courses.search import fts_schema_sql
+    for statement in fts_schema_sql(TABLE, CONTENT_TABLE, COLUMNS):
+        schema_editor.execute(statement)
+    schema_editor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from courses.search import fts_drop_sql
+    for statement in fts_drop_sql(TABLE):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_alter_subject_options_remove_subject_year_level'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_subject_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', 'status', '-enrolled_date'], name='enrollment_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['subject', 'status', '-enrolled_date'], name='enrollment_subject_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', '-enrolled_date'], name='enrollment_student_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(fields=['instructor', 'course', 'semester', 'code'], name='subject_instructor_order_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='e.g., MAIN, NORTH', max_length=20, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('database', models.CharField(blank=True, default='', help_text="Database alias of this campus's shard", max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Campus',
+                'verbose_name_plural': 'Campuses',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='campus',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='courses', to='courses.campus'),
+        ),
+    ]
@@ -1,7 +1,39 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator, MaxValueValidator
 from accounts.models import User
 
+class Campus(models.Model):
+    """
+    A campus whose programs, subjects, enrollments, grades and announcements
+    never mix with other campuses'. Its data lives in the database alias
+    `database` (one of settings.CAMPUS_DATABASES), or in 'default' when blank.
+    """
+    code = models.CharField(max_length=20, unique=True, help_text="e.g., MAIN, NORTH")
+    name = models.CharField(max_length=200)
+    database = models.CharField(max_length=50, blank=True, default='', help_text="Database alias of this campus's shard")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['code']
+        verbose_name = 'Campus'
+        verbose_name_plural = 'Campuses'
+    
+    def __str__(self):
+        return f"{self.code} - {self.name}"
+    
+    def clean(self):
+        from django.conf import settings
+        from django.core.exceptions import ValidationError
+        
+        if self.database and self.database not in getattr(settings, 'CAMPUS_DATABASES', ()):
+            raise ValidationError({'database': f"'{self.database}' is not one of settings.CAMPUS_DATABASES."})
+    
+    @property
+    def shard(self):
+        return self.database or 'default'
+
+
 class Course(models.Model):
     """
     Represents a degree program (e.g., BS Computer Science, BS Information Technology)
@@ -11,6 +43,7 @@ class Course(models.Model):
     code = models.CharField(max_length=20, unique=True, help_text="e.g., BSCS, BSIT")
     name = models.CharField(max_length=200, help_text="e.g., BS Computer Science")
     description = models.TextField(blank=True, null=True)
+    campus = models.ForeignKey(Campus, on_delete=models.PROTECT, null=True, blank=True, related_name='courses')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -68,6 +101,10 @@ class Subject(models.Model):
         ordering = ['course', 'semester', 'code']
         verbose_name = 'Subject'
         verbose_name_plural = 'Subjects'
+        indexes = [
+            # Finds an instructor's subjects without a scan; the pages then sort that handful by course code
+            models.Index(fields=['instructor', 'course', 'semester', 'code'], name='subject_instructor_order_idx'),
+        ]
     
     def __str__(self):
         return f"{self.code} - {self.name}"
@@ -93,13 +130,74 @@ class Enrollment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='enrolled')
     enrolled_date = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Sequence number of the last change to this row or its grade (courses/sync.py)
+    change_seq = models.BigIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['-enrolled_date']
         verbose_name = 'Enrollment'
         verbose_name_plural = 'Enrollments'
         unique_together = ['student', 'subject']
+        indexes = [
+            models.Index(fields=['student', 'status', '-enrolled_date'], name='enrollment_student_status_idx'),
+            models.Index(fields=['subject', 'status', '-enrolled_date'], name='enrollment_subject_status_idx'),
+            models.Index(fields=['student', '-enrolled_date'], name='enrollment_student_date_idx'),
+            # A subject's changes since a sync cursor are one range scan
+            models.Index(fields=['subject', 'change_seq', 'id'], name='enrollment_subject_change_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        """Stamp a new change sequence number and record an outbox event in the same transaction as the write"""
+        from outbox.events import enrollment_event, record
+        from .sync import allocate, with_change_seq
+        
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        kwargs['update_fields'] = with_change_seq(kwargs.get('update_fields'))
+        with transaction.atomic(using=using, savepoint=False):
+            self.change_seq = allocate(using)
+            super().save(*args, **kwargs)
+            record([enrollment_event(self)], using)
     
     def __str__(self):
         return f"{self.student.username} enrolled in {self.subject.code}"
 
+
+class EnrollmentTombstone(models.Model):
+    """
+    A deleted enrollment, so delta syncs can tell clients to drop the row.
+    subject_id is a plain column: the subject may be deleted along with it.
+    """
+    subject_id = models.IntegerField()
+    enrollment_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject_id', 'change_seq'], name='tombstone_subject_change_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Enrollment {self.enrollment_id} deleted"
+
+
+class ChangeSequence(models.Model):
+    """The counter behind change_seq, one row per database"""
+    name = models.CharField(max_length=30, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+def with_enrollment_counts(subjects):
+    """
+    Annotate subjects with enrollment_count using a correlated subquery,
+    instead of one COUNT per subject in the template and without the
+    GROUP BY sort an aggregate join would need
+    """
+    counts = Enrollment.objects.filter(subject=models.OuterRef('pk')).order_by().values('subject').annotate(
+        total=models.Count('id')
+    ).values('total')
+    return subjects.annotate(enrollment_count=Coalesce(models.Subquery(counts), 0))
+
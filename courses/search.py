@@ -0,0 +1,163 @@
+"""
+Full-text search backed by SQLite FTS5
+
+The *_fts virtual tables are external-content indexes kept in sync by
+triggers created in the migrations, so searches are ranked index lookups
+instead of icontains scans. Other database backends fall back to
+icontains filters.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import Subject
+
+SUBJECT_FTS_TABLE = 'courses_subject_fts'
+SUBJECT_FTS_COLUMNS = ('code', 'name', 'description')
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available(using=DEFAULT_DB_ALIAS):
+    """Whether the database `using` (a queryset's .db on the campus shards) has the FTS5 indexes"""
+    return connections[using].vendor == 'sqlite'
+
+
+def fts_schema_sql(table, content_table, columns):
+    """Statements creating an external-content FTS5 index and its sync triggers"""
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            {cols}, content='{content_table}', content_rowid='id', tokenize='porter unicode61'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {content_table} BEGIN
+            INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON {content_table} BEGIN
+            INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF {cols} ON {content_table} BEGIN
+            INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_values});
+        END""",
+    ]
+
+
+def fts_drop_sql(table):
+    """Statements dropping an index created by fts_schema_sql() and its triggers"""
+    return [
+        *(f"DROP TRIGGER IF EXISTS {table}_{event}" for event in ('insert', 'delete', 'update')),
+        f"DROP TABLE IF EXISTS {table}",
+    ]
+
+
+def rebuild_index(table, content_table, columns, using=DEFAULT_DB_ALIAS):
+    """(Re)create an FTS5 index and its triggers, then rebuild it from the content table"""
+    with connections[using].cursor() as cursor:
+        for statement in fts_schema_sql(table, content_table, columns):
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def fts_query(text):
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word must match,
+    and the last word also matches as a prefix so partial input still finds results
+    """
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return ''
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def ranked_ids(table, query, weights, limit=None, within=None, using=None):
+    """
+    Row ids matching an FTS5 query, best match first.
+    within optionally restricts matches to the ids of a queryset, in the same statement.
+    The index is read on `using`, by default within's database.
+    """
+    if using is None:
+        using = within.db if within is not None else DEFAULT_DB_ALIAS
+    match = fts_query(query)
+    if not match:
+        return []
+    # Materialize the matches first; a rowid IN (...) constraint inside the
+    # MATCH query would make FTS5 re-run the match once per candidate row
+    sql = (
+        f'WITH hits AS MATERIALIZED ('
+        f'SELECT rowid AS id, bm25({table}, {weights}) AS score FROM {table} WHERE {table} MATCH %s'
+        f') SELECT id FROM hits'
+    )
+    params = [match]
+    if within is not None:
+        subquery, subquery_params = within.values('pk').query.sql_with_params()
+        sql += f' WHERE id IN ({subquery})'
+        params.extend(subquery_params)
+    sql += ' ORDER BY score'
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def fts_rowids(table, query):
+    """Subquery of the rowids in an FTS5 index matching a query, or None if the query has no words"""
+    from django.db.models.expressions import RawSQL
+    match = fts_query(query)
+    if not match:
+        return None
+    return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+
+
+def filter_matching(queryset, table, query, also=None):
+    """
+    Restrict a queryset to rows matching an FTS5 query, or the Q object also
+    (unranked, for admin changelists)
+    """
+    from django.db.models import Q
+    rowids = fts_rowids(table, query)
+    if rowids is None:
+        return queryset
+    condition = Q(pk__in=rowids)
+    if also is not None:
+        condition |= also
+    return queryset.filter(condition)
+
+
+def filter_enrollments_matching(queryset, query, prefix=''):
+    """
+    Restrict rows tied to an enrollment (prefix names the path to it) to those
+    whose student or subject matches an FTS5 query, for admin changelists
+    """
+    from django.db.models import Q
+    from accounts.search import USER_FTS_TABLE
+    students = fts_rowids(USER_FTS_TABLE, query)
+    if students is None:
+        return queryset
+    subjects = fts_rowids(SUBJECT_FTS_TABLE, query)
+    return queryset.filter(Q(**{f'{prefix}student__in': students}) | Q(**{f'{prefix}subject__in': subjects}))
+
+
+def in_rank_order(queryset, ids):
+    """Fetch the rows for ids from queryset, keeping the ranking order"""
+    objects = queryset.in_bulk(ids)
+    return [objects[i] for i in ids if i in objects]
+
+
+def search_subjects(query, queryset=None, limit=50):
+    """Subjects matching query, ranked with code matches weighted highest"""
+    within = queryset
+    queryset = Subject.objects.all() if queryset is None else queryset
+    if not fts_available(queryset.db):
+        from django.db.models import Q
+        return list(queryset.filter(
+            Q(code__icontains=query) | Q(name__icontains=query) | Q(description__icontains=query)
+        )[:limit])
+    ids = ranked_ids(SUBJECT_FTS_TABLE, query, '10.0, 5.0, 1.0', limit, within=within, using=queryset.db)
+    return in_rank_order(queryset, ids)
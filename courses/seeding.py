@@ -0,0 +1,241 @@
+"""
+Synthetic dataset for benchmarks and load tests
+
+Everything is inserted with bulk_create, in one transaction on the campus
+database and one on 'default' for the users. Because bulk_create skips
+save() and post_save, the derived data that the signals, Enrollment.save()
+and Grade.save() normally maintain is written here as well: grade averages,
+change sequence numbers, outbox events, API version stamps, announcement
+audiences and inbox rows. courses.sync.apply() does the same.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from accounts.models import InstructorProfile, StudentProfile, User
+from grades.models import Grade
+from outbox.events import enrollment_event, grade_event, record
+from StudentGradeManagementSystem import sharding
+from .models import Course, Enrollment, Subject
+
+DEFAULT_PASSWORD = 'benchpass123'
+BATCH_SIZE = 1000
+
+_WORDS = (
+    'exam quiz lab project deadline schedule room change lecture review midterm final '
+    'assignment module reading group online campus library seminar holiday reminder '
+    'submission portal grades consultation makeup requirement syllabus update'
+).split()
+
+
+def username(prefix, role, index):
+    return f"{prefix}-{role}-{index:06d}"
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(_WORDS) for _ in range(words)).capitalize()
+
+
+def flush(prefix):
+    """Delete a previously seeded dataset (users cascade to enrollments, grades and announcements)"""
+    with transaction.atomic():
+        User.objects.filter(username__startswith=f"{prefix}-").delete()
+    with transaction.atomic(using=sharding.current_database()):
+        Course.objects.filter(code__startswith=f"{prefix.upper()}-").delete()
+
+
+def _graded(rng, enrollment, completed):
+    """A Grade with the fields Grade.save() would have derived"""
+    grade = Grade(
+        enrollment=enrollment, change_seq=enrollment.change_seq,
+        prelim_weight=Decimal('30.00'), midterm_weight=Decimal('30.00'), final_weight=Decimal('40.00'),
+    )
+    if completed or rng.random() < 0.5:
+        grade.prelim_grade = Decimal(rng.randint(65, 100))
+        grade.midterm_grade = Decimal(rng.randint(65, 100))
+        grade.final_grade = Decimal(rng.randint(60, 100))
+        grade.weighted_average = grade.calculate_weighted_average()
+        grade.letter_grade = grade.get_letter_grade(grade.weighted_average)
+        grade.grade_point = grade.get_grade_point(grade.letter_grade)
+    return grade
+
+
+def seed(students=1000, subjects=50, announcements=500, courses=4, instructors=None,
+         enrollments_per_student=6, prefix='bench', seed=1, password=DEFAULT_PASSWORD, log=None, campus=None):
+    """
+    Create a consistent dataset and return the number of rows inserted per
+    model. With a `campus`, its courses and users belong to it and the rows
+    go to the campus database selected with sharding.using_campus().
+    """
+    from announcements.models import PUBLISH_SEQUENCE, Announcement, AnnouncementAudience, InboxEntry
+    from api.versions import bump, student_key, subject_key
+    from .sync import allocate
+
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    instructors = instructors or max(1, subjects // 5)
+    enrollments_per_student = min(enrollments_per_student, subjects)
+    now = timezone.now()
+    hashed = make_password(password)
+    counts = {}
+
+    # Users go to 'default' in a short transaction of their own, so shards seeded in parallel
+    # do not queue behind one another, and are copied to the campus database in the next one
+    database = sharding.current_database()
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        teacher_rows = User.objects.bulk_create([
+            User(username=username(prefix, 'instructor', i), password=hashed, role='instructor', campus=campus,
+                 first_name='Instructor', last_name=str(i), email=f"{username(prefix, 'instructor', i)}@example.com")
+            for i in range(instructors)
+        ], batch_size=BATCH_SIZE)
+        instructor_profiles = InstructorProfile.objects.bulk_create([
+            InstructorProfile(user=teacher, employee_id=f"{prefix.upper()}-E{i:06d}")
+            for i, teacher in enumerate(teacher_rows)
+        ], batch_size=BATCH_SIZE)
+        admin = User.objects.create(username=username(prefix, 'admin', 0), password=hashed, role='admin', campus=campus,
+                                    first_name='Admin', last_name=prefix, email=f"{username(prefix, 'admin', 0)}@example.com")
+        student_rows = User.objects.bulk_create([
+            User(username=username(prefix, 'student', i), password=hashed, role='student', campus=campus,
+                 first_name='Student', last_name=str(i), email=f"{username(prefix, 'student', i)}@example.com")
+            for i in range(students)
+        ], batch_size=BATCH_SIZE)
+        student_profiles = StudentProfile.objects.bulk_create([
+            StudentProfile(user=student, student_id=f"{prefix.upper()}{i:09d}") for i, student in enumerate(student_rows)
+        ], batch_size=BATCH_SIZE)
+        bump('directory')
+    counts['instructors'] = len(teacher_rows)
+    counts['students'] = len(student_rows)
+
+    try:
+        with transaction.atomic(using=database):
+            course_rows = Course.objects.bulk_create([
+                Course(code=f"{prefix.upper()}-C{i:02d}", name=f"Benchmark Program {i}", campus=campus) for i in range(courses)
+            ])
+            counts['courses'] = len(course_rows)
+
+            sharding.replicate([*teacher_rows, admin, *student_rows], database)
+            sharding.replicate(instructor_profiles, database)
+            sharding.replicate(student_profiles, database)
+
+            subject_rows = Subject.objects.bulk_create([
+                Subject(code=f"{prefix.upper()}-S{i:04d}", name=_sentence(rng, 3), description=_sentence(rng, 12),
+                        course=course_rows[i % courses], instructor=teacher_rows[i % instructors],
+                        semester=rng.choice(['1', '2']), units=rng.choice([2, 3, 3, 4]))
+                for i in range(subjects)
+            ], batch_size=BATCH_SIZE)
+            counts['subjects'] = len(subject_rows)
+            log(f"Created {courses} courses, {instructors} instructors and {subjects} subjects")
+
+            # Students are spread over the courses and mostly take subjects from their own course
+            by_course = {}
+            for subject in subject_rows:
+                by_course.setdefault(subject.course_id, []).append(subject)
+
+            enrollments = []
+            for student in student_rows:
+                home = by_course[course_rows[student.id % courses].id]
+                picks = rng.sample(home, min(len(home), enrollments_per_student))
+                if len(picks) < enrollments_per_student:
+                    others = [s for s in subject_rows if s not in picks]
+                    picks += rng.sample(others, enrollments_per_student - len(picks))
+                for subject in picks:
+                    roll = rng.random()
+                    status = 'completed' if roll < 0.3 else 'dropped' if roll < 0.35 else 'enrolled'
+                    enrollments.append(Enrollment(student=student, subject=subject, status=status))
+            # One number per enrollment, which its grade shares as Grade.save() would have copied it
+            last = allocate(database, len(enrollments))
+            for seq, enrollment in enumerate(enrollments, start=last - len(enrollments) + 1):
+                enrollment.change_seq = seq
+            enrollment_rows = Enrollment.objects.bulk_create(enrollments, batch_size=BATCH_SIZE)
+            counts['enrollments'] = len(enrollment_rows)
+            log(f"Created {counts['students']} students and {counts['enrollments']} enrollments")
+
+            grade_rows = Grade.objects.bulk_create([
+                _graded(rng, enrollment, enrollment.status == 'completed')
+                for enrollment in enrollment_rows if enrollment.status != 'dropped'
+            ], batch_size=BATCH_SIZE)
+            counts['grades'] = len(grade_rows)
+            counts['outbox_events'] = len(record(
+                [enrollment_event(enrollment) for enrollment in enrollment_rows] + [grade_event(grade) for grade in grade_rows],
+                database,
+            ))
+            bump(
+                'catalog', 'announcements',
+                *{subject_key(enrollment.subject_id) for enrollment in enrollment_rows},
+                *{student_key(enrollment.student_id) for enrollment in enrollment_rows},
+                using=database,
+            )
+
+            # Announcements spread over the last 90 days; a fifth are system-wide
+            subjects_by_teacher = {}
+            for subject in subject_rows:
+                subjects_by_teacher.setdefault(subject.instructor_id, []).append(subject)
+            announcement_rows = [
+                Announcement(
+                    title=_sentence(rng, 5), content=_sentence(rng, 40),
+                    announcement_type='system' if rng.random() < 0.2 else 'course',
+                    created_by=teacher_rows[i % instructors], is_active=rng.random() < 0.95,
+                )
+                for i in range(announcements)
+            ]
+            posted = [now - timedelta(seconds=rng.randint(0, 90 * 24 * 3600)) for _ in announcement_rows]
+            announcement_rows = Announcement.objects.bulk_create(announcement_rows, batch_size=BATCH_SIZE)
+            # auto_now_add overwrites created_at on insert, so backdate the rows afterwards
+            for announcement, created_at in zip(announcement_rows, posted):
+                announcement.created_at = announcement.updated_at = created_at
+            # Visible ones were published when posted, numbered in that order as Announcement.save() would
+            published = sorted((a for a in announcement_rows if a.is_active), key=lambda a: a.created_at)
+            last = allocate(database, len(published), name=PUBLISH_SEQUENCE)
+            for sequence, announcement in enumerate(published, start=last - len(published) + 1):
+                announcement.published_at, announcement.sequence = announcement.created_at, sequence
+            Announcement.objects.bulk_update(
+                announcement_rows, ['created_at', 'updated_at', 'published_at', 'sequence'], batch_size=BATCH_SIZE
+            )
+            counts['announcements'] = len(announcement_rows)
+
+            audience = []
+            targets = {}
+            for announcement in announcement_rows:
+                if announcement.announcement_type != 'course':
+                    continue
+                own = subjects_by_teacher.get(announcement.created_by_id) or subject_rows
+                chosen = rng.sample(own, min(len(own), rng.choice([1, 1, 1, 2, 3])))
+                targets[announcement.id] = {subject.id for subject in chosen}
+                audience.extend(AnnouncementAudience(announcement=announcement, subject=subject) for subject in chosen)
+            AnnouncementAudience.objects.bulk_create(audience, batch_size=BATCH_SIZE)
+            counts['audience'] = len(audience)
+
+            # Fan out exactly as announcements.inbox.sync_announcement would
+            enrolled = {}
+            for enrollment in enrollment_rows:
+                if enrollment.status == 'enrolled':
+                    enrolled.setdefault(enrollment.subject_id, []).append(enrollment.student_id)
+            inbox = []
+            for announcement in announcement_rows:
+                if not announcement.is_active:
+                    continue
+                if announcement.announcement_type == 'system':
+                    recipients = [None]
+                else:
+                    recipients = {s for subject_id in targets[announcement.id] for s in enrolled.get(subject_id, ())}
+                inbox.extend(
+                    InboxEntry(
+                        announcement=announcement, student_id=student_id,
+                        created_at=announcement.published_at, sequence=announcement.sequence
+                    )
+                    for student_id in recipients
+                )
+            InboxEntry.objects.bulk_create(inbox, batch_size=BATCH_SIZE)
+            counts['inbox_entries'] = len(inbox)
+            log(f"Created {counts['announcements']} announcements and {counts['inbox_entries']} inbox rows")
+
+    except BaseException:
+        # The campus rows rolled back; take the users with them
+        User.objects.filter(pk__in=[admin.pk, *(user.pk for user in teacher_rows + student_rows)]).delete()
+        raise
+
+    return counts
@@ -0,0 +1,65 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import InstructorProfile, StudentProfile, User
+from StudentGradeManagementSystem import sharding
+from grades.models import Grade
+from .models import Campus, Enrollment, EnrollmentTombstone
+from outbox.events import enrollment_event, grade_event, record
+from .sync import allocate
+
+
+@receiver(post_save, sender=Campus)
+def copy_campus(sender, instance, using, **kwargs):
+    """Every shard holds the campus directory, since courses point at it"""
+    sharding.forget_campus(instance.pk)
+    if using == DEFAULT_DB_ALIAS:
+        for alias in sharding.shards():
+            sharding.replicate([instance], alias)
+
+
+@receiver(post_save, sender=User)
+def copy_user(sender, instance, using, **kwargs):
+    """Keep a copy of the user on its campus database for joins and foreign keys there"""
+    if using == DEFAULT_DB_ALIAS and sharding.shards():
+        sharding.replicate([instance], sharding.campus_database(instance.campus_id))
+
+
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_save, sender=InstructorProfile)
+def copy_profile(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and sharding.shards():
+        campus_id = User.objects.using(DEFAULT_DB_ALIAS).filter(pk=instance.user_id).values_list('campus_id', flat=True).first()
+        sharding.replicate([instance], sharding.campus_database(campus_id))
+
+
+@receiver(pre_delete, sender=Campus)
+def purge_campus(sender, instance, using, **kwargs):
+    # Before the delete, so courses still using the campus on a shard protect it everywhere
+    sharding.forget_campus(instance.pk)
+    if using == DEFAULT_DB_ALIAS:
+        sharding.purge(Campus, instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def purge_user(sender, instance, using, **kwargs):
+    """Deleting a user also deletes its enrollments, grades and announcements on the shards"""
+    if using == DEFAULT_DB_ALIAS:
+        sharding.purge(User, instance.pk)
+
+
+@receiver(post_delete, sender=Enrollment)
+def leave_tombstone(sender, instance, using, **kwargs):
+    """Tell delta syncs and the outbox; post_delete runs inside the deleting transaction"""
+    EnrollmentTombstone.objects.using(using).create(
+        subject_id=instance.subject_id, enrollment_id=instance.pk, change_seq=allocate(using),
+    )
+    record([enrollment_event(instance, 'enrollment.deleted')], using)
+
+
+@receiver(post_delete, sender=Grade)
+def renumber_enrollment(sender, instance, using, **kwargs):
+    """An enrollment that lost its grade has changed for delta syncs and the outbox"""
+    Enrollment.objects.using(using).filter(pk=instance.enrollment_id).update(change_seq=allocate(using))
+    record([grade_event(instance, 'grade.deleted')], using)
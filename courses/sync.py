@@ -0,0 +1,200 @@
+"""
+Delta sync of a subject's roster and grades
+
+Every write to an Enrollment or a Grade takes the next number from a counter
+(ChangeSequence, one per database) inside the writing transaction and stores
+it in change_seq. A grade's number is copied to its enrollment, so a
+subject's changes are one range scan on enrollment_subject_change_idx. Only
+one write transaction runs at a time on SQLite, so the numbers commit in
+order: once the counter reads N, every change up to N is visible. A sync
+cursor is a position in that sequence, not a timestamp. Clock skew between
+app servers cannot open gaps the way `updated_at > last_sync` can.
+
+changes() returns the enrollments of a subject changed after a cursor,
+with their grades and the ids of enrollments deleted meanwhile
+(EnrollmentTombstone). apply() takes a batch of grade edits. Each edit
+names the version (Grade.change_seq, 0 if never saved) it was based on. A
+grade that has changed since is reported as a conflict, with its current
+values, instead of being overwritten. A batch costs a fixed number of
+queries, however many edits it carries, outbox events included.
+"""
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from StudentGradeManagementSystem.pagination import decode_cursor, encode_cursor, keyset_page
+from .models import ChangeSequence, Enrollment, EnrollmentTombstone
+
+SEQUENCE = 'enrollments'
+ORDERING = ['change_seq', 'id']
+
+# Field names in sync payloads
+GRADE_FIELDS = {'prelim': 'prelim_grade', 'midterm': 'midterm_grade', 'final': 'final_grade', 'remarks': 'remarks'}
+
+
+def allocate(using, count=1, name=SEQUENCE):
+    """Reserve `count` numbers of sequence `name` on `using` and return the last; call it inside the writing transaction"""
+    counter = ChangeSequence.objects.using(using).filter(pk=name)
+    if not counter.update(value=F('value') + count):
+        ChangeSequence.objects.using(using).get_or_create(name=name)
+        counter.update(value=F('value') + count)
+    return counter.values_list('value', flat=True).get()
+
+
+def high_water(using):
+    """Last sequence number handed out on `using`; every change up to it has committed"""
+    return ChangeSequence.objects.using(using).filter(pk=SEQUENCE).values_list('value', flat=True).first() or 0
+
+
+def with_change_seq(update_fields):
+    """save()'s update_fields, plus change_seq when only some fields are saved"""
+    if update_fields is None:
+        return None
+    return list({*update_fields, 'change_seq'})
+
+
+def changes(subject_id, cursor=None, limit=50):
+    """
+    One page of a subject's enrollments changed after `cursor`, oldest change
+    first, as {'results', 'deleted', 'cursor', 'more'}. Without a cursor every
+    enrollment is returned. Raises InvalidCursor.
+    """
+    rows = Enrollment.objects.filter(subject_id=subject_id).values(
+        'id', 'student_id', 'status', 'change_seq', 'updated_at',
+        username=F('student__username'), first_name=F('student__first_name'), last_name=F('student__last_name'),
+        student_number=F('student__student_profile__student_id'), version=Coalesce(F('grade__change_seq'), 0),
+        prelim=F('grade__prelim_grade'), midterm=F('grade__midterm_grade'), final=F('grade__final_grade'),
+        average=F('grade__weighted_average'), letter=F('grade__letter_grade'), remarks=F('grade__remarks'),
+    )
+    # Read the counter first: changes numbered after it may still be uncommitted, so the next sync gets them
+    high = high_water(rows.db)
+    page, next_cursor = keyset_page(rows.filter(change_seq__lte=high), ORDERING, cursor, limit)
+    more = next_cursor is not None
+    if more:
+        upto = page[-1]['change_seq']
+    else:
+        # Caught up: the next sync starts after everything numbered so far
+        upto = high
+        last_id = page[-1]['id'] if page and page[-1]['change_seq'] == high else 0
+        next_cursor = encode_cursor([high, last_id])
+
+    deleted = []
+    if cursor:
+        since = decode_cursor(cursor, ORDERING)[0]
+        deleted = list(EnrollmentTombstone.objects.using(rows.db).filter(
+            subject_id=subject_id, change_seq__gt=since, change_seq__lte=upto,
+        ).order_by('change_seq').values_list('enrollment_id', flat=True))
+    return {'results': page, 'deleted': deleted, 'cursor': next_cursor, 'more': more}
+
+
+def _grade_row(grade):
+    """Current values of a grade, as changes() reports them"""
+    if grade is None:
+        return {'version': 0, 'prelim': None, 'midterm': None, 'final': None, 'average': None, 'letter': None, 'remarks': None}
+    return {
+        'version': grade.change_seq, 'prelim': grade.prelim_grade, 'midterm': grade.midterm_grade,
+        'final': grade.final_grade, 'average': grade.weighted_average, 'letter': grade.letter_grade,
+        'remarks': grade.remarks,
+    }
+
+
+def _set_fields(grade, edit):
+    """Copy an edit's fields onto grade, validated like the model fields; raises ValidationError"""
+    for key, name in GRADE_FIELDS.items():
+        if key in edit:
+            value = None if edit[key] == '' else edit[key]
+            setattr(grade, name, grade._meta.get_field(name).clean(value, grade))
+
+
+def apply(subject_id, edits):
+    """
+    Apply grade edits [{'id': enrollment id, 'version': n, 'prelim': ..., ...}]
+    to a subject in one transaction. Returns {'applied', 'conflicts', 'errors'}.
+    """
+    from api.versions import bump, student_key, subject_key
+    from grades.models import Grade
+    from outbox.events import grade_event, record
+
+    using = router.db_for_write(Grade)
+    applied, conflicts, errors = [], [], []
+    with transaction.atomic(using=using):
+        enrollments = Enrollment.objects.using(using).filter(subject_id=subject_id).select_related('grade').select_for_update(
+            of=('self',)
+        ).in_bulk([edit['id'] for edit in edits])
+
+        changed = []
+        for edit in edits:
+            enrollment = enrollments.get(edit['id'])
+            if enrollment is None:
+                errors.append({'id': edit['id'], 'error': 'Not an enrollment in this subject'})
+                continue
+            grade = getattr(enrollment, 'grade', None)
+            if edit['version'] != (grade.change_seq if grade else 0):
+                conflicts.append({'id': enrollment.pk, 'current': _grade_row(grade)})
+                continue
+            grade = grade or Grade(enrollment=enrollment)
+            try:
+                _set_fields(grade, edit)
+            except ValidationError as error:
+                errors.append({'id': enrollment.pk, 'error': ' '.join(error.messages)})
+                continue
+            changed.append(grade)
+
+        if changed:
+            # bulk_create and bulk_update skip save(), so number, compute and stamp here
+            first = allocate(using, len(changed)) - len(changed) + 1
+            now = timezone.now()
+            for seq, grade in enumerate(changed, start=first):
+                grade.compute()
+                grade.change_seq = grade.enrollment.change_seq = seq
+                grade.updated_at = now
+            existing = [grade for grade in changed if grade.pk is not None]
+            Grade.objects.using(using).bulk_create([grade for grade in changed if grade.pk is None])
+            Grade.objects.using(using).bulk_update(
+                existing,
+                [*GRADE_FIELDS.values(), 'weighted_average', 'letter_grade', 'grade_point', 'change_seq', 'updated_at'],
+            )
+            Enrollment.objects.using(using).bulk_update([grade.enrollment for grade in changed], ['change_seq'])
+            record([grade_event(grade) for grade in changed], using)
+            applied = [{'id': grade.enrollment_id, 'version': grade.change_seq} for grade in changed]
+            # No post_save either: stamp the API versions api/signals.py would have
+            bump(subject_key(subject_id), *(student_key(grade.enrollment.student_id) for grade in changed), using=using)
+    return {'applied': applied, 'conflicts': conflicts, 'errors': errors}
+
+
+def create_missing_grades(enrollments):
+    """
+    Give each of `enrollments` (fetched with select_related('grade')) a Grade
+    row if it has none. The new rows are numbered, recorded in the outbox and
+    version-stamped as apply() does, at a fixed number of queries.
+    """
+    from api.versions import bump, student_key, subject_key
+    from grades.models import Grade
+    from outbox.events import grade_event, record
+
+    missing = {enrollment.pk: enrollment for enrollment in enrollments if not hasattr(enrollment, 'grade')}
+    if not missing:
+        return
+    using = router.db_for_write(Grade)
+    with transaction.atomic(using=using):
+        # Another request may have created some of them meanwhile
+        for enrollment_id, grade in Grade.objects.using(using).in_bulk(list(missing), field_name='enrollment_id').items():
+            missing.pop(enrollment_id).grade = grade
+        if not missing:
+            return
+        grades = [Grade(enrollment=enrollment) for enrollment in missing.values()]
+        first = allocate(using, len(grades)) - len(grades) + 1
+        for seq, grade in enumerate(grades, start=first):
+            grade.change_seq = grade.enrollment.change_seq = seq
+        Grade.objects.using(using).bulk_create(grades)
+        Enrollment.objects.using(using).bulk_update([grade.enrollment for grade in grades], ['change_seq'])
+        record([grade_event(grade) for grade in grades], using)
+        bump(
+            *{subject_key(grade.enrollment.subject_id) for grade in grades},
+            *(student_key(grade.enrollment.student_id) for grade in grades),
+            using=using,
+        )
+        for grade in grades:
+            grade.enrollment.grade = grade
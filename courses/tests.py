@@ -1,3 +1,360 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from StudentGradeManagementSystem.querybudget import QueryBudgetTestMixin
+from StudentGradeManagementSystem.queryplans import QueryPlanTestMixin
+from .models import Course, Subject, Enrollment
+from .search import fts_query, search_subjects
+
+
+class SubjectSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='pass12345', role='student')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        cls.databases_subject = Subject.objects.create(
+            code='CS201', name='Database Systems', description='Relational modeling and SQL', course=course
+        )
+        cls.networks_subject = Subject.objects.create(
+            code='CS202', name='Computer Networks', description='Routing, switching and databases in the cloud', course=course
+        )
+
+    def test_query_is_sanitized(self):
+        self.assertEqual(fts_query('data "base" OR'), '"data" "base" "OR"*')
+        self.assertEqual(fts_query('  '), '')
+
+    def test_name_match_ranks_above_description_match(self):
+        self.assertEqual(search_subjects('database'), [self.databases_subject, self.networks_subject])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.networks_subject.name = 'Wireless Networks'
+        self.networks_subject.description = ''
+        self.networks_subject.save()
+        self.assertEqual(search_subjects('wireless'), [self.networks_subject])
+        self.assertEqual(search_subjects('database'), [self.databases_subject])
+
+        self.databases_subject.delete()
+        self.assertEqual(search_subjects('database'), [])
+
+    def test_search_view_and_admin_use_the_index(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('courses:subject_search'), {'q': 'CS20'})
+        self.assertEqual(len(response.context['subjects']), 2)
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:courses_subject_changelist'), {'q': 'relational'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.databases_subject])
+        # course__name from search_fields is still searched next to the index
+        response = self.client.get(reverse('admin:courses_subject_changelist'), {'q': 'Computer Science'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class CourseQueryPlanTests(QueryPlanTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        cls.student = User.objects.create_user('student', password='pass12345', role='student')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        cls.subject = Subject.objects.create(code='CS101', name='Intro', course=course, instructor=cls.instructor)
+        Enrollment.objects.create(student=cls.student, subject=cls.subject)
+
+    def test_instructor_views_are_indexed(self):
+        self.client.force_login(self.instructor)
+        self.assertViewUsesIndexes(reverse('courses:subject_students', args=[self.subject.id]))
+
+    def test_subject_list_only_sorts_the_users_own_subjects(self):
+        # Sorted by course code, a column of the joined course, over one user's subjects
+        for user in (self.instructor, self.student):
+            self.client.force_login(user)
+            self.assertViewUsesIndexes(reverse('courses:subject_list'), allow=['USE TEMP B-TREE FOR ORDER BY'])
+
+    def test_subject_list_is_in_course_code_order(self):
+        early = Course.objects.create(code='ABCOM', name='AB Communication')
+        Subject.objects.create(code='ZZ900', name='Late addition', course=early, instructor=self.instructor)
+
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('courses:subject_list'))
+        self.assertEqual([subject.code for subject in response.context['subjects']], ['ZZ900', 'CS101'])
+
+
+class CourseQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        cls.subjects = [
+            Subject.objects.create(code=f'CS10{i}', name='Intro', course=course, instructor=cls.instructor)
+            for i in range(4)
+        ]
+        for i in range(8):
+            student = User.objects.create_user(f'student{i}', password='pass12345', role='student')
+            for subject in cls.subjects:
+                Enrollment.objects.create(student=student, subject=subject)
+
+    def test_subject_list_stays_within_budget(self):
+        self.client.force_login(self.instructor)
+        self.assertQueryBudget(reverse('courses:subject_list'), 4)
+
+    def test_subject_students_creates_missing_grades_in_bulk(self):
+        from grades.models import Grade
+
+        self.client.force_login(self.instructor)
+        url = reverse('courses:subject_students', args=[self.subjects[0].id])
+        self.assertQueryBudget(url, 13)
+        self.assertEqual(Grade.objects.filter(enrollment__subject=self.subjects[0]).count(), 8)
+        # Once the grades exist the page is a single roster query
+        self.assertQueryBudget(url, 4)
+
+    def test_created_grades_reach_delta_sync_outbox_and_etags(self):
+        from api.versions import subject_key, versions
+        from grades.models import Grade
+        from outbox.models import Event
+        from .sync import changes
+
+        subject = self.subjects[1]
+        before = versions([subject_key(subject.id)])[subject_key(subject.id)]
+        self.client.force_login(self.instructor)
+        self.client.get(reverse('courses:subject_students', args=[subject.id]))
+
+        grades = Grade.objects.filter(enrollment__subject=subject).select_related('enrollment')
+        self.assertEqual(len({grade.change_seq for grade in grades}), 8)
+        self.assertTrue(all(grade.change_seq == grade.enrollment.change_seq > 0 for grade in grades))
+        self.assertEqual(Event.objects.filter(topic='grade.saved').count(), 8)
+        self.assertGreater(versions([subject_key(subject.id)])[subject_key(subject.id)], before)
+        self.assertEqual({row['version'] for row in changes(subject.id)['results']}, {grade.change_seq for grade in grades})
+
+
+class AdminChangelistTests(QueryBudgetTestMixin, TestCase):
+    """Changelists join what they display, so a page costs the same queries however many rows it shows"""
+    changelists = [
+        'admin:grades_grade_changelist', 'admin:courses_enrollment_changelist', 'admin:courses_subject_changelist',
+        'admin:grades_gpa_changelist', 'admin:accounts_studentprofile_changelist',
+        'admin:announcements_announcement_changelist',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        cls.courses = [Course.objects.create(code=code, name=code) for code in ('BSCS', 'BSIT')]
+        cls.subjects = [
+            Subject.objects.create(
+                code=f'{course.code}10{i}', name='Database Systems', course=course,
+                instructor=User.objects.create_user(f'{course.code}-teacher{i}', role='instructor'),
+            )
+            for course in cls.courses for i in range(2)
+        ]
+
+    def add_students(self, count, first_name='Ana'):
+        from accounts.models import StudentProfile
+        from announcements.models import Announcement
+        from grades.models import GPA, Grade
+
+        for subject in self.subjects:
+            for _ in range(count):
+                n = User.objects.count()
+                student = User.objects.create_user(f'student{n}', role='student', first_name=first_name)
+                StudentProfile.objects.create(user=student, student_id=f'2026-{n:05}')
+                Grade.objects.create(enrollment=Enrollment.objects.create(student=student, subject=subject), prelim_grade=80)
+                GPA.objects.create(student=student, semester='1st', academic_year='2026-2027', gpa=2)
+            Announcement.objects.create(
+                title='Lab', content='Body', announcement_type='course', created_by=subject.instructor,
+            ).set_audience([subject.id])
+
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse(url)).status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.client.force_login(self.admin)
+        self.add_students(1)
+        before = {url: self.count_queries(url) for url in self.changelists}
+        self.add_students(4)
+        for url in self.changelists:
+            with self.subTest(url):
+                self.assertEqual(self.count_queries(url), before[url])
+                self.assertQueryBudget(reverse(url), 8)
+
+    def test_subject_filter_waits_for_a_course(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:grades_grade_changelist')
+        subject_filter = lambda response: response.context['cl'].filter_specs[1]
+        self.assertEqual(subject_filter(self.client.get(url)).lookup_choices, [])
+
+        course = self.courses[1]
+        response = self.client.get(url, {'enrollment__subject__course__id__exact': course.id})
+        self.assertEqual(
+            [subject_id for subject_id, _ in subject_filter(response).lookup_choices],
+            [subject.id for subject in self.subjects if subject.course_id == course.id],
+        )
+
+    def test_searches_and_autocompletes_use_the_full_text_indexes(self):
+        self.client.force_login(self.admin)
+        self.add_students(1)
+        self.add_students(1, first_name='Bea')
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'courses', 'model_name': 'enrollment', 'field_name': 'student', 'term': 'bea',
+        })
+        self.assertEqual(len(response.json()['results']), 4)
+
+        response = self.client.get(reverse('admin:courses_enrollment_changelist'), {'q': 'bsit101'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertIn('accounts_user_fts', str(response.context['cl'].queryset.query))
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .seeding import seed
+
+        cls.counts = seed(students=30, subjects=6, announcements=20, courses=2, enrollments_per_student=3, prefix='t')
+
+    def test_seeded_rows_match_what_the_views_would_create(self):
+        from announcements.inbox import sync_announcement
+        from announcements.models import Announcement, InboxEntry
+        from grades.models import Grade
+
+        self.assertEqual(Enrollment.objects.filter(student__username__startswith='t-').count(), 90)
+        grade = Grade.objects.exclude(final_grade=None).first()
+        weighted, letter = grade.weighted_average, grade.letter_grade
+        grade.save()
+        self.assertEqual((grade.weighted_average, grade.letter_grade), (weighted, letter))
+
+        # Re-running the real fan-out must not change the seeded inbox
+        before = set(InboxEntry.objects.values_list('announcement_id', 'student_id'))
+        for announcement in Announcement.objects.all():
+            sync_announcement(announcement)
+        self.assertEqual(set(InboxEntry.objects.values_list('announcement_id', 'student_id')), before)
+
+    def test_seeded_changes_are_numbered_recorded_and_stamped(self):
+        from django.db.models import F
+        from api.versions import subject_key, versions
+        from grades.models import Grade
+        from outbox.models import Event
+        from .sync import high_water
+
+        enrollments = Enrollment.objects.filter(student__username__startswith='t-')
+        seqs = list(enrollments.values_list('change_seq', flat=True))
+        self.assertEqual(len(set(seqs)), 90)
+        self.assertLessEqual(max(seqs), high_water('default'))
+        self.assertFalse(Grade.objects.exclude(change_seq=F('enrollment__change_seq')).exists())
+        self.assertEqual(Event.objects.filter(topic='grade.saved').count(), self.counts['grades'])
+        subject = enrollments.first().subject_id
+        self.assertGreater(versions([subject_key(subject)])[subject_key(subject)], 0)
+
+    # The cleanup delete reaches every shard, so run against 'default' alone even when SGMS_CAMPUS_SHARDS is set
+    @override_settings(CAMPUS_DATABASES=[])
+    def test_failed_seed_leaves_no_users_behind(self):
+        from unittest import mock
+        from .seeding import seed
+
+        with mock.patch.object(Subject.objects, 'bulk_create', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            seed(students=5, subjects=2, announcements=0, courses=1, enrollments_per_student=1, prefix='f')
+        self.assertFalse(User.objects.filter(username__startswith='f-').exists())
+        self.assertFalse(Course.objects.filter(code__startswith='F-').exists())
+
+    def test_benchmark_covers_every_role(self):
+        from .benchmark import run
+
+        report = run(iterations=1, warmup=0, prefix='t')
+        roles = {result['role'] for result in report['results']}
+        self.assertEqual(roles, {'student', 'instructor', 'admin'})
+        dashboard = next(r for r in report['results'] if r['view'] == 'accounts:student_dashboard' and r['role'] == 'student')
+        self.assertEqual(dashboard['status'], [200])
+        self.assertGreater(dashboard['queries'], 0)
+        self.assertEqual(report['dataset']['enrollments'], 90)
+
+
+class LoadTestUnitTests(TestCase):
+    def test_scenarios_without_a_logged_in_role_are_skipped(self):
+        from .loadtest import Session, Stats, _Worker
+
+        worker = _Worker(0, 'http://testserver', {}, 'pass', {'edit_grade': 3, 'dashboard': 1}, Stats(), 1)
+        worker.sessions = {'student': Session({'username': 's', 'role': 'student'})}
+        self.assertEqual({worker.pick()[1].__name__ for _ in range(20)}, {'dashboard'})
+        worker.mix = {'edit_grade': 1}
+        self.assertIsNone(worker.pick())
+
+    def test_lock_timeouts_are_told_apart_by_status_and_header(self):
+        from django.db import OperationalError
+        from django.test import RequestFactory
+        from StudentGradeManagementSystem.locks import LockTimeoutMiddleware
+        from .loadtest import Response, classify
+
+        middleware = LockTimeoutMiddleware(lambda request: None)
+        request = RequestFactory().post('/grades/edit/1/')
+        locked = middleware.process_exception(request, OperationalError('database is locked'))
+        self.assertEqual((locked.status_code, locked['Retry-After']), (503, '1'))
+        self.assertIsNone(middleware.process_exception(request, OperationalError('no such table: x')))
+
+        self.assertEqual(classify(Response(locked.status_code, list(locked.items()), locked.content), {302}), 'locked')
+        self.assertEqual(classify(Response(500, [], b'OperationalError: database is locked'), {302}), 'error')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class HttpLoadTestTests(LiveServerTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The live server hands an in-memory test database to its request threads
+        # as one shared connection, which concurrent requests would interleave
+        # on. The class runs on file copies instead, one connection per thread
+        import sqlite3
+
+        from django.db import connections
+
+        cls.directory = tempfile.mkdtemp()
+        cls.in_memory = {}
+        copies = {}
+        for conn in connections.all():
+            if conn.vendor != 'sqlite' or not conn.is_in_memory_db():
+                continue
+            name = conn.settings_dict['NAME']
+            conn.ensure_connection()
+            if name not in copies:
+                copies[name] = os.path.join(cls.directory, f"{conn.alias}.sqlite3")
+                target = sqlite3.connect(copies[name])
+                conn.connection.backup(target)
+                target.close()
+            cls.in_memory[conn.alias] = (name, conn.connection)
+            conn.connection = None
+            conn.settings_dict['NAME'] = copies[name]
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        from django.db import connections
+
+        super().tearDownClass()
+        for alias, (name, raw) in cls.in_memory.items():
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = name
+            connections[alias].connection = raw
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        from .seeding import seed
+
+        seed(students=10, subjects=4, announcements=5, courses=1, enrollments_per_student=2, prefix='t')
+
+    def test_both_transports_replay_every_scenario(self):
+        from .loadtest import load_users, run_load
+        from .seeding import DEFAULT_PASSWORD
+
+        users = load_users('t')
+        for mode in ('threads', 'asyncio'):
+            report = run_load(self.live_server_url, users, DEFAULT_PASSWORD, concurrency=2, duration=1, mode=mode)
+            self.assertEqual(report['logged_in'], 4)
+            self.assertEqual(report['login']['login']['error_rate'], 0)
+            self.assertTrue({'dashboard (student)', 'edit_grade POST'} <= set(report['steps']))
+            for step, stats in report['steps'].items():
+                self.assertEqual(stats['errors'] + stats['client_timeouts'], 0, step)
+                self.assertEqual(sum(stats['histogram_ms'].values()), stats['requests'])
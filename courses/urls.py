@@ -6,4 +6,5 @@ app_name = 'courses'
 urlpatterns = [
     path('subject/<int:subject_id>/students/', views.subject_students, name='subject_students'),
     path('subjects/', views.subject_list, name='subject_list'),
+    path('subjects/search/', views.subject_search, name='subject_search'),
 ]
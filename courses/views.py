@@ -1,30 +1,35 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Subject, Enrollment
-from grades.models import Grade
+from .models import Subject, Enrollment, with_enrollment_counts
+from .sync import create_missing_grades
+from StudentGradeManagementSystem.pagination import paginate
 
 @login_required
 def subject_students(request, subject_id):
     """View students enrolled in a subject (for instructors)"""
-    subject = get_object_or_404(Subject, id=subject_id)
+    subject = get_object_or_404(Subject.objects.select_related('course'), id=subject_id)
     
     # Ensure only the assigned instructor can view
-    if not request.user.is_instructor or subject.instructor != request.user:
+    if not request.user.is_instructor or subject.instructor_id != request.user.id:
         messages.error(request, 'You do not have permission to view this subject.')
         return redirect('accounts:dashboard')
     
-    # Get all enrollments for this subject
-    enrollments = Enrollment.objects.filter(
+    # One page of the subject's enrollments; id breaks ties in the order of enrollment_subject_status_idx
+    roster = Enrollment.objects.filter(
         subject=subject,
         status='enrolled'
-    ).select_related('student', 'student__student_profile').prefetch_related('grade')
+    )
+    page = paginate(request, roster.select_related('student', 'student__student_profile', 'grade'), ['-enrolled_date', 'id'])
+    enrollments = page.object_list
+    
+    # Create the page's missing grade records together instead of one get_or_create per row
+    create_missing_grades(enrollments)
     
     # Prepare student data with grades
     students_data = []
     for enrollment in enrollments:
-        # Get or create grade record
-        grade, created = Grade.objects.get_or_create(enrollment=enrollment)
+        grade = enrollment.grade
         
         students_data.append({
             'enrollment': enrollment,
@@ -36,7 +41,8 @@ def subject_students(request, subject_id):
     context = {
         'subject': subject,
         'students_data': students_data,
-        'total_students': len(students_data),
+        'page': page,
+        'total_students': roster.count() if page.has_other_pages else len(enrollments),
     }
     
     return render(request, 'courses/subject_students.html', context)
@@ -47,12 +53,34 @@ def subject_list(request):
     if request.user.is_instructor:
         subjects = Subject.objects.filter(instructor=request.user)
     elif request.user.is_student:
-        subjects = Subject.objects.filter(enrollments__student=request.user).distinct()
+        subjects = Subject.objects.filter(
+            id__in=Enrollment.objects.filter(student=request.user).values('subject_id')
+        )
     else:
         messages.error(request, 'Access denied.')
         return redirect('accounts:dashboard')
+    page = paginate(request, with_enrollment_counts(subjects.select_related('course')), ['course__code', 'semester', 'code', 'id'])
     context = {
-        'subjects': subjects,
-        'total_subjects': subjects.count(),
+        'subjects': page.object_list,
+        'page': page,
+        'total_subjects': subjects.count() if page.has_other_pages else len(page),
     }
     return render(request, 'courses/subject_list.html', context)
+
+
+@login_required
+def subject_search(request):
+    """Ranked full-text search over the subject catalog"""
+    if not (request.user.is_instructor or request.user.is_student):
+        messages.error(request, 'Access denied.')
+        return redirect('accounts:dashboard')
+    
+    from .search import search_subjects
+    query = request.GET.get('q', '').strip()
+    subjects = search_subjects(query, Subject.objects.select_related('course', 'instructor')) if query else []
+    
+    context = {
+        'query': query,
+        'subjects': subjects,
+    }
+    return render(request, 'courses/subject_search.html', context)
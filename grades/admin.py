@@ -1,12 +1,19 @@
 from django.contrib import admin
+from courses.admin import SubjectFilter
+from courses.search import filter_enrollments_matching, fts_available
+from StudentGradeManagementSystem.changelists import KeysetPaginationMixin
 from .models import Grade, GPA
 
 @admin.register(Grade)
-class GradeAdmin(admin.ModelAdmin):
+class GradeAdmin(KeysetPaginationMixin, admin.ModelAdmin):
     """Admin for Grade model"""
     list_display = ['get_student', 'get_subject', 'prelim_grade', 'midterm_grade', 'final_grade', 'weighted_average', 'letter_grade']
-    list_filter = ['enrollment__subject__course', 'enrollment__subject', 'letter_grade']
+    list_filter = ['enrollment__subject__course', ('enrollment__subject', SubjectFilter), 'letter_grade']
+    # get_student and get_subject read these on every row
+    list_select_related = ['enrollment__student', 'enrollment__subject']
     search_fields = ['enrollment__student__username', 'enrollment__student__first_name', 'enrollment__student__last_name', 'enrollment__subject__code']
+    search_help_text = 'Searches student names and subjects through the full-text indexes'
+    autocomplete_fields = ['enrollment']
     ordering = ['-created_at']
     
     fieldsets = (
@@ -40,6 +47,12 @@ class GradeAdmin(admin.ModelAdmin):
         return obj.enrollment.subject.code
     get_subject.short_description = 'Subject'
     get_subject.admin_order_field = 'enrollment__subject__code'
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Use the FTS5 indexes instead of icontains scans across joins"""
+        if not search_term or not fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return filter_enrollments_matching(queryset, search_term, 'enrollment__'), False
 
 
 @admin.register(GPA)
@@ -47,7 +60,10 @@ class GPAAdmin(admin.ModelAdmin):
     """Admin for GPA model"""
     list_display = ['student', 'semester', 'academic_year', 'gpa', 'total_units', 'computed_at']
     list_filter = ['semester', 'academic_year']
+    list_select_related = ['student']
+    show_full_result_count = False
     search_fields = ['student__username', 'student__first_name', 'student__last_name']
+    autocomplete_fields = ['student']
     ordering = ['-academic_year', '-semester']
     
     fieldsets = (
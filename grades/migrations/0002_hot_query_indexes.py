@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_hot_query_indexes'),
+        ('grades', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['letter_grade', 'weighted_average'], name='grade_letter_average_idx'),
+        ),
+    ]
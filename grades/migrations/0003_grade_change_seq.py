@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0002_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grade',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from accounts.models import User
 from courses.models import Subject, Enrollment
+from courses.sync import allocate, with_change_seq
+from outbox.events import grade_event, record
 
 class Grade(models.Model):
     """
@@ -74,11 +76,16 @@ class Grade(models.Model):
     remarks = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Row version for sync uploads: sequence number of the last save (courses/sync.py)
+    change_seq = models.BigIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Grade'
         verbose_name_plural = 'Grades'
+        indexes = [
+            models.Index(fields=['letter_grade', 'weighted_average'], name='grade_letter_average_idx'),
+        ]
     
     def clean(self):
         """Validate that weights sum to 100"""
@@ -133,13 +140,24 @@ class Grade(models.Model):
         }
         return grade_map.get(letter, 0.00)
     
-    def save(self, *args, **kwargs):
-        """Auto-calculate weighted average, letter grade, and grade point on save"""
+    def compute(self):
+        """Calculate weighted average, letter grade, and grade point"""
         self.weighted_average = self.calculate_weighted_average()
         if self.weighted_average:
             self.letter_grade = self.get_letter_grade(self.weighted_average)
             self.grade_point = self.get_grade_point(self.letter_grade)
-        super().save(*args, **kwargs)
+    
+    def save(self, *args, **kwargs):
+        """Auto-calculate weighted average, letter grade, and grade point on save"""
+        self.compute()
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        kwargs['update_fields'] = with_change_seq(kwargs.get('update_fields'))
+        with transaction.atomic(using=using, savepoint=False):
+            self.change_seq = allocate(using)
+            super().save(*args, **kwargs)
+            # The enrollment carries its grade's number, so a subject's changes come from one index
+            Enrollment.objects.using(using).filter(pk=self.enrollment_id).update(change_seq=self.change_seq)
+            record([grade_event(self)], using)
     
     def __str__(self):
         return f"{self.enrollment.student.username} - {self.enrollment.subject.code} - {self.weighted_average or 'N/A'}"
@@ -1,3 +1,95 @@
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from courses.models import Course, Subject, Enrollment
+from StudentGradeManagementSystem import changelists
+from StudentGradeManagementSystem.querybudget import QueryBudgetTestMixin
+from StudentGradeManagementSystem.queryplans import QueryPlanTestMixin
+from .admin import GradeAdmin
+from .models import Grade
+
+
+def create_grade_fixture():
+    """An instructor and one ungraded enrollment in their subject; (instructor, grade)"""
+    instructor = User.objects.create_user('teacher', password='pass12345', role='instructor')
+    student = User.objects.create_user('student', password='pass12345', role='student')
+    course = Course.objects.create(code='BSCS', name='BS Computer Science')
+    subject = Subject.objects.create(code='CS101', name='Intro', course=course, instructor=instructor)
+    return instructor, Grade.objects.create(enrollment=Enrollment.objects.create(student=student, subject=subject))
+
+
+class GradeFixtureMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor, cls.grade = create_grade_fixture()
+
+
+class GradeQueryPlanTests(GradeFixtureMixin, QueryPlanTestMixin, TestCase):
+    def test_edit_grade_is_indexed(self):
+        self.client.force_login(self.instructor)
+        url = reverse('grades:edit_grade', args=[self.grade.id])
+        self.assertViewUsesIndexes(url)
+        self.assertViewUsesIndexes(url, {'prelim_grade': '90', 'midterm_grade': '85', 'final_grade': '88'}, method='post')
+
+
+class GradeQueryBudgetTests(GradeFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def test_edit_grade_stays_within_budget(self):
+        self.client.force_login(self.instructor)
+        url = reverse('grades:edit_grade', args=[self.grade.id])
+        self.assertQueryBudget(url, 6)
+        # Saving also numbers the change for delta syncs (counter update and read, enrollment update)
+        # and records its outbox event
+        self.assertQueryBudget(url, 11, {'prelim_grade': '90', 'midterm_grade': '85', 'final_grade': '88'}, method='post')
+
+
+class GradeAdminPagingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        instructor = User.objects.create_user('teacher', role='instructor')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        subject = Subject.objects.create(code='CS101', name='Intro', course=course, instructor=instructor)
+        cls.grades = [
+            Grade.objects.create(enrollment=Enrollment.objects.create(
+                student=User.objects.create_user(f'student{i}', role='student'), subject=subject,
+            ))
+            for i in range(12)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    @mock.patch.object(GradeAdmin, 'list_per_page', 5)
+    def test_changelist_pages_by_cursor_without_offset_or_count(self):
+        url = reverse('admin:grades_grade_changelist')
+        seen = []
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        while True:
+            cl = response.context['cl']
+            self.assertTrue(cl.keyset)
+            seen.extend(grade.pk for grade in cl.result_list)
+            if not cl.next_url:
+                break
+            response = self.client.get(url + cl.next_url)
+        self.assertEqual(seen, [grade.pk for grade in reversed(self.grades)])
+        self.assertFalse([q for q in queries if 'OFFSET' in q['sql']])
+
+        back = self.client.get(url + cl.previous_url).context['cl']
+        self.assertEqual([grade.pk for grade in back.result_list], seen[5:10])
+        self.assertEqual(self.client.get(url, {'after': 'nonsense'}).status_code, 302)
 
-# Create your tests here.
+    def test_large_tables_show_an_estimated_count(self):
+        url = reverse('admin:grades_grade_changelist')
+        with mock.patch.object(changelists, 'ESTIMATE_ABOVE', 10):
+            response = self.client.get(url)
+        self.assertTrue(response.context['cl'].paginator.estimated)
+        self.assertContains(response, 'about 12 Grades')
+        with mock.patch.object(changelists, 'COUNT_CAP', 10):
+            response = self.client.get(url, {'letter_grade__isnull': 'True'})
+        self.assertContains(response, 'more than 10 Grades')
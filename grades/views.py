@@ -1,18 +1,21 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
+from StudentGradeManagementSystem.routers import use_primary
 from .models import Grade
 from decimal import Decimal
 
 @login_required
+@use_primary
 def edit_grade(request, grade_id):
     """Edit grades for a student in a subject"""
-    grade = get_object_or_404(Grade, id=grade_id)
+    grade = get_object_or_404(Grade.objects.select_related('enrollment__subject', 'enrollment__student'), id=grade_id)
     subject = grade.enrollment.subject
     student = grade.enrollment.student
     
     # Ensure only the assigned instructor can edit grades
-    if not request.user.is_instructor or subject.instructor != request.user:
+    if not request.user.is_instructor or subject.instructor_id != request.user.id:
         messages.error(request, 'You do not have permission to edit grades for this subject.')
         return redirect('accounts:dashboard')
     
@@ -36,7 +39,8 @@ def edit_grade(request, grade_id):
                     messages.error(request, f'{field} grade must be between 0 and 100.')
                     return redirect('grades:edit_grade', grade_id=grade_id)
             
-            grade.save()  # This will auto-calculate weighted average and letter grade
+            with transaction.atomic():
+                grade.save()  # This will auto-calculate weighted average and letter grade
             messages.success(request, f'Grades updated successfully for {student.get_full_name()}!')
             return redirect('courses:subject_students', subject_id=subject.id)
             
@@ -0,0 +1,31 @@
+from django.contrib import admin
+from . import queue
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Admin for background jobs, with queue depth and latency above the list"""
+    list_display = ['id', 'name', 'status', 'priority', 'attempts', 'run_at', 'created_at', 'finished_at', 'locked_by']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'last_error']
+    ordering = ['-created_at']
+    actions = ['retry_jobs']
+    readonly_fields = ['attempts', 'locked_by', 'locked_until', 'progress', 'result', 'last_error', 'created_at', 'started_at', 'finished_at']
+    
+    fieldsets = (
+        ('Job', {
+            'fields': ('name', 'payload', 'status', 'priority', 'max_attempts', 'run_at')
+        }),
+        ('Progress', {
+            'fields': ('attempts', 'locked_by', 'locked_until', 'created_at', 'started_at', 'finished_at', 'progress', 'result', 'last_error')
+        }),
+    )
+    
+    def changelist_view(self, request, extra_context=None):
+        extra_context = dict(extra_context or {}, queue_stats=queue.queue_stats())
+        return super().changelist_view(request, extra_context=extra_context)
+    
+    @admin.action(description='Retry selected jobs')
+    def retry_jobs(self, request, queryset):
+        count = queue.retry(queryset.exclude(status='done'))
+        self.message_user(request, f"{count} job(s) queued again.")
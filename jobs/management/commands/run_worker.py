@@ -0,0 +1,72 @@
+import multiprocessing
+import signal
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from jobs import queue
+from jobs.worker import Worker, work_in_process
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs with a pool of threads or processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1, help='Worker threads per process')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes (forked)')
+        parser.add_argument('--task', action='append', help='Only run these tasks (repeatable)')
+        parser.add_argument('--once', action='store_true', help='Drain the due jobs and exit')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--lease', type=int, default=queue.DEFAULT_LEASE, help='Seconds before a running job is claimed again')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['processes'] < 1:
+            raise CommandError('--threads and --processes must be at least 1')
+        for name in options['task'] or ():
+            queue.get_task(name)
+
+        arguments = (options['threads'], options['lease'], options['poll_interval'], options['task'], options['once'])
+        pool = f"{options['processes']} process(es) x {options['threads']} thread(s)"
+        self.stdout.write(f"Running {', '.join(options['task'] or queue.registered_tasks())} with {pool}")
+
+        if options['processes'] == 1:
+            worker = Worker(*arguments[:4])
+            worker.stop_on_signals()
+            outcomes = worker.work(options['once'])
+        else:
+            outcomes = self.run_processes(options['processes'], arguments)
+
+        summary = ', '.join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())) or 'no jobs'
+        self.stdout.write(self.style.SUCCESS(f"Worker finished: {summary}"))
+
+    def run_processes(self, count, arguments):
+        """Fork `count` workers and add up their outcomes; SIGINT and SIGTERM are passed on to them"""
+        # Children open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.SimpleQueue()
+        children = [
+            context.Process(target=_child, args=(results, *arguments), name=f"job-worker-{number}")
+            for number in range(count)
+        ]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, forward)
+        outcomes = Counter()
+        for child in children:
+            child.join()
+        while not results.empty():
+            outcomes.update(results.get())
+        return outcomes
+
+
+def _child(results, *arguments):
+    results.put(work_in_process(*arguments))
@@ -0,0 +1,61 @@
+from django.db import models
+from django.utils import timezone
+
+class Job(models.Model):
+    """
+    A unit of background work, run by `manage.py run_worker`
+    name is a task registered with jobs.queue.task; payload holds its keyword arguments
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    
+    # Retries
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time (retries back off)")
+    last_error = models.TextField(blank=True)
+    
+    # Claim; a running job whose lease has expired is claimed again
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    
+    # Reported by long tasks through jobs.queue.report_progress
+    progress = models.JSONField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            # The claim query: next due job by priority
+            models.Index(
+                fields=['-priority', 'run_at', 'id'],
+                name='job_claim_idx',
+                condition=models.Q(status='queued'),
+            ),
+            models.Index(
+                fields=['locked_until'],
+                name='job_lease_idx',
+                condition=models.Q(status='running'),
+            ),
+            models.Index(fields=['status', 'finished_at'], name='job_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
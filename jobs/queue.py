@@ -0,0 +1,281 @@
+"""
+Database-backed job queue
+
+Tasks are plain functions registered with the `task` decorator in an app's
+tasks.py (imported at startup by JobsConfig). `enqueue()` inserts a Job row,
+in the caller's transaction, so a job is only visible to workers once the
+data it refers to has been committed. Views enqueue and return; the work runs
+in `manage.py run_worker`.
+
+A worker claims the next due job (highest priority, then oldest run_at) by
+flipping it from queued to running. On databases with SELECT ... FOR UPDATE
+SKIP LOCKED the candidate row is locked and skipped by other workers. On
+SQLite, which has neither, the claim is a compare-and-set UPDATE guarded by
+the attempt counter, so two workers racing for a row cannot both win.
+
+A failed job is re-queued with exponential backoff until max_attempts, then
+left as failed with its traceback. A claim holds a lease; a job still running
+after its lease expired (its worker died) is claimed again, or failed if that
+was its last attempt. Long tasks call
+`report_progress()`, which records where they are and renews the lease.
+"""
+import contextvars
+import json
+import os
+import random
+import socket
+import threading
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+DEFAULT_LEASE = 300
+BACKOFF_BASE = 10
+BACKOFF_MAX = 3600
+
+
+class UnknownTaskError(LookupError):
+    """Raised when a job names a task that is not registered"""
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    function: object
+    priority: int = 0
+    max_attempts: int = 5
+
+
+_registry = {}
+
+# (job, lease) being run in this context, for report_progress()
+_running = contextvars.ContextVar('running_job', default=None)
+
+
+def task(name=None, priority=0, max_attempts=5):
+    """
+    Register a function as a task. The function gets an `enqueue(**payload)`
+    helper; payload values must be JSON serializable
+    """
+    def decorator(function):
+        task_name = name or f"{function.__module__}.{function.__name__}"
+        _registry[task_name] = Task(task_name, function, priority, max_attempts)
+        function.task_name = task_name
+        function.enqueue = lambda **payload: enqueue(task_name, payload)
+        return function
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise UnknownTaskError(f"No task registered as {name!r}") from None
+
+
+def registered_tasks():
+    return sorted(_registry)
+
+
+def enqueue(name, payload=None, priority=None, delay=None, max_attempts=None):
+    """Queue a registered task; runs in the caller's transaction"""
+    from .models import Job
+
+    registered = get_task(name)
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        priority=registered.priority if priority is None else priority,
+        max_attempts=registered.max_attempts if max_attempts is None else max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay or 0),
+    )
+
+
+def worker_name():
+    """host:pid:thread, stored in Job.locked_by"""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+
+def _claimable(now):
+    # A job whose lease ran out on its last attempt is failed by _fail_abandoned, not run again
+    expired = Q(status='running', locked_until__lt=now, attempts__lt=F('max_attempts'))
+    return Q(status='queued', run_at__lte=now) | expired
+
+
+def _fail_abandoned(now):
+    """Fail the jobs whose worker died or hung on their last attempt"""
+    from .models import Job
+
+    return Job.objects.using(DEFAULT_DB_ALIAS).filter(
+        status='running', locked_until__lt=now, attempts__gte=F('max_attempts'),
+    ).update(status='failed', locked_until=None, finished_at=now, last_error='Lease expired on the last attempt')
+
+
+def claim(worker=None, lease=DEFAULT_LEASE, names=None):
+    """Mark the next due job as running for this worker and return it, or None when the queue is empty"""
+    from .models import Job
+
+    worker = worker or worker_name()
+    connection = connections[DEFAULT_DB_ALIAS]
+    _fail_abandoned(timezone.now())
+    while True:
+        now = timezone.now()
+        jobs = Job.objects.using(DEFAULT_DB_ALIAS).filter(_claimable(now))
+        if names:
+            jobs = jobs.filter(name__in=names)
+        jobs = jobs.order_by('-priority', 'run_at', 'id')
+        claimed = dict(
+            status='running', locked_by=worker, locked_until=now + timedelta(seconds=lease), started_at=now,
+        )
+
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                job = jobs.select_for_update(skip_locked=True).first()
+                if job is None:
+                    return None
+                job.attempts += 1
+                for field, value in claimed.items():
+                    setattr(job, field, value)
+                job.save(update_fields=['attempts', *claimed])
+                return job
+
+        candidate = jobs.values('id', 'attempts').first()
+        if candidate is None:
+            return None
+        if _take(candidate['id'], candidate['attempts'], now, claimed):
+            return Job.objects.using(DEFAULT_DB_ALIAS).get(pk=candidate['id'])
+        # Another worker got there first; pick again
+
+
+def _take(job_id, attempts, now, claimed):
+    """Compare-and-set: whoever bumps attempts from the value it read owns the job"""
+    from .models import Job
+
+    return Job.objects.using(DEFAULT_DB_ALIAS).filter(
+        _claimable(now), pk=job_id, attempts=attempts,
+    ).update(attempts=attempts + 1, **claimed) == 1
+
+
+def backoff(attempts):
+    """Seconds before retry number `attempts`: doubling from BACKOFF_BASE, capped, with 10% jitter"""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.9, 1.1)
+
+
+def _finish(job, **fields):
+    """Update a claimed job, unless another worker re-claimed it after the lease ran out"""
+    from .models import Job
+
+    return Job.objects.using(DEFAULT_DB_ALIAS).filter(
+        pk=job.pk, locked_by=job.locked_by, attempts=job.attempts,
+    ).update(locked_until=None, **fields)
+
+
+def report_progress(**progress):
+    """Store the running job's progress and renew its lease; does nothing outside a worker"""
+    running = _running.get()
+    if running is None:
+        return
+    from .models import Job
+
+    job, lease = running
+    job.locked_until = timezone.now() + lease
+    Job.objects.using(DEFAULT_DB_ALIAS).filter(pk=job.pk, locked_by=job.locked_by, attempts=job.attempts).update(
+        progress=progress, locked_until=job.locked_until,
+    )
+
+
+def run(job):
+    """Run a claimed job and record the outcome: 'done', 'retry' or 'failed'"""
+    token = _running.set((job, job.locked_until - job.started_at))
+    try:
+        result = get_task(job.name).function(**job.payload)
+    except Exception as exc:
+        error = traceback.format_exc()
+        # A task missing from this deployment will not appear on retry
+        if job.attempts < job.max_attempts and not isinstance(exc, UnknownTaskError):
+            retry_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+            _finish(job, status='queued', last_error=error, run_at=retry_at)
+            return 'retry'
+        _finish(job, status='failed', last_error=error, finished_at=timezone.now())
+        return 'failed'
+    finally:
+        _running.reset(token)
+    result = result if _json_safe(result) else repr(result)
+    _finish(job, status='done', result=result, last_error='', finished_at=timezone.now())
+    return 'done'
+
+
+def _json_safe(value):
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def retry(jobs):
+    """Put failed (or stuck) jobs back in the queue with a fresh set of attempts"""
+    return jobs.update(status='queued', attempts=0, run_at=timezone.now(), locked_by='', locked_until=None)
+
+
+def queue_stats(window=timedelta(hours=1)):
+    """
+    Queue depth per task and status, plus wait (queued to started) and run
+    time of the jobs finished in the last `window`
+    """
+    from django.db.models import Count, Min
+    from .models import Job
+
+    now = timezone.now()
+    jobs = Job.objects.using(DEFAULT_DB_ALIAS)
+    depth = {}
+    for row in jobs.exclude(status='done').order_by().values('name', 'status').annotate(
+        n=Count('id'), oldest=Min('run_at'),
+    ):
+        entry = depth.setdefault(row['name'], {'queued': 0, 'running': 0, 'failed': 0, 'oldest': None})
+        entry[row['status']] = row['n']
+        if row['status'] == 'queued':
+            entry['oldest'] = row['oldest']
+
+    finished = jobs.filter(status__in=['done', 'failed'], finished_at__gte=now - window).values_list(
+        'name', 'created_at', 'started_at', 'finished_at',
+    )
+    timings = {}
+    for name, created_at, started_at, finished_at in finished:
+        entry = timings.setdefault(name, {'wait': [], 'run': []})
+        if started_at is not None:
+            entry['wait'].append((started_at - created_at).total_seconds())
+            entry['run'].append((finished_at - started_at).total_seconds())
+
+    rows = []
+    for name in sorted(set(depth) | set(timings)):
+        counts = depth.get(name, {'queued': 0, 'running': 0, 'failed': 0, 'oldest': None})
+        entry = timings.get(name, {'wait': [], 'run': []})
+        due = counts['oldest'] is not None and counts['oldest'] <= now
+        rows.append({
+            'name': name,
+            'queued': counts['queued'],
+            'running': counts['running'],
+            'failed': counts['failed'],
+            'oldest_seconds': round((now - counts['oldest']).total_seconds(), 1) if due else None,
+            'finished': len(entry['run']),
+            'wait_p50': _percentile(entry['wait'], 50),
+            'wait_p95': _percentile(entry['wait'], 95),
+            'run_p50': _percentile(entry['run'], 50),
+            'run_p95': _percentile(entry['run'], 95),
+        })
+    total = {column: sum(row[column] for row in rows) for column in ('queued', 'running', 'failed', 'finished')}
+    return {'rows': rows, 'total': total, 'window_minutes': int(window.total_seconds() // 60)}
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return round(values[index], 3)
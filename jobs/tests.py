@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from . import queue
+from .models import Job
+from .worker import Worker
+
+_seen = []
+
+
+@queue.task('jobs.tests.record')
+def record(value):
+    _seen.append(value)
+    return {'value': value}
+
+
+@queue.task('jobs.tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        _seen.clear()
+
+    def test_claims_by_priority_then_due_time(self):
+        low = queue.enqueue('jobs.tests.record', {'value': 1})
+        high = queue.enqueue('jobs.tests.record', {'value': 2}, priority=5)
+        queue.enqueue('jobs.tests.record', {'value': 3}, priority=9, delay=60)
+
+        self.assertEqual(queue.claim(worker='w1').pk, high.pk)
+        claimed = queue.claim(worker='w2')
+        self.assertEqual(claimed.pk, low.pk)
+        self.assertEqual((claimed.status, claimed.attempts, claimed.locked_by), ('running', 1, 'w2'))
+        # Claimed jobs are not handed out twice and the delayed one is not due
+        self.assertIsNone(queue.claim(worker='w3'))
+
+    def test_only_one_claim_wins(self):
+        job = queue.enqueue('jobs.tests.record', {'value': 1})
+        now = timezone.now()
+        claimed = dict(status='running', locked_by='w', locked_until=now + timedelta(seconds=60), started_at=now)
+
+        # Two workers that both read attempts=0
+        self.assertTrue(queue._take(job.pk, 0, now, dict(claimed, locked_by='w1')))
+        self.assertFalse(queue._take(job.pk, 0, now, dict(claimed, locked_by='w2')))
+        job.refresh_from_db()
+        self.assertEqual((job.locked_by, job.attempts), ('w1', 1))
+
+    def test_expired_lease_is_claimed_again(self):
+        job = queue.enqueue('jobs.tests.record', {'value': 1})
+        stale = queue.claim(worker='dead')
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        again = queue.claim(worker='alive')
+        self.assertEqual((again.pk, again.attempts), (job.pk, 2))
+        # The first worker can no longer record an outcome
+        queue.run(stale)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('running', 'alive'))
+
+    def test_expired_lease_on_the_last_attempt_fails(self):
+        job = queue.enqueue('jobs.tests.record', {'value': 1}, max_attempts=1)
+        queue.claim(worker='dead')
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNone(queue.claim(worker='alive'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_until), ('failed', 1, None))
+        self.assertIn('Lease expired', job.last_error)
+
+    def test_failures_back_off_then_fail(self):
+        job = queue.enqueue('jobs.tests.explode')
+        worker = Worker()
+
+        self.assertEqual(worker.run_one(), 'retry')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=queue.BACKOFF_BASE * 0.8))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertIsNone(worker.run_one())
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(worker.run_one(), 'failed')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_worker_drains_queue(self):
+        for value in range(3):
+            queue.enqueue('jobs.tests.record', {'value': value})
+
+        self.assertEqual(Worker().work(once=True), {'done': 3})
+        self.assertEqual(sorted(_seen), [0, 1, 2])
+        self.assertEqual(Job.objects.get(payload__value=2).result, {'value': 2})
+
+    def test_admin_shows_queue_depth(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_login(admin)
+        queue.enqueue('jobs.tests.record', {'value': 1})
+        queue.enqueue('jobs.tests.record', {'value': 2})
+
+        response = self.client.get(reverse('admin:jobs_job_changelist'))
+        self.assertContains(response, 'Oldest due')
+        self.assertEqual(response.context['queue_stats']['total']['queued'], 2)
+
@@ -0,0 +1,101 @@
+"""
+Worker loop behind `manage.py run_worker`
+
+A Worker runs `threads` claim-and-run loops in one process. Threads suit
+tasks that wait on the database, storage or the network; CPU-bound tasks
+(image resizing) scale better with several processes, which the command
+forks, each running a single-threaded Worker. SIGINT and SIGTERM let the
+current jobs finish before the loops exit.
+"""
+import logging
+import signal
+import threading
+import time
+from collections import Counter
+
+from django.db import OperationalError, close_old_connections, connections
+
+from StudentGradeManagementSystem import metrics
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    def __init__(self, threads=1, lease=queue.DEFAULT_LEASE, poll_interval=1.0, names=None):
+        self.threads = max(threads, 1)
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.names = names
+        self.stop = threading.Event()
+        self.outcomes = Counter()
+        self._lock = threading.Lock()
+
+    def run_one(self):
+        """Claim and run a single job; its outcome, or None when nothing is due"""
+        close_old_connections()
+        job = queue.claim(lease=self.lease, names=self.names)
+        if job is None:
+            return None
+        started = time.perf_counter()
+        outcome = queue.run(job)
+        elapsed = time.perf_counter() - started
+        metrics.jobs_processed.inc(task=job.name, outcome=outcome)
+        metrics.job_duration.observe(elapsed, task=job.name)
+        if outcome != 'done':
+            logger.warning("Job %s #%s: %s after attempt %s", job.name, job.pk, outcome, job.attempts)
+        with self._lock:
+            self.outcomes[outcome] += 1
+        return outcome
+
+    def _loop(self, once):
+        try:
+            while not self.stop.is_set():
+                try:
+                    outcome = self.run_one()
+                except OperationalError as exc:
+                    # Lock contention or a lost connection; an unrecorded job is re-run when its lease ends
+                    logger.warning("Job worker database error: %s", exc)
+                    close_old_connections()
+                    self.stop.wait(self.poll_interval)
+                    continue
+                if outcome is None:
+                    if once:
+                        return
+                    self.stop.wait(self.poll_interval)
+        finally:
+            # Pool threads opened their own connections
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    def work(self, once=False):
+        """Process jobs until stopped, or until the queue is drained with once; outcome counts"""
+        if self.threads == 1:
+            self._loop(once)
+        else:
+            pool = [
+                threading.Thread(target=self._loop, args=(once,), name=f"job-worker-{number}", daemon=True)
+                for number in range(self.threads)
+            ]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                # Short joins keep the main thread responsive to signals
+                while thread.is_alive():
+                    thread.join(0.5)
+        return dict(self.outcomes)
+
+    def stop_on_signals(self):
+        def handler(signum, frame):
+            logger.info("Stopping after the running jobs (signal %s)", signum)
+            self.stop.set()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, handler)
+
+
+def work_in_process(threads, lease, poll_interval, names, once):
+    """Entry point of a forked worker process"""
+    worker = Worker(threads, lease, poll_interval, names)
+    worker.stop_on_signals()
+    return worker.work(once)
@@ -0,0 +1,24 @@
+from django.contrib import admin
+from .models import Checkpoint, Event
+
+@admin.register(Event)
+class EventAdmin(admin.ModelAdmin):
+    """Events not yet compacted away by the relay"""
+    list_display = ['id', 'topic', 'key', 'created_at']
+    list_filter = ['topic']
+    search_fields = ['key']
+    readonly_fields = ['topic', 'key', 'payload', 'created_at']
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Checkpoint)
+class CheckpointAdmin(admin.ModelAdmin):
+    """How far each sink has got; deleting a retired sink's row lets compaction go on"""
+    list_display = ['sink', 'last_event_id', 'delivered', 'updated_at']
+    readonly_fields = ['sink', 'last_event_id', 'delivered', 'updated_at']
+    
+    def has_add_permission(self, request):
+        return False
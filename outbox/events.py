@@ -0,0 +1,51 @@
+"""
+Outbox events for grade and enrollment changes
+
+Grade.save() and Enrollment.save() record an event on the database they
+write to, inside the same transaction, so an event exists exactly when
+its change committed. Deletes are recorded by courses/signals.py inside the
+deleting transaction. Bulk writers (courses.sync.apply, courses.seeding)
+build their events in memory and insert them with one bulk_create.
+
+Topics are grade.saved, grade.deleted, enrollment.saved and
+enrollment.deleted. Every event is keyed by its enrollment, so a consumer
+that partitions by key sees each enrollment's changes in order.
+"""
+from decimal import Decimal
+
+from .models import Event
+
+BATCH_SIZE = 500
+CENTS = Decimal('0.01')
+
+
+def _key(enrollment_id):
+    return f"enrollment:{enrollment_id}"
+
+
+def _decimal(value):
+    # An instance may still hold the int or float it was given; send what the column stores
+    return None if value is None else str(Decimal(str(value)).quantize(CENTS))
+
+
+def grade_event(grade, topic='grade.saved'):
+    payload = {'enrollment_id': grade.enrollment_id, 'grade_id': grade.pk}
+    if topic != 'grade.deleted':
+        payload.update(
+            prelim=_decimal(grade.prelim_grade), midterm=_decimal(grade.midterm_grade), final=_decimal(grade.final_grade),
+            average=_decimal(grade.weighted_average), letter=grade.letter_grade, grade_point=_decimal(grade.grade_point),
+            remarks=grade.remarks, version=grade.change_seq,
+        )
+    return Event(topic=topic, key=_key(grade.enrollment_id), payload=payload)
+
+
+def enrollment_event(enrollment, topic='enrollment.saved'):
+    payload = {'enrollment_id': enrollment.pk, 'student_id': enrollment.student_id, 'subject_id': enrollment.subject_id}
+    if topic != 'enrollment.deleted':
+        payload.update(status=enrollment.status, enrolled_date=enrollment.enrolled_date, version=enrollment.change_seq)
+    return Event(topic=topic, key=_key(enrollment.pk), payload=payload)
+
+
+def record(events, using=None):
+    """Insert events on `using` (the routed database when None); call it inside the writing transaction"""
+    return Event.objects.using(using).bulk_create(events, batch_size=BATCH_SIZE)
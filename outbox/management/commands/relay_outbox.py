@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from outbox.relay import BATCH_SIZE, Relay
+from outbox.sinks import get_sink
+from StudentGradeManagementSystem.sharding import campus_databases
+
+
+class Command(BaseCommand):
+    help = 'Deliver grade and enrollment change events from the outbox to a sink'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', required=True, help='file:<path>, http(s)://<url> or callback:<dotted.path>')
+        parser.add_argument('--name', help='Checkpoint name of the sink (default: the --sink value)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Events per delivery')
+        parser.add_argument('--database', action='append', help='Only relay these databases (repeatable)')
+        parser.add_argument('--once', action='store_true', help='Deliver what is pending and exit')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when nothing is pending')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        try:
+            sink = get_sink(options['sink'])
+        except (ValueError, ImportError) as exc:
+            raise CommandError(str(exc))
+        unknown = set(options['database'] or ()) - set(campus_databases())
+        if unknown:
+            raise CommandError(f"Not a campus database: {', '.join(sorted(unknown))}")
+
+        name = options['name'] or options['sink']
+        relay = Relay(sink, name, options['batch_size'], options['database'], options['poll_interval'])
+        relay.stop_on_signals()
+        self.stdout.write(f"Relaying the outbox of {', '.join(relay.databases)} to {name}")
+        try:
+            delivered = relay.run(options['once'])
+        except Exception as exc:
+            raise CommandError(f"Delivery to {name} failed: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Relay finished: {delivered} event(s) delivered"))
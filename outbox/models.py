@@ -0,0 +1,33 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+class Event(models.Model):
+    """
+    A grade or enrollment change, written in the transaction that made it
+    Delivered to downstream systems, in id order, by `manage.py relay_outbox`
+    """
+    topic = models.CharField(max_length=50, help_text="e.g. grade.saved, enrollment.deleted")
+    # Events with the same key concern the same enrollment, in order
+    key = models.CharField(max_length=100)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+    
+    def __str__(self):
+        return f"#{self.pk} {self.topic} {self.key}"
+
+
+class Checkpoint(models.Model):
+    """How far a sink has received the outbox of this database"""
+    sink = models.CharField(max_length=200, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
+    delivered = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.sink} @ {self.last_event_id}"
@@ -0,0 +1,115 @@
+"""
+Outbox relay behind `manage.py relay_outbox`
+
+Every campus database keeps its own outbox. The relay reads each one in id
+order, batch_size events at a time, hands the batch to the sink and only
+then moves the sink's Checkpoint past it. If the relay dies between the two
+steps, the batch is sent again: delivery is at least once, and consumers
+drop repeats by (database, id). On SQLite writers take turns, so ids commit
+in order and a checkpoint never passes an event still being written. The
+ids are AUTOINCREMENT, so they are not reused after compaction either.
+
+Compaction deletes the events every sink has received, i.e. those up to the
+lowest checkpoint on that database, in batches. A sink that is no longer
+used holds compaction back until its Checkpoint row is deleted.
+"""
+import logging
+import signal
+import threading
+
+from django.db import close_old_connections, transaction
+from django.db.models import F, Min
+
+from StudentGradeManagementSystem import metrics
+from StudentGradeManagementSystem.sharding import campus_databases
+from .models import Checkpoint, Event
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+COMPACT_BATCH_SIZE = 1000
+
+
+def message(event, alias):
+    """What a sink receives for one event"""
+    return {
+        'id': event.pk, 'database': alias, 'topic': event.topic, 'key': event.key,
+        'payload': event.payload, 'created_at': event.created_at,
+    }
+
+
+class Relay:
+    def __init__(self, sink, name, batch_size=BATCH_SIZE, databases=None, poll_interval=1.0):
+        self.sink = sink
+        self.name = name
+        self.batch_size = batch_size
+        self.databases = list(databases or campus_databases())
+        self.poll_interval = poll_interval
+        self.stop = threading.Event()
+
+    def deliver(self, alias):
+        """Send the next batch after the checkpoint on `alias`; the number of events sent"""
+        checkpoint, _ = Checkpoint.objects.using(alias).get_or_create(sink=self.name)
+        events = list(Event.objects.using(alias).filter(pk__gt=checkpoint.last_event_id).order_by('pk')[:self.batch_size])
+        if not events:
+            return 0
+        self.sink([message(event, alias) for event in events])
+        Checkpoint.objects.using(alias).filter(pk=self.name).update(
+            last_event_id=events[-1].pk, delivered=F('delivered') + len(events),
+        )
+        metrics.outbox_delivered.inc(len(events), sink=self.name)
+        return len(events)
+
+    def drain(self, alias):
+        """Deliver batches until `alias` has nothing new; the number of events sent"""
+        total = 0
+        while not self.stop.is_set():
+            sent = self.deliver(alias)
+            if not sent:
+                break
+            total += sent
+        return total
+
+    def compact(self, alias):
+        """Delete the events every sink has received; the number deleted"""
+        lowest = Checkpoint.objects.using(alias).aggregate(lowest=Min('last_event_id'))['lowest']
+        deleted = 0
+        while lowest:
+            ids = list(Event.objects.using(alias).filter(pk__lte=lowest).order_by('pk').values_list('pk', flat=True)[
+                :COMPACT_BATCH_SIZE
+            ])
+            if not ids:
+                break
+            with transaction.atomic(using=alias):
+                deleted += Event.objects.using(alias).filter(pk__in=ids).delete()[0]
+        return deleted
+
+    def run(self, once=False):
+        """Relay every database until stopped, or until all are drained with once; events sent"""
+        total = 0
+        while not self.stop.is_set():
+            sent = 0
+            for alias in self.databases:
+                close_old_connections()
+                try:
+                    sent += self.drain(alias)
+                    self.compact(alias)
+                except Exception as exc:
+                    # The sink or the database is unavailable; the undelivered batch is sent again next round
+                    if once:
+                        raise
+                    logger.warning("Outbox relay to %s failed on %s: %s", self.name, alias, exc)
+            total += sent
+            if once:
+                break
+            if not sent:
+                self.stop.wait(self.poll_interval)
+        return total
+
+    def stop_on_signals(self):
+        def handler(signum, frame):
+            logger.info("Stopping the outbox relay after the current batch (signal %s)", signum)
+            self.stop.set()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, handler)
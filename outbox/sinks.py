@@ -0,0 +1,62 @@
+"""
+Where the outbox relay delivers events
+
+A sink is called with a batch of messages, oldest first, and returns once
+downstream has stored them. Raising makes the relay send the batch again
+later. get_sink() builds one from a --sink spec:
+
+- file:<path>         append JSON lines to a file (fsynced)
+- http(s)://<url>     POST {"events": [...]}; any 2xx status is success
+- callback:<dotted>   call a function in this process
+"""
+import json
+import os
+import urllib.request
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, messages):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            for message in messages:
+                handle.write(json.dumps(message, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n')
+            handle.flush()
+            os.fsync(handle.fileno())
+
+
+class HttpSink:
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, messages):
+        body = json.dumps({'events': messages}, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        request = urllib.request.Request(self.url, data=body, method='POST', headers={'Content-Type': 'application/json'})
+        # urlopen raises HTTPError for 4xx and 5xx answers
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class CallbackSink:
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, messages):
+        self.function(messages)
+
+
+def get_sink(spec):
+    """A sink from its spec; raises ValueError for an unknown scheme"""
+    if spec.startswith('file:'):
+        return FileSink(spec[len('file:'):])
+    if spec.startswith(('http://', 'https://')):
+        return HttpSink(spec)
+    if spec.startswith('callback:'):
+        return CallbackSink(import_string(spec[len('callback:'):]))
+    raise ValueError(f"Unknown sink {spec!r}: use file:<path>, http(s)://<url> or callback:<dotted.path>")
@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import User
+from courses import sync
+from courses.models import Course, Enrollment, Subject
+from grades.models import Grade
+from .models import Checkpoint, Event
+from .relay import Relay
+from .sinks import FileSink, HttpSink
+
+_received = []
+
+
+def collect(messages):
+    _received.extend(messages)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        _received.clear()
+        self.instructor = User.objects.create_user('teacher', role='instructor')
+        course = Course.objects.create(code='BSCS', name='BS Computer Science')
+        self.subject = Subject.objects.create(code='CS101', name='Programming', course=course, instructor=self.instructor)
+        self.enrollments = [
+            Enrollment.objects.create(student=User.objects.create_user(f"student{n}", role='student'), subject=self.subject)
+            for n in range(3)
+        ]
+
+    def relay(self, sink=collect, name='test', **kwargs):
+        return Relay(sink, name, databases=['default'], **kwargs)
+
+    def test_changes_record_events_in_their_transaction(self):
+        grade = Grade.objects.create(enrollment=self.enrollments[0], prelim_grade=80)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            grade.final_grade = 90
+            grade.save()
+            raise RuntimeError('rolled back')
+        first, second, third = [enrollment.id for enrollment in self.enrollments]
+        self.enrollments[1].delete()
+
+        topics = list(Event.objects.values_list('topic', 'key'))
+        self.assertEqual(topics, [
+            ('enrollment.saved', f"enrollment:{first}"),
+            ('enrollment.saved', f"enrollment:{second}"),
+            ('enrollment.saved', f"enrollment:{third}"),
+            ('grade.saved', f"enrollment:{first}"),
+            ('enrollment.deleted', f"enrollment:{second}"),
+        ])
+        self.assertEqual(Event.objects.get(topic='grade.saved').payload['prelim'], '80.00')
+
+    def test_bulk_sync_upload_inserts_its_events_at_once(self):
+        edits = [{'id': enrollment.id, 'version': 0, 'prelim': 70 + n} for n, enrollment in enumerate(self.enrollments)]
+        with CaptureQueriesContext(connection) as queries:
+            sync.apply(self.subject.id, edits)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "outbox_event"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Event.objects.filter(topic='grade.saved').count(), 3)
+
+    def test_relay_delivers_in_order_checkpoints_and_compacts(self):
+        ids = list(Event.objects.values_list('id', flat=True))
+        self.assertEqual(self.relay(batch_size=2).run(once=True), 3)
+        self.assertEqual([message['id'] for message in _received], ids)
+        self.assertEqual(Checkpoint.objects.get(sink='test').last_event_id, ids[-1])
+        self.assertFalse(Event.objects.exists())
+
+        Grade.objects.create(enrollment=self.enrollments[0], prelim_grade=80)
+        self.assertEqual(self.relay().run(once=True), 1)
+        self.assertEqual(_received[-1]['topic'], 'grade.saved')
+
+    def test_failed_batches_are_sent_again(self):
+        def flaky(messages):
+            if not attempts:
+                attempts.append(messages)
+                raise OSError('sink down')
+            _received.extend(messages)
+
+        attempts = []
+        with self.assertRaises(OSError):
+            self.relay(flaky).run(once=True)
+        self.assertEqual(Checkpoint.objects.get(sink='test').last_event_id, 0)
+        self.assertEqual(Event.objects.count(), 3)
+
+        self.relay(flaky).run(once=True)
+        self.assertEqual([message['id'] for message in _received], [message['id'] for message in attempts[0]])
+
+    def test_compaction_waits_for_every_sink(self):
+        Checkpoint.objects.create(sink='lagging')
+        self.relay().run(once=True)
+        self.assertEqual(Event.objects.count(), 3)
+
+    def test_file_and_http_sinks(self):
+        # Both sinks get every event before compaction
+        Checkpoint.objects.bulk_create([Checkpoint(sink='file'), Checkpoint(sink='http')])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'events', 'outbox.jsonl')
+            self.relay(FileSink(path), name='file').run(once=True)
+            with open(path) as handle:
+                self.assertEqual([json.loads(line)['topic'] for line in handle], ['enrollment.saved'] * 3)
+
+        bodies = []
+
+        class Stub(BaseHTTPRequestHandler):
+            def do_POST(self):
+                bodies.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Stub)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/events"
+            self.relay(HttpSink(url), name='http', batch_size=2).run(once=True)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual([len(body['events']) for body in bodies], [2, 1])
+
+    def test_relay_command(self):
+        out = StringIO()
+        call_command('relay_outbox', sink='callback:outbox.tests.collect', database=['default'], once=True, stdout=out)
+        self.assertIn('3 event(s) delivered', out.getvalue())
+        self.assertEqual(len(_received), 3)